@@ -0,0 +1,1361 @@
+"""
+Backend Benchmark Script
+Runs the Lambda handlers against local AWS stand-ins (see local_aws.py)
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import zipfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from local_aws import Bandwidth, LocalQueue, LocalS3Client, LocalS3Server, LocalSageMakerRuntime, LocalWebSocketGateway
+
+BUCKET_NAME = 'innergy-blueprints-dev'
+
+# The handlers create their boto3 clients at import; regional clients
+# (SageMaker, SQS) need a region even though they are swapped for stand-ins
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+# Real boto3 clients sign requests to LocalS3Server with these
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'local')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'local')
+
+
+def print_header(title):
+    print(f"\n{'='*60}")
+    print(title)
+    print(f"{'='*60}")
+
+
+def populate_blueprints(s3, count, sessions=1000):
+    """
+    Fill the local bucket with `count` blueprints, each with an index
+    pointer and a status object. Objects are written straight into the
+    stand-in's store so that populating 1M entries does not count as
+    requests.
+    """
+    bucket = s3._bucket(BUCKET_NAME)
+    status_body = json.dumps({'status': 'processing', 'stage': 'upload', 'progress': 10}).encode('utf-8')
+    for i in range(count):
+        blueprint_id = f"blueprint-{i:012x}"
+        session_id = f"session-{i % sessions}"
+        prefix = f"uploads/{session_id}/{blueprint_id}/"
+        bucket[f"index/{blueprint_id}.json"] = {
+            'Body': json.dumps({'blueprintId': blueprint_id, 'sessionId': session_id, 'prefix': prefix}).encode('utf-8'),
+            'ETag': '"0"', 'ContentType': 'application/json', 'LastModified': None
+        }
+        bucket[f"{prefix}status.json"] = {
+            'Body': status_body,
+            'ETag': '"0"', 'ContentType': 'application/json', 'LastModified': None
+        }
+    s3._sorted_keys.pop(BUCKET_NAME, None)
+
+
+def legacy_scan_lookup(s3, blueprint_id):
+    """
+    The pre-index lookup: list uploads/ and substring-match every key.
+    Paginates through the whole prefix (the old handlers stopped after
+    the first 100 keys and returned 404 for everything else).
+    """
+    token = None
+    while True:
+        kwargs = {'Bucket': BUCKET_NAME, 'Prefix': 'uploads/', 'MaxKeys': 1000}
+        if token:
+            kwargs['ContinuationToken'] = token
+        response = s3.list_objects_v2(**kwargs)
+        for obj in response.get('Contents', []):
+            if blueprint_id in obj['Key'] and obj['Key'].endswith('status.json'):
+                return s3.get_object(Bucket=BUCKET_NAME, Key=obj['Key'])
+        if not response.get('IsTruncated'):
+            return None
+        token = response['NextContinuationToken']
+
+
+def benchmark_index(sizes, lookups, latency_ms, scan_max):
+    """
+    Compare status lookups through the blueprint ID index with the legacy
+    bucket scan as the number of stored blueprints grows.
+    """
+    from functions import status_handler
+
+    print_header("Blueprint Lookup: ID index vs uploads/ scan")
+    print(f"Simulated S3 latency: {latency_ms}ms per request")
+    print(f"\n{'Blueprints':>12} {'Index p50':>12} {'Index reqs':>11} {'Scan p50':>12} {'Scan reqs':>10}")
+
+    for size in sizes:
+        s3 = LocalS3Client()
+        populate_blueprints(s3, size)
+        s3.latency = latency_ms / 1000.0
+        status_handler.s3_client = s3
+
+        # Look up blueprints spread across the key space
+        rng = random.Random(0)
+        targets = [f"blueprint-{rng.randrange(size):012x}" for _ in range(lookups)]
+
+        index_times = []
+        s3.request_counts.clear()
+        for blueprint_id in targets:
+            start = time.perf_counter()
+            response = status_handler.lambda_handler({'pathParameters': {'blueprintId': blueprint_id}}, None)
+            index_times.append(time.perf_counter() - start)
+            assert response['statusCode'] == 200, response
+        index_requests = sum(s3.request_counts.values()) / lookups
+
+        scan_p50 = scan_requests = None
+        if size <= scan_max:
+            scan_times = []
+            s3.request_counts.clear()
+            for blueprint_id in targets:
+                start = time.perf_counter()
+                assert legacy_scan_lookup(s3, blueprint_id) is not None
+                scan_times.append(time.perf_counter() - start)
+            scan_p50 = statistics.median(scan_times) * 1000
+            scan_requests = sum(s3.request_counts.values()) / lookups
+
+        index_p50 = statistics.median(index_times) * 1000
+        scan_cols = (f"{scan_p50:>10.2f}ms {scan_requests:>10.1f}" if scan_p50 is not None
+                     else f"{'skipped':>12} {'-':>10}")
+        print(f"{size:>12,} {index_p50:>10.2f}ms {index_requests:>11.1f} {scan_cols}")
+
+
+def seed_uploads(s3, count, images=None):
+    """
+    Write metadata and an upload status for `count` blueprints, plus the
+    uploaded file if `images` (one body per blueprint) is given
+    """
+    jobs = []
+    for i in range(count):
+        blueprint_id = f"blueprint-{i:012x}"
+        session_id = f"session-{i % 10}"
+        prefix = f"uploads/{session_id}/{blueprint_id}/"
+        if images:
+            s3.put_object(Bucket=BUCKET_NAME, Key=f"{prefix}original.png", Body=images[i])
+        s3.put_object(Bucket=BUCKET_NAME, Key=f"{prefix}metadata.json", Body=json.dumps({
+            'blueprintId': blueprint_id, 'sessionId': session_id, 's3Key': f"{prefix}original.png"
+        }))
+        s3.put_object(Bucket=BUCKET_NAME, Key=f"{prefix}status.json", Body=json.dumps({
+            'blueprintId': blueprint_id, 'status': 'processing', 'stage': 'upload', 'progress': 10
+        }))
+        jobs.append((blueprint_id, session_id))
+    return jobs
+
+
+def read_status(s3, blueprint_id, session_id):
+    obj = s3.get_object(Bucket=BUCKET_NAME, Key=f"uploads/{session_id}/{blueprint_id}/status.json")
+    return json.loads(obj['Body'].read())
+
+
+def burst_detect(handler, jobs, concurrency):
+    """
+    Send every /detect request at once through `concurrency` Lambda slots.
+
+    Returns:
+        list: Per-request (status code, seconds until the response)
+    """
+    start = time.perf_counter()
+
+    def call(job):
+        blueprint_id, session_id = job
+        response = handler({'body': json.dumps({'blueprintId': blueprint_id, 'sessionId': session_id})}, None)
+        return response['statusCode'], time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(call, jobs))
+
+
+def benchmark_async(requests, concurrency, model_latency_ms):
+    """
+    Compare a burst of synchronous /detect requests with the queued mode,
+    where the API handler only enqueues and inference_worker does the work.
+    """
+    from functions import inference_handler, inference_worker
+    from functions.status_store import S3StatusBackend, StatusStore
+
+    print_header("/detect: synchronous vs queued")
+    print(f"Burst of {requests} requests, {concurrency} concurrent Lambdas, "
+          f"{model_latency_ms}ms SageMaker latency")
+    print(f"\n{'Mode':<8} {'p50':>10} {'p95':>10} {'max':>10} {'Codes':>12} {'S3 PUTs':>8} {'Done':>6}")
+
+    for mode in ('sync', 'async'):
+        s3 = LocalS3Client()
+        queue = LocalQueue()
+        jobs = seed_uploads(s3, requests)
+        inference_handler.s3_client = s3
+        inference_handler.status_store = StatusStore(S3StatusBackend(s3, BUCKET_NAME))
+        inference_handler.sqs_client = queue
+        inference_handler.sagemaker_client = LocalSageMakerRuntime(
+            latency=model_latency_ms / 1000.0,
+            detections=[{'class': 'room', 'confidence': 0.9, 'boundingBox': {'x': 0, 'y': 0, 'width': 10, 'height': 10}}]
+        )
+        inference_handler.INFERENCE_MODE = mode
+        inference_handler.RESULTS_CACHE_ENABLED = False
+        s3.request_counts.clear()
+
+        # The handlers' per-request logging would drown the table
+        with contextlib.redirect_stdout(io.StringIO()):
+            responses = burst_detect(inference_handler.lambda_handler, jobs, concurrency)
+
+            if mode == 'async':
+                # Every blueprint must look in progress to the polling hook
+                for blueprint_id, session_id in jobs:
+                    status = read_status(s3, blueprint_id, session_id)
+                    assert status['status'] == 'processing' and status['stage'] == 'upload', status
+                queue.drain(inference_worker.lambda_handler, batch_size=1)
+
+        statuses = [read_status(s3, *job) for job in jobs]
+        done = sum(1 for status in statuses if status['status'] == 'completed')
+
+        latencies = sorted(seconds * 1000 for _, seconds in responses)
+        codes = ','.join(sorted({str(code) for code, _ in responses}))
+        p95 = latencies[int(0.95 * (len(latencies) - 1))]
+        print(f"{mode:<8} {statistics.median(latencies):>8.1f}ms {p95:>8.1f}ms {latencies[-1]:>8.1f}ms "
+              f"{codes:>12} {s3.request_counts['PutObject']:>8} {done:>6}")
+
+
+def benchmark_worker_batch(jobs, batch_sizes, model_latency_ms, image_latency_ms, wait_ms):
+    """
+    Queued /detect jobs through inference_worker with one job per
+    invocation vs several, whose SageMaker calls the InvocationBatcher
+    merges into batch invocations.
+    """
+    from functions import inference_handler, inference_worker
+    from functions.status_store import S3StatusBackend, StatusStore
+
+    print_header("Inference worker: one job per invocation vs batched invocations")
+    print(f"{jobs} queued jobs, {model_latency_ms}ms per invocation + {image_latency_ms}ms per extra image, "
+          f"{wait_ms}ms batch wait")
+    print(f"\n{'SQS batch':>9} {'Lambdas':>8} {'Lambda time':>12} {'Invocations':>12} {'Images':>7} "
+          f"{'Fill':>6} {'Delay p50':>10} {'Done':>6}")
+
+    for batch_size in batch_sizes:
+        s3 = LocalS3Client()
+        queue = LocalQueue()
+        seeded = seed_uploads(s3, jobs)
+        sagemaker = LocalSageMakerRuntime(
+            latency=model_latency_ms / 1000.0,
+            image_latency=image_latency_ms / 1000.0,
+            detections=[{'class': 'room', 'confidence': 0.9, 'boundingBox': {'x': 0, 'y': 0, 'width': 10, 'height': 10}}]
+        )
+        inference_handler.s3_client = s3
+        inference_handler.status_store = StatusStore(S3StatusBackend(s3, BUCKET_NAME))
+        inference_handler.sqs_client = queue
+        inference_handler.sagemaker_client = sagemaker
+        inference_handler.RESULTS_CACHE_ENABLED = False
+        inference_worker.INVOKE_BATCH_MAX_IMAGES = batch_size
+        inference_worker.INVOKE_BATCH_WAIT_MS = wait_ms
+        inference_worker._batcher = None
+
+        # The EMF lines of the batcher carry its metrics
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            for blueprint_id, session_id in seeded:
+                inference_handler.enqueue_job(blueprint_id, session_id,
+                                              f"uploads/{session_id}/{blueprint_id}/original.png", 0.5)
+            start = time.perf_counter()
+            lambdas = queue.drain(inference_worker.lambda_handler, batch_size=batch_size)
+            elapsed = time.perf_counter() - start
+
+        batches = [json.loads(line) for line in output.getvalue().splitlines()
+                   if line.startswith('{') and 'InvocationBatchSize' in line]
+        fill = statistics.mean(b['InvocationBatchFillRatio'] for b in batches) if batches else 1 / batch_size
+        delay = f"{statistics.median(b['InvocationQueueDelayMs'] for b in batches):.1f}ms" if batches else '-'
+        done = sum(1 for job in seeded if read_status(s3, *job)['status'] == 'completed')
+        print(f"{batch_size:>9} {lambdas:>8} {elapsed:>11.1f}s {sagemaker.request_counts['InvokeEndpoint']:>12} "
+              f"{sagemaker.request_counts['Images']:>7} {fill:>6.2f} {delay:>10} {done:>6}")
+
+
+class DirectStatusStore:
+    """The previous status path: one full put_object per stage, inline"""
+
+    def __init__(self, s3):
+        self.s3 = s3
+
+    def set_stage(self, key, stage, message, restart=False, **fields):
+        from functions.status_store import STAGES
+        status, progress, estimated_time_remaining = STAGES[stage]
+        self.s3.put_object(Bucket=BUCKET_NAME, Key=key, Body=json.dumps(dict(
+            fields, status=status, stage=stage, progress=progress,
+            estimatedTimeRemaining=estimated_time_remaining, message=message
+        )), ContentType='application/json')
+        return True
+
+    def release(self, key):
+        pass
+
+
+def benchmark_status(blueprints, latency_ms, model_latency_ms):
+    """
+    S3 requests and handler time per blueprint for the status writes of a
+    synchronous /detect, with inline PUTs vs the write-behind StatusStore.
+    """
+    from functions import inference_handler
+    from functions.status_store import S3StatusBackend, StatusStore
+
+    print_header("status.json writes: inline PUTs vs StatusStore")
+    print(f"Simulated S3 latency: {latency_ms}ms, SageMaker latency: {model_latency_ms}ms")
+    print(f"\n{'Store':<12} {'GET/bp':>8} {'PUT/bp':>8} {'status PUT/bp':>14} {'Handler p50':>12}")
+
+    for name in ('inline', 'StatusStore'):
+        s3 = LocalS3Client()
+        jobs = seed_uploads(s3, blueprints)
+        s3.latency = latency_ms / 1000.0
+        inference_handler.s3_client = s3
+        inference_handler.sagemaker_client = LocalSageMakerRuntime(latency=model_latency_ms / 1000.0)
+        inference_handler.INFERENCE_MODE = 'sync'
+        inference_handler.RESULTS_CACHE_ENABLED = False
+        inference_handler.status_store = (DirectStatusStore(s3) if name == 'inline'
+                                          else StatusStore(S3StatusBackend(s3, BUCKET_NAME)))
+        s3.request_counts.clear()
+
+        # Count status PUTs separately from the metadata GET and results PUT
+        put_object = s3.put_object
+        status_puts = []
+
+        def counting_put(**kwargs):
+            if kwargs['Key'].endswith('status.json'):
+                status_puts.append(kwargs['Key'])
+            return put_object(**kwargs)
+        s3.put_object = counting_put
+
+        times = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            for blueprint_id, session_id in jobs:
+                start = time.perf_counter()
+                response = inference_handler.lambda_handler(
+                    {'body': json.dumps({'blueprintId': blueprint_id, 'sessionId': session_id})}, None
+                )
+                times.append(time.perf_counter() - start)
+                assert response['statusCode'] == 200, response
+
+        gets = s3.request_counts['GetObject'] / blueprints
+        puts = s3.request_counts['PutObject'] / blueprints
+        for blueprint_id, session_id in jobs:
+            assert read_status(s3, blueprint_id, session_id)['status'] == 'completed'
+        print(f"{name:<12} {gets:>8.1f} {puts:>8.1f} {len(status_puts) / blueprints:>14.1f} "
+              f"{statistics.median(times) * 1000:>10.1f}ms")
+
+
+def benchmark_cache(uploads, unique, max_entries, latency_ms, model_latency_ms):
+    """
+    Repeated uploads of the same drawings, with and without the content-hash
+    results cache.
+    """
+    from functions import inference_handler
+    from functions.results_cache import ResultsCache
+    from functions.status_store import S3StatusBackend, StatusStore
+
+    print_header("Results cache: repeated uploads")
+    print(f"{uploads} uploads of {unique} distinct drawings, in-process LRU of {max_entries}")
+    print(f"Simulated S3 latency: {latency_ms}ms, SageMaker latency: {model_latency_ms}ms")
+    print(f"\n{'Cache':<8} {'Invocations':>12} {'Hit rate':>9} {'Memory':>7} {'S3':>5} "
+          f"{'Hit p50':>10} {'Miss p50':>10}")
+
+    rng = random.Random(0)
+    drawings = [f"drawing-{i}".encode('utf-8') * 4096 for i in range(unique)]
+    images = [rng.choice(drawings) for _ in range(uploads)]
+
+    for enabled in (False, True):
+        s3 = LocalS3Client()
+        jobs = seed_uploads(s3, uploads, images)
+        s3.latency = latency_ms / 1000.0
+        sagemaker = LocalSageMakerRuntime(latency=model_latency_ms / 1000.0)
+        cache = ResultsCache(s3, BUCKET_NAME, max_entries=max_entries)
+        inference_handler.s3_client = s3
+        inference_handler.sagemaker_client = sagemaker
+        inference_handler.status_store = StatusStore(S3StatusBackend(s3, BUCKET_NAME))
+        inference_handler.results_cache = cache
+        inference_handler.RESULTS_CACHE_ENABLED = enabled
+        inference_handler.INFERENCE_MODE = 'sync'
+
+        hit_times, miss_times = [], []
+        with contextlib.redirect_stdout(io.StringIO()):
+            for blueprint_id, session_id in jobs:
+                start = time.perf_counter()
+                response = inference_handler.lambda_handler(
+                    {'body': json.dumps({'blueprintId': blueprint_id, 'sessionId': session_id})}, None
+                )
+                elapsed = time.perf_counter() - start
+                assert response['statusCode'] == 200, response
+                cached = json.loads(response['body'])['results']['cached']
+                (hit_times if cached else miss_times).append(elapsed * 1000)
+
+        invocations = sagemaker.request_counts['InvokeEndpoint']
+        hit_p50 = f"{statistics.median(hit_times):>8.1f}ms" if hit_times else f"{'-':>10}"
+        miss_p50 = f"{statistics.median(miss_times):>8.1f}ms" if miss_times else f"{'-':>10}"
+        print(f"{'on' if enabled else 'off':<8} {invocations:>12} {len(hit_times) / uploads:>8.0%} "
+              f"{cache.memory_hits:>7} {cache.hits - cache.memory_hits:>5} {hit_p50} {miss_p50}")
+
+
+def synthetic_detections(count, seed=0):
+    """Raw endpoint detections with confidences spread over (0.05, 1)"""
+    rng = random.Random(seed)
+    classes = ['room', 'door', 'window', 'wall', 'stairs', 'furniture', 'fixture']
+    detections = []
+    for room_id in range(1, count + 1):
+        x, y = rng.randrange(2000), rng.randrange(1500)
+        width, height = rng.randrange(10, 300), rng.randrange(10, 300)
+        detections.append({
+            'roomId': room_id,
+            'boundingBox': {'x': x, 'y': y, 'width': width, 'height': height},
+            'confidence': rng.uniform(0.05, 1.0),
+            'class': rng.choice(classes),
+            'area': width * height
+        })
+    detections.sort(key=lambda d: -d['confidence'])
+    return detections
+
+
+def benchmark_threshold(detections, thresholds, latency_ms, model_latency_ms):
+    """
+    Cost of a new confidence threshold: re-running /detect vs filtering the
+    stored raw detection set in results_handler.
+    """
+    from functions import blueprint_index, inference_handler, results_handler
+    from functions.status_store import S3StatusBackend, StatusStore
+
+    print_header("Confidence threshold change: /detect vs stored raw set")
+    print(f"{detections} raw detections, simulated S3 latency {latency_ms}ms, "
+          f"SageMaker latency {model_latency_ms}ms")
+
+    s3 = LocalS3Client()
+    [(blueprint_id, session_id)] = seed_uploads(s3, 1, [b'drawing'])
+    blueprint_index.write_index(s3, BUCKET_NAME, blueprint_id, session_id)
+    raw_detections = synthetic_detections(detections)
+    s3.latency = latency_ms / 1000.0
+    sagemaker = LocalSageMakerRuntime(latency=model_latency_ms / 1000.0, detections=raw_detections)
+
+    inference_handler.s3_client = s3
+    inference_handler.sagemaker_client = sagemaker
+    inference_handler.status_store = StatusStore(S3StatusBackend(s3, BUCKET_NAME))
+    inference_handler.RESULTS_CACHE_ENABLED = False
+    inference_handler.INFERENCE_MODE = 'sync'
+    results_handler.s3_client = s3
+
+    print(f"\n{'Threshold':>10} {'Detections':>11} {'/detect':>10} {'results?confidence':>19} {'S3 GETs':>8}")
+    with contextlib.redirect_stdout(io.StringIO()):
+        for threshold in thresholds:
+            start = time.perf_counter()
+            detect = inference_handler.lambda_handler({'body': json.dumps({
+                'blueprintId': blueprint_id, 'sessionId': session_id, 'confidence': threshold
+            })}, None)
+            detect_ms = (time.perf_counter() - start) * 1000
+
+            s3.request_counts.clear()
+            start = time.perf_counter()
+            response = results_handler.lambda_handler({
+                'pathParameters': {'blueprintId': blueprint_id},
+                'queryStringParameters': {'confidence': str(threshold)}
+            }, None)
+            filter_ms = (time.perf_counter() - start) * 1000
+
+            filtered = json.loads(response['body'])
+            expected = json.loads(detect['body'])['results']
+            assert filtered['detections'] == expected['detections']
+            assert filtered['statistics'] == expected['statistics']
+            print(f"{threshold:>10.2f} {len(filtered['detections']):>11} {detect_ms:>8.1f}ms "
+                  f"{filter_ms:>17.1f}ms {s3.request_counts['GetObject']:>8}", file=sys.__stdout__)
+
+
+def benchmark_clients(requests, concurrency, handshake_ms):
+    """
+    Per-request S3 overhead of real boto3 clients against LocalS3Server:
+    a new client per request, one shared client with botocore's default
+    Config, and the shared client configured by functions/aws_clients.py.
+    Each request reads a status document (HEAD + GET), as the status
+    handler does.
+    """
+    import boto3
+    from botocore.config import Config
+    from functions.aws_clients import client_config
+
+    server = LocalS3Server(handshake_ms=handshake_ms).start()
+    keys = [f"uploads/session-0/blueprint-{i}/status.json" for i in range(concurrency)]
+    for key in keys:
+        server.s3.put_object(Bucket=BUCKET_NAME, Key=key, Body=json.dumps({'status': 'processing'}),
+                             ContentType='application/json')
+
+    path_style = Config(s3={'addressing_style': 'path'})
+
+    def make_client(config):
+        return boto3.client('s3', endpoint_url=server.endpoint_url, config=config.merge(path_style))
+
+    print_header("S3 client reuse: per-request overhead")
+    print(f"{requests} status reads (HEAD + GET), {concurrency} concurrent, "
+          f"{handshake_ms}ms simulated connection set-up")
+    print(f"\n{'Client':<10} {'p50':>9} {'p95':>9} {'Requests/s':>11} {'Connections':>12}")
+
+    modes = [
+        ('fresh', None),
+        ('default', make_client(Config())),
+        ('tuned', make_client(client_config('s3')))
+    ]
+    for name, shared in modes:
+        def read(index):
+            start = time.perf_counter()
+            client = shared or make_client(Config())
+            key = keys[index % len(keys)]
+            client.head_object(Bucket=BUCKET_NAME, Key=key)
+            client.get_object(Bucket=BUCKET_NAME, Key=key)['Body'].read()
+            return time.perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            # Fill the shared client's connection pool, as in a warm Lambda
+            list(executor.map(read, range(concurrency)))
+            server.connections = 0
+
+            start = time.perf_counter()
+            times = sorted(executor.map(read, range(requests)))
+            elapsed = time.perf_counter() - start
+
+        p95 = times[max(0, int(len(times) * 0.95) - 1)]
+        print(f"{name:<10} {statistics.median(times) * 1000:>7.1f}ms {p95 * 1000:>7.1f}ms "
+              f"{requests / elapsed:>11.1f} {server.connections:>12}")
+
+    server.stop()
+
+
+def benchmark_push(users, poll_interval_ms, model_latency_ms, latency_ms):
+    """
+    Backend request volume for delivering progress to `users` concurrent
+    Processing pages: polling /status every poll_interval_ms, or one
+    WebSocket subscription with pushed stage changes.
+    """
+    from functions import inference_handler, status_handler, websocket_handler
+    from functions.blueprint_index import write_index
+    from functions.progress_push import ProgressNotifier
+    from functions.status_store import S3StatusBackend, StatusStore
+
+    print_header("Progress delivery: polling vs push")
+    print(f"{users} concurrent blueprints, {model_latency_ms / 1000:.1f}s SageMaker latency, "
+          f"{poll_interval_ms:.0f}ms poll interval, {latency_ms}ms S3 latency")
+    print(f"\n{'Mode':<8} {'Invocations':>12} {'S3 GET':>8} {'S3 LIST':>8} {'S3 PUT/DEL':>11} "
+          f"{'Pushes':>7} {'Seen p50':>10} {'Seen max':>10}")
+
+    for mode in ('poll', 'push'):
+        s3 = LocalS3Client()
+        jobs = seed_uploads(s3, users)
+        for blueprint_id, session_id in jobs:
+            write_index(s3, BUCKET_NAME, blueprint_id, session_id)
+
+        gateway = LocalWebSocketGateway(websocket_handler.lambda_handler)
+        notifier = ProgressNotifier(s3, BUCKET_NAME, gateway if mode == 'push' else None)
+        websocket_handler.s3_client = s3
+        websocket_handler.get_notifier = lambda event: notifier
+        status_handler.s3_client = s3
+        inference_handler.s3_client = s3
+        inference_handler.sagemaker_client = LocalSageMakerRuntime(latency=model_latency_ms / 1000.0)
+        inference_handler.progress_notifier = notifier
+        inference_handler.status_store = StatusStore(
+            S3StatusBackend(s3, BUCKET_NAME), on_write=inference_handler.push_status
+        )
+        inference_handler.INFERENCE_MODE = 'sync'
+        inference_handler.RESULTS_CACHE_ENABLED = False
+        s3.request_counts.clear()
+        s3.latency = latency_ms / 1000.0
+
+        def process(job):
+            blueprint_id, session_id = job
+            inference_handler.lambda_handler(
+                {'body': json.dumps({'blueprintId': blueprint_id, 'sessionId': session_id})}, None
+            )
+            return time.perf_counter()
+
+        def poll(blueprint_id):
+            invocations = 0
+            while True:
+                response = status_handler.lambda_handler({'pathParameters': {'blueprintId': blueprint_id}}, None)
+                invocations += 1
+                if json.loads(response['body']).get('status') == 'completed':
+                    return time.perf_counter(), invocations
+                time.sleep(poll_interval_ms / 1000.0)
+
+        def subscribe(blueprint_id):
+            connection = gateway.connect()
+            connection.send({'action': 'subscribe', 'blueprintId': blueprint_id})
+            while True:
+                message = connection.receive(timeout=60)
+                assert message is not None, f"no update for {blueprint_id}"
+                if message.get('status') == 'completed':
+                    connection.close()
+                    return time.perf_counter(), 0
+
+        client = poll if mode == 'poll' else subscribe
+        with contextlib.redirect_stdout(io.StringIO()):
+            with ThreadPoolExecutor(max_workers=2 * users) as pool:
+                clients = [pool.submit(client, blueprint_id) for blueprint_id, _ in jobs]
+                finished = list(pool.map(process, jobs))
+                seen = [future.result() for future in clients]
+
+        invocations = sum(count for _, count in seen) + sum(
+            count for name, count in gateway.request_counts.items() if name.startswith('Invoke')
+        )
+        lags = sorted(max(0.0, seen_at - done_at) * 1000 for (seen_at, _), done_at in zip(seen, finished))
+        writes = s3.request_counts['PutObject'] + s3.request_counts['DeleteObject']
+        print(f"{mode:<8} {invocations:>12} {s3.request_counts['GetObject'] + s3.request_counts['HeadObject']:>8} "
+              f"{s3.request_counts['ListObjectsV2']:>8} {writes:>11} {gateway.request_counts['PostToConnection']:>7} "
+              f"{statistics.median(lags):>8.0f}ms {lags[-1]:>8.0f}ms")
+
+
+def benchmark_conditional(polls, changes, detections, handshake_ms):
+    """
+    Repeated /status and /results reads through a real boto3 client against
+    LocalS3Server, with and without the client revalidating its copy
+    (If-None-Match with the last ETag, as a browser does for
+    `Cache-Control: no-cache` responses). The status changes `changes`
+    times during the polls.
+    """
+    import boto3
+    from botocore.config import Config
+    from functions import results_handler, status_handler
+    from functions.aws_clients import client_config
+    from functions.blueprint_index import write_index
+    from functions.detections import build_results, detections_key
+    from functions.raw_set_cache import RawSetCache
+
+    server = LocalS3Server(handshake_ms=handshake_ms).start()
+    s3 = server.s3
+    [(blueprint_id, session_id)] = seed_uploads(s3, 1)
+    write_index(s3, BUCKET_NAME, blueprint_id, session_id)
+    prefix = f"uploads/{session_id}/{blueprint_id}/"
+    raw = {
+        'blueprintId': blueprint_id, 'modelVersion': 'v1', 'processingTime': 1.0,
+        'detectedAt': '2024-01-01T00:00:00', 'confidence': 0.5, 'rawConfidence': 0.05,
+        'detections': synthetic_detections(detections), 'dimensions': {'width': 2048, 'height': 1536}
+    }
+    s3.put_object(Bucket=BUCKET_NAME, Key=detections_key(prefix), Body=json.dumps(raw),
+                  ContentType='application/json')
+    s3.put_object(Bucket=BUCKET_NAME, Key=f"{prefix}results.json", Body=json.dumps(build_results(raw, 0.5)),
+                  ContentType='application/json')
+
+    client = boto3.client('s3', endpoint_url=server.endpoint_url,
+                          config=client_config('s3').merge(Config(s3={'addressing_style': 'path'})))
+    status_handler.s3_client = client
+    results_handler.s3_client = client
+    # Measure revalidation by the client alone, without the handler's own
+    # cache of parsed raw sets
+    results_handler.raw_sets = RawSetCache(0)
+
+    print_header("Conditional GET: repeated status and results reads")
+    print(f"{polls} reads per endpoint, status changes {changes} times, "
+          f"{detections} raw detections, real boto3 client")
+    print(f"\n{'Endpoint':<24} {'Mode':<12} {'200':>5} {'304':>5} {'S3 bytes':>10} "
+          f"{'Body bytes':>11} {'p50':>8} {'p95':>8}")
+
+    endpoints = [
+        ('status', status_handler, None),
+        ('results', results_handler, None),
+        ('results?confidence=0.7', results_handler, {'confidence': '0.7'}),
+    ]
+    for name, handler, query in endpoints:
+        for conditional in (False, True):
+            s3.bytes_sent = 0
+            etag = None
+            codes = Counter()
+            body_bytes = 0
+            times = []
+            for index in range(polls):
+                if name == 'status' and index and index % max(1, polls // (changes + 1)) == 0:
+                    s3.put_object(Bucket=BUCKET_NAME, Key=f"{prefix}status.json", Body=json.dumps({
+                        'blueprintId': blueprint_id, 'status': 'processing', 'stage': 'inference',
+                        'progress': 10 + 80 * index // polls
+                    }), ContentType='application/json')
+
+                event = {'pathParameters': {'blueprintId': blueprint_id}, 'queryStringParameters': query,
+                         'headers': {'If-None-Match': etag} if conditional and etag else {}}
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    response = handler.lambda_handler(event, None)
+                times.append(time.perf_counter() - start)
+
+                assert response['statusCode'] in (200, 304), response
+                codes[response['statusCode']] += 1
+                body_bytes += len(response['body'])
+                etag = response['headers'].get('ETag', etag)
+
+            times.sort()
+            p95 = times[max(0, int(len(times) * 0.95) - 1)]
+            print(f"{name:<24} {'If-None-Match' if conditional else 'plain':<12} {codes[200]:>5} {codes[304]:>5} "
+                  f"{s3.bytes_sent:>10,} {body_bytes:>11,} {statistics.median(times) * 1000:>6.2f}ms "
+                  f"{p95 * 1000:>6.2f}ms")
+
+    server.stop()
+
+
+def benchmark_codec(sizes, repeats):
+    """
+    Payload size and encode / decode time of a results document as plain
+    JSON and in the columnar representation, uncompressed, gzip and brotli.
+    Encoding starts from the results dict, decoding ends with it.
+    """
+    from functions.detections import build_results
+    from functions.results_codec import compress, decompress, from_columnar, to_columnar, _brotli
+
+    print_header("Results encoding: size and encode/decode time")
+    encodings = [None, 'gzip'] + (['br'] if _brotli() is not None else [])
+    if 'br' not in encodings:
+        print("brotli is not installed; skipping br")
+
+    def encoder(columnar, encoding):
+        def encode(results):
+            document = to_columnar(results) if columnar else results
+            separators = (',', ':') if columnar else None
+            data = json.dumps(document, separators=separators).encode('utf-8')
+            return compress(data, encoding) if encoding else data
+        return encode
+
+    def decoder(columnar, encoding):
+        def decode(data):
+            document = json.loads(decompress(data, encoding) if encoding else data)
+            return from_columnar(document) if columnar else document
+        return decode
+
+    def median_ms(function, argument):
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            output = function(argument)
+            times.append(time.perf_counter() - start)
+        return statistics.median(times) * 1000, output
+
+    print(f"\n{'Detections':>10} {'Format':<10} {'Encoding':<9} {'Bytes':>11} {'Ratio':>7} "
+          f"{'Encode':>9} {'Decode':>9}")
+    for size in sizes:
+        raw = {
+            'blueprintId': 'blueprint-0', 'modelVersion': 'v1', 'processingTime': 1.0,
+            'detectedAt': '2024-01-01T00:00:00', 'rawConfidence': 0.05,
+            'detections': synthetic_detections(size), 'dimensions': {'width': 2048, 'height': 1536}
+        }
+        results = build_results(raw, 0.05)
+        baseline = None
+        for columnar in (False, True):
+            for encoding in encodings:
+                encode_ms, data = median_ms(encoder(columnar, encoding), results)
+                decode_ms, decoded = median_ms(decoder(columnar, encoding), data)
+                assert decoded == results
+                baseline = baseline or len(data)
+                print(f"{size:>10,} {'columnar' if columnar else 'json':<10} {encoding or '-':<9} "
+                      f"{len(data):>11,} {len(data) / baseline:>6.2f}x {encode_ms:>7.2f}ms {decode_ms:>7.2f}ms")
+
+
+def benchmark_viewport(detections, queries, latency_ms):
+    """
+    /results for a large blueprint: the full set vs zoomed-in viewports,
+    on a cold container and with the parsed raw set cached, vs one page.
+    Also times the viewport lookup itself, scanning vs the spatial index.
+    """
+    from functions import results_handler
+    from functions.blueprint_index import write_index
+    from functions.detections import build_results, build_spatial_index, detections_in_viewport, detections_key
+    from functions.raw_set_cache import RawSetCache
+
+    print_header("Results queries: full set vs viewport vs page")
+    s3 = LocalS3Client()
+    [(blueprint_id, session_id)] = seed_uploads(s3, 1)
+    write_index(s3, BUCKET_NAME, blueprint_id, session_id)
+    prefix = f"uploads/{session_id}/{blueprint_id}/"
+    width, height = 2048, 1536
+    raw = {
+        'blueprintId': blueprint_id, 'modelVersion': 'v1', 'processingTime': 1.0,
+        'detectedAt': '2024-01-01T00:00:00', 'confidence': 0.05, 'rawConfidence': 0.05,
+        'detections': synthetic_detections(detections), 'dimensions': {'width': width, 'height': height}
+    }
+    unindexed_bytes = len(json.dumps(raw))
+    start = time.perf_counter()
+    raw['spatialIndex'] = build_spatial_index(raw['detections'], raw['dimensions'])
+    build_ms = (time.perf_counter() - start) * 1000
+    s3.put_object(Bucket=BUCKET_NAME, Key=detections_key(prefix), Body=json.dumps(raw))
+    results = build_results(raw, 0.05)
+    s3.put_object(Bucket=BUCKET_NAME, Key=f"{prefix}results.json", Body=json.dumps(results))
+    results_handler.s3_client = s3
+    s3.latency = latency_ms / 1000.0
+
+    rng = random.Random(0)
+    viewports = [f"{rng.randrange(width * 3 // 4)},{rng.randrange(height * 3 // 4)},{width // 4},{height // 4}"
+                 for _ in range(queries)]
+
+    print(f"{detections:,} raw detections, {queries} queries per row, {latency_ms}ms S3 latency")
+    print(f"Index build {build_ms:.1f}ms, detections.json {unindexed_bytes:,} -> "
+          f"{len(s3.objects[BUCKET_NAME][detections_key(prefix)]['Body']):,} bytes")
+
+    unindexed = dict(raw)
+    del unindexed['spatialIndex']
+    for name, source in (('scan', unindexed), ('index', raw)):
+        start = time.perf_counter()
+        for viewport in viewports:
+            detections_in_viewport(source, dict(zip(('x', 'y', 'width', 'height'), map(float, viewport.split(',')))))
+        print(f"Viewport lookup on the parsed set, {name}: {(time.perf_counter() - start) * 1000 / queries:.2f}ms")
+
+    # Page cursors stay within the detections the default threshold keeps
+    pages = max(1, len(results['detections']) // 500)
+    rows = [
+        ('full set', 0, lambda i: None),
+        ('viewport 1/16, cold', 0, lambda i: {'viewport': viewports[i]}),
+        ('viewport 1/16, warm', 4, lambda i: {'viewport': viewports[i]}),
+        ('page of 500, warm', 4, lambda i: {'limit': '500', 'cursor': str(500 * (i % pages))}),
+    ]
+
+    print(f"\n{'Query':<22} {'Detections':>11} {'Body bytes':>11} {'S3 bytes':>11} {'p50':>9} {'p95':>9}")
+    expected = {}
+    for name, cache_entries, make_query in rows:
+        results_handler.raw_sets = RawSetCache(cache_entries)
+        s3.bytes_sent = 0
+        times, sizes, counts = [], [], []
+        for i in range(queries):
+            event = {'pathParameters': {'blueprintId': blueprint_id}, 'queryStringParameters': make_query(i)}
+            start = time.perf_counter()
+            response = results_handler.lambda_handler(event, None)
+            times.append(time.perf_counter() - start)
+            body = json.loads(response['body'])
+            if name.startswith('viewport'):
+                # Cached and freshly loaded sets must agree
+                ids = [d['roomId'] for d in body['detections']]
+                assert expected.setdefault(i, ids) == ids
+            sizes.append(len(response['body']))
+            counts.append(len(body['detections']))
+
+        times.sort()
+        p95 = times[max(0, int(len(times) * 0.95) - 1)]
+        print(f"{name:<22} {statistics.median(counts):>11,.0f} {statistics.median(sizes):>11,.0f} "
+              f"{s3.bytes_sent // queries:>11,} {statistics.median(times) * 1000:>7.2f}ms {p95 * 1000:>7.2f}ms")
+
+
+def put_url(url, body, content_type=None):
+    """PUT a body to a presigned URL on its own connection; returns the ETag"""
+    import http.client
+    from urllib.parse import urlsplit
+
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port)
+    try:
+        headers = {'Content-Type': content_type} if content_type else {}
+        connection.request('PUT', f"{parts.path}?{parts.query}", body=body, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        assert response.status == 200, response.status
+        return response.getheader('ETag')
+    finally:
+        connection.close()
+
+
+def benchmark_upload(size_mb, part_mb, concurrencies, connection_mbps, link_mbps):
+    """
+    Upload throughput of a large blueprint to LocalS3Server over a link that
+    limits each connection to `connection_mbps` and all connections together
+    to `link_mbps`: one presigned PUT vs a multipart upload with parts sent
+    `concurrency` at a time, as frontend/src/config/api.js does. Each upload
+    goes through upload_handler and multipart_upload_handler, and the
+    assembled object is checked against the file.
+    """
+    from functions import multipart_upload_handler, upload_handler
+
+    bandwidth = Bandwidth(connection_rate=connection_mbps * 1024 * 1024, link_rate=link_mbps * 1024 * 1024)
+    server = LocalS3Server(upload_bandwidth=bandwidth).start()
+    s3 = server.s3
+    upload_handler.s3_client = upload_handler.presign_client = s3
+    multipart_upload_handler.s3_client = s3
+
+    size = size_mb * 1024 * 1024
+    upload_handler.MAX_UPLOAD_BYTES = multipart_upload_handler.MAX_UPLOAD_BYTES = size
+    upload_handler.PART_SIZE = part_mb * 1024 * 1024
+    data = random.Random(0).randbytes(size)
+
+    def start(multipart):
+        upload_handler.MULTIPART_THRESHOLD = 0 if multipart else size
+        response = upload_handler.lambda_handler({'body': json.dumps({
+            'fileName': 'scan.pdf', 'fileType': 'application/pdf', 'fileSize': size, 'sessionId': 'session-0'
+        })}, None)
+        assert response['statusCode'] == 200, response['body']
+        return json.loads(response['body'])
+
+    def finish(blueprint_id, action, body):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return multipart_upload_handler.lambda_handler({
+                'pathParameters': {'blueprintId': blueprint_id, 'action': action},
+                'body': json.dumps(body)
+            }, None)
+
+    def upload_parts(multipart, concurrency, count=None):
+        part_size = multipart['partSize']
+
+        def send(part):
+            offset = (part['partNumber'] - 1) * part_size
+            body = data[offset:offset + part['size']]
+            return {'partNumber': part['partNumber'], 'etag': put_url(part['url'], body)}
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(send, multipart['parts'][:count]))
+
+    print_header("Large blueprint upload: single PUT vs parallel multipart")
+    print(f"{size_mb}MB file, {part_mb}MB parts; {connection_mbps}MB/s per connection, "
+          f"{link_mbps}MB/s link")
+    print(f"\n{'Upload':<16} {'Parts':>6} {'Time':>8} {'MB/s':>7} {'S3 requests':>12}")
+
+    modes = [('single PUT', None)] + [(f"multipart x{c}", c) for c in concurrencies]
+    for name, concurrency in modes:
+        s3.request_counts.clear()
+        started = time.perf_counter()
+        upload = start(multipart=concurrency is not None)
+        if concurrency is None:
+            put_url(upload['uploadUrl'], data, 'application/pdf')
+            parts = 1
+        else:
+            uploaded = upload_parts(upload['multipart'], concurrency)
+            response = finish(upload['blueprintId'], 'complete',
+                              {'uploadId': upload['multipart']['uploadId'], 'parts': uploaded})
+            assert response['statusCode'] == 200, response['body']
+            parts = len(uploaded)
+        elapsed = time.perf_counter() - started
+
+        assert s3.get_object(Bucket=BUCKET_NAME, Key=upload['s3Key'])['Body'].read() == data
+        print(f"{name:<16} {parts:>6} {elapsed:>7.2f}s {size_mb / elapsed:>7.1f} "
+              f"{sum(s3.request_counts.values()):>12}")
+
+    # An interrupted upload: half the parts sent, then aborted
+    upload = start(multipart=True)
+    upload_parts(upload['multipart'], max(concurrencies), len(upload['multipart']['parts']) // 2)
+    response = finish(upload['blueprintId'], 'abort', {'uploadId': upload['multipart']['uploadId']})
+    assert response['statusCode'] == 200, response['body']
+    assert 'Uploads' not in s3.list_multipart_uploads(Bucket=BUCKET_NAME)
+    assert upload['s3Key'] not in s3._bucket(BUCKET_NAME)
+    print("\nAborted upload: parts discarded, no incomplete uploads left")
+
+    server.stop()
+
+
+def benchmark_batch(files, round_trip_ms, latency_ms, browser_connections):
+    """
+    Cost of preparing a drawing set's uploads: one POST /upload per file,
+    sequentially and `browser_connections` at a time (a browser's HTTP/1.1
+    limit per host), vs one POST /upload/batch. Each API call pays a
+    simulated client-to-Lambda round trip; S3 requests a fixed latency.
+    """
+    from functions import batch_upload_handler, upload_handler
+
+    s3 = LocalS3Client(latency=latency_ms / 1000)
+    upload_handler.s3_client = upload_handler.presign_client = s3
+    batch_upload_handler.s3_client = s3
+    sheets = [
+        {'fileName': f"A-{i:03d}.pdf", 'fileType': 'application/pdf', 'fileSize': 2 * 1024 * 1024}
+        for i in range(files)
+    ]
+
+    def call(handler, body):
+        time.sleep(round_trip_ms / 1000)
+        response = handler({'body': json.dumps(body)}, None)
+        assert response['statusCode'] == 200, response['body']
+        return json.loads(response['body'])
+
+    def per_file(concurrency):
+        def upload(sheet):
+            return call(upload_handler.lambda_handler, {**sheet, 'sessionId': 'session-0'})
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(upload, sheets)), files
+
+    def batch():
+        body = call(batch_upload_handler.lambda_handler, {'sessionId': 'session-0', 'files': sheets})
+        return body['blueprints'], 1
+
+    print_header("Drawing set upload preparation: per-file vs batch")
+    print(f"{files} files, {round_trip_ms}ms per API call, {latency_ms}ms per S3 request")
+    print(f"\n{'Requests':<22} {'API calls':>10} {'S3 requests':>12} {'Time':>9} {'Per file':>9}")
+
+    modes = [
+        ('per file, sequential', lambda: per_file(1)),
+        (f"per file, {browser_connections} at once", lambda: per_file(browser_connections)),
+        ('batch', batch),
+    ]
+    for name, prepare in modes:
+        s3.request_counts.clear()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            blueprints, calls = prepare()
+        elapsed = time.perf_counter() - start
+
+        assert len({blueprint['blueprintId'] for blueprint in blueprints}) == files
+        assert all(blueprint['uploadUrl'] for blueprint in blueprints)
+        print(f"{name:<22} {calls:>10} {sum(s3.request_counts.values()):>12} "
+              f"{elapsed * 1000:>7.0f}ms {elapsed * 1000 / files:>7.1f}ms")
+
+
+def benchmark_batch_detect(blueprints, capacity, concurrency, model_latency_ms, retry_delay):
+    """
+    Inference for a drawing set on an endpoint that serves `capacity`
+    invocations at once and throttles the rest: one synchronous /detect per
+    blueprint, `concurrency` at a time, vs one /detect/batch job whose
+    worker sends up to `concurrency` at once with a fixed or an adaptive
+    (AIMD) limit. Lambda time is the sum of the invocations' durations.
+    """
+    from functions import batch_detect_handler, batch_detect_worker, batch_upload_handler, inference_handler, upload_handler
+    from functions.batch_detect import AdaptiveConcurrency
+    from functions.status_store import S3StatusBackend, StatusStore
+
+    class FixedConcurrency(AdaptiveConcurrency):
+        """Backs off on throttles like the adaptive limit, but stays at its maximum"""
+
+        def __init__(self, max_limit):
+            super().__init__(max_limit, initial=max_limit)
+
+        def release(self, ticket, throttled=False):
+            super().release(ticket, throttled)
+            with self._condition:
+                self.limit = float(self.max_limit)
+
+    detections = synthetic_detections(50)
+    expected = sum(1 for d in detections if d['confidence'] >= 0.5)
+    inference_handler.RETRY_DELAY = retry_delay
+    inference_handler.RESULTS_CACHE_ENABLED = False
+    inference_handler.INFERENCE_MODE = 'sync'
+    batch_detect_worker.MAX_CONCURRENCY = concurrency
+
+    print_header("Drawing set inference: per-blueprint /detect vs batch job")
+    print(f"{blueprints} blueprints, endpoint capacity {capacity}, up to {concurrency} at once, "
+          f"{model_latency_ms}ms per invocation, {retry_delay}s first retry delay")
+    print(f"\n{'Mode':<20} {'Time':>8} {'Done':>6} {'Invocations':>12} {'Throttled':>10} "
+          f"{'Lambdas':>8} {'Lambda time':>12} {'ETA at 25%':>11}")
+
+    for mode in ('per-blueprint', 'batch, fixed', 'batch, adaptive'):
+        s3 = LocalS3Client()
+        queue = LocalQueue()
+        sagemaker = LocalSageMakerRuntime(latency=model_latency_ms / 1000, detections=detections, capacity=capacity)
+        for module in (inference_handler, upload_handler, batch_upload_handler,
+                       batch_detect_handler, batch_detect_worker):
+            module.s3_client = s3
+        upload_handler.presign_client = s3
+        inference_handler.sagemaker_client = sagemaker
+        inference_handler.status_store = StatusStore(S3StatusBackend(s3, BUCKET_NAME))
+        batch_detect_handler.status_store = StatusStore(S3StatusBackend(s3, BUCKET_NAME), write_behind=False)
+        batch_detect_handler.sqs_client = queue
+        batch_detect_worker.AdaptiveConcurrency = FixedConcurrency if mode == 'batch, fixed' else AdaptiveConcurrency
+
+        sheets = [{'fileName': f"A-{i:03d}.png", 'fileType': 'image/png', 'fileSize': 1024} for i in range(blueprints)]
+        with contextlib.redirect_stdout(io.StringIO()):
+            batch = json.loads(batch_upload_handler.lambda_handler(
+                {'body': json.dumps({'sessionId': 'session-0', 'files': sheets})}, None
+            )['body'])
+        batch_id = batch['batchId']
+        status_key = f"uploads/session-0/{batch_id}/status.json"
+
+        # Watch the batch's aggregate status for the ETA it reports at 25%
+        eta = {}
+        watching = threading.Event()
+
+        def watch():
+            while not watching.wait(0.05):
+                try:
+                    status = json.loads(s3.get_object(Bucket=BUCKET_NAME, Key=status_key)['Body'].read())
+                except s3.exceptions.NoSuchKey:
+                    continue
+                done = status.get('completed', 0) + status.get('failed', 0)
+                if 'at' not in eta and done >= blueprints / 4 and status.get('estimatedTimeRemaining') is not None:
+                    eta['at'] = time.perf_counter() + status['estimatedTimeRemaining']
+
+        watcher = threading.Thread(target=watch)
+        watcher.start()
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            if mode == 'per-blueprint':
+                def detect(blueprint):
+                    started = time.perf_counter()
+                    inference_handler.lambda_handler({'body': json.dumps({
+                        'blueprintId': blueprint['blueprintId'], 'sessionId': 'session-0'
+                    })}, None)
+                    return time.perf_counter() - started
+
+                with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                    durations = list(executor.map(detect, batch['blueprints']))
+                lambda_time, lambdas = sum(durations), len(durations)
+            else:
+                response = batch_detect_handler.lambda_handler(
+                    {'body': json.dumps({'sessionId': 'session-0', 'batchId': batch_id})}, None
+                )
+                assert response['statusCode'] == 202, response['body']
+                worker_start = time.perf_counter()
+                queue.drain(batch_detect_worker.lambda_handler)
+                lambda_time, lambdas = time.perf_counter() - worker_start, 2
+        elapsed = time.perf_counter() - start
+        watching.set()
+        watcher.join()
+
+        done = sum(
+            1 for blueprint in batch['blueprints']
+            if read_status(s3, blueprint['blueprintId'], 'session-0')['status'] == 'completed'
+        )
+        if mode != 'per-blueprint':
+            summary = json.loads(s3.get_object(
+                Bucket=BUCKET_NAME, Key=f"uploads/session-0/{batch_id}/summary.json"
+            )['Body'].read())
+            assert summary['completed'] == done
+            assert summary['statistics']['totalDetections'] == done * expected
+        eta_error = f"{eta['at'] - (start + elapsed):+.1f}s" if 'at' in eta else '-'
+        print(f"{mode:<20} {elapsed:>7.1f}s {done:>6} {sagemaker.request_counts['InvokeEndpoint']:>12} "
+              f"{sagemaker.request_counts['Throttled']:>10} {lambdas:>8} {lambda_time:>11.1f}s {eta_error:>11}")
+
+
+# Clients each handler module created at import before they became lazy,
+# and the clients its first request needs now (/detect in async mode)
+HANDLER_CLIENTS = {
+    'functions.upload_handler': (['s3'], ['s3']),
+    'functions.status_handler': (['s3'], ['s3']),
+    'functions.results_handler': (['s3'], ['s3']),
+    'functions.inference_handler': (['s3', 'sagemaker-runtime', 'sqs'], ['s3', 'sqs']),
+    'functions.inference_worker': (['s3', 'sagemaker-runtime', 'sqs'], ['s3', 'sagemaker-runtime']),
+}
+
+STARTUP_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+if {eager}:
+    import boto3
+    from botocore.exceptions import ClientError
+    clients = [boto3.client(service) for service in {eager_services}]
+import {module}
+imported = time.perf_counter()
+if not {eager}:
+    from functions.aws_clients import get_client
+    clients = [get_client(service) for service in {lazy_services}]
+initialized = time.perf_counter()
+print(json.dumps({{
+    'import': imported - start,
+    'init': initialized - imported,
+    'modules': len(sys.modules),
+    'files': sorted(m.__file__ for name, m in sys.modules.items() if name.startswith('functions.'))
+}}))
+"""
+
+
+def zipped_size(paths):
+    """Size of a deflated zip holding the given files"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for path in paths:
+            archive.write(path, os.path.relpath(path, os.path.dirname(os.path.abspath(__file__))))
+    return len(buffer.getvalue())
+
+
+def benchmark_startup(runs):
+    """
+    Cold-start cost of each handler module, in fresh interpreters: import
+    time, time to create the clients its first request needs, and the size
+    of its deployment package. "eager" reproduces the old modules, which
+    imported boto3 and built every client at import; "lazy" is the current
+    code.
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    tree = [
+        os.path.join(directory, name)
+        for directory, dirs, names in os.walk(root)
+        if not any(part in ('node_modules', '.serverless', '__pycache__') for part in directory.split(os.sep))
+        for name in names
+    ]
+
+    print_header("Handler cold start")
+    print(f"Median of {runs} fresh interpreters per handler; "
+          f"whole-tree package: {zipped_size(tree) / 1024:.0f}KB")
+    print(f"\n{'Handler':<20} {'Mode':<6} {'Import':>9} {'Clients':>9} {'Total':>9} {'Modules':>8} {'Package':>9}")
+
+    for module, (eager_services, lazy_services) in HANDLER_CLIENTS.items():
+        for eager in (True, False):
+            probe = STARTUP_PROBE.format(eager=eager, module=module,
+                                         eager_services=eager_services, lazy_services=lazy_services)
+            samples = []
+            for _ in range(runs):
+                output = subprocess.run([sys.executable, '-c', probe], cwd=root, check=True,
+                                        capture_output=True, text=True, env=os.environ).stdout
+                samples.append(json.loads(output))
+
+            import_ms = statistics.median(sample['import'] for sample in samples) * 1000
+            init_ms = statistics.median(sample['init'] for sample in samples) * 1000
+            total_ms = statistics.median(sample['import'] + sample['init'] for sample in samples) * 1000
+            package = f"{zipped_size(samples[0]['files']) / 1024:.1f}KB" if not eager else '-'
+            print(f"{module.split('.')[-1]:<20} {'eager' if eager else 'lazy':<6} {import_ms:>7.1f}ms "
+                  f"{init_ms:>7.1f}ms {total_ms:>7.1f}ms {samples[0]['modules']:>8} {package:>9}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark backend handlers against local AWS stand-ins')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    index_parser = subparsers.add_parser('index', help='Blueprint ID index lookup latency vs bucket size')
+    index_parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 100000, 1000000],
+                              help='Numbers of stored blueprints to test')
+    index_parser.add_argument('--lookups', type=int, default=50,
+                              help='Lookups per bucket size')
+    index_parser.add_argument('--latency-ms', type=float, default=0.0,
+                              help='Simulated S3 latency per request')
+    index_parser.add_argument('--scan-max', type=int, default=100000,
+                              help='Largest bucket size to run the legacy scan against')
+
+    async_parser = subparsers.add_parser('async', help='/detect response latency, synchronous vs queued')
+    async_parser.add_argument('--requests', type=int, default=100,
+                              help='Requests in the burst')
+    async_parser.add_argument('--concurrency', type=int, default=10,
+                              help='Concurrent Lambda executions')
+    async_parser.add_argument('--model-latency-ms', type=float, default=200.0,
+                              help='Simulated SageMaker latency per invocation')
+
+    worker_batch_parser = subparsers.add_parser('worker-batch', help='Queued jobs with and without batched invocations')
+    worker_batch_parser.add_argument('--jobs', type=int, default=48,
+                                     help='Queued /detect jobs')
+    worker_batch_parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8],
+                                     help='SQS messages per worker invocation (= INVOKE_BATCH_MAX_IMAGES)')
+    worker_batch_parser.add_argument('--model-latency-ms', type=float, default=300.0,
+                                     help='Simulated SageMaker latency per invocation')
+    worker_batch_parser.add_argument('--image-latency-ms', type=float, default=60.0,
+                                     help='Simulated latency per extra image in a batch invocation')
+    worker_batch_parser.add_argument('--wait-ms', type=float, default=50.0,
+                                     help='INVOKE_BATCH_WAIT_MS')
+
+    status_parser = subparsers.add_parser('status', help='S3 requests per blueprint for status.json writes')
+    status_parser.add_argument('--blueprints', type=int, default=20,
+                               help='Blueprints to process')
+    status_parser.add_argument('--latency-ms', type=float, default=20.0,
+                               help='Simulated S3 latency per request')
+    status_parser.add_argument('--model-latency-ms', type=float, default=500.0,
+                               help='Simulated SageMaker latency per invocation')
+
+    cache_parser = subparsers.add_parser('cache', help='Results cache hit rate on repeated uploads')
+    cache_parser.add_argument('--uploads', type=int, default=200,
+                              help='Uploads to process')
+    cache_parser.add_argument('--unique', type=int, default=40,
+                              help='Distinct drawings among the uploads')
+    cache_parser.add_argument('--max-entries', type=int, default=16,
+                              help='In-process LRU size')
+    cache_parser.add_argument('--latency-ms', type=float, default=20.0,
+                              help='Simulated S3 latency per request')
+    cache_parser.add_argument('--model-latency-ms', type=float, default=500.0,
+                              help='Simulated SageMaker latency per invocation')
+
+    threshold_parser = subparsers.add_parser('threshold', help='Cost of changing the confidence threshold')
+    threshold_parser.add_argument('--detections', type=int, default=1000,
+                                  help='Raw detections stored for the blueprint')
+    threshold_parser.add_argument('--thresholds', type=float, nargs='+', default=[0.3, 0.5, 0.7, 0.9],
+                                  help='Thresholds to request')
+    threshold_parser.add_argument('--latency-ms', type=float, default=20.0,
+                                  help='Simulated S3 latency per request')
+    threshold_parser.add_argument('--model-latency-ms', type=float, default=500.0,
+                                  help='Simulated SageMaker latency per invocation')
+
+    clients_parser = subparsers.add_parser('clients', help='Per-request overhead of fresh vs pooled boto3 clients')
+    clients_parser.add_argument('--requests', type=int, default=400,
+                                help='Status reads to perform')
+    clients_parser.add_argument('--concurrency', type=int, default=16,
+                                help='Concurrent readers')
+    clients_parser.add_argument('--handshake-ms', type=float, default=20.0,
+                                help='Simulated TCP + TLS set-up per new connection')
+
+    push_parser = subparsers.add_parser('push', help='Progress delivery by polling vs WebSocket push')
+    push_parser.add_argument('--users', type=int, default=100,
+                             help='Concurrent blueprints being watched')
+    push_parser.add_argument('--poll-interval-ms', type=float, default=2000.0,
+                             help='Frontend polling interval')
+    push_parser.add_argument('--model-latency-ms', type=float, default=10000.0,
+                             help='Simulated SageMaker latency per invocation')
+    push_parser.add_argument('--latency-ms', type=float, default=20.0,
+                             help='Simulated S3 latency per request')
+
+    conditional_parser = subparsers.add_parser('conditional', help='Status and results reads with ETag revalidation')
+    conditional_parser.add_argument('--polls', type=int, default=200,
+                                    help='Reads per endpoint')
+    conditional_parser.add_argument('--changes', type=int, default=4,
+                                    help='Status updates during the status polls')
+    conditional_parser.add_argument('--detections', type=int, default=1000,
+                                    help='Raw detections stored for the blueprint')
+    conditional_parser.add_argument('--handshake-ms', type=float, default=0.0,
+                                    help='Simulated TCP + TLS set-up per new connection')
+
+    codec_parser = subparsers.add_parser('codec', help='Results payload size and encode/decode time by format')
+    codec_parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000],
+                              help='Detections per results document')
+    codec_parser.add_argument('--repeats', type=int, default=5,
+                              help='Timed runs per format; the median is reported')
+
+    viewport_parser = subparsers.add_parser('viewport', help='Results for a viewport or page vs the full set')
+    viewport_parser.add_argument('--detections', type=int, default=10000,
+                                 help='Raw detections stored for the blueprint')
+    viewport_parser.add_argument('--queries', type=int, default=50,
+                                 help='Requests per query type')
+    viewport_parser.add_argument('--latency-ms', type=float, default=0.0,
+                                 help='Simulated S3 latency per request')
+
+    startup_parser = subparsers.add_parser('startup', help='Import and client init time per handler module')
+    startup_parser.add_argument('--runs', type=int, default=5,
+                                help='Fresh interpreters per handler and mode')
+
+    upload_parser = subparsers.add_parser('upload', help='Large upload throughput, single PUT vs parallel parts')
+    upload_parser.add_argument('--size-mb', type=int, default=40,
+                               help='File size')
+    upload_parser.add_argument('--part-mb', type=int, default=5,
+                               help='Preferred part size (UPLOAD_PART_SIZE)')
+    upload_parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8],
+                               help='Parts uploaded at once')
+    upload_parser.add_argument('--connection-mbps', type=float, default=4.0,
+                               help='Simulated throughput of one connection, MB/s')
+    upload_parser.add_argument('--link-mbps', type=float, default=16.0,
+                               help='Simulated throughput shared by all connections, MB/s')
+
+    batch_parser = subparsers.add_parser('batch', help='Upload preparation for a drawing set, per file vs batch')
+    batch_parser.add_argument('--files', type=int, default=100,
+                              help='Files in the drawing set')
+    batch_parser.add_argument('--round-trip-ms', type=float, default=80.0,
+                              help='Simulated client-to-Lambda round trip per API call')
+    batch_parser.add_argument('--latency-ms', type=float, default=15.0,
+                              help='Simulated S3 latency per request')
+    batch_parser.add_argument('--browser-connections', type=int, default=6,
+                              help='Parallel API calls a browser makes to one host')
+
+    batch_detect_parser = subparsers.add_parser('batch-detect', help='Drawing set inference, per blueprint vs batch job')
+    batch_detect_parser.add_argument('--blueprints', type=int, default=60,
+                                     help='Blueprints in the drawing set')
+    batch_detect_parser.add_argument('--capacity', type=int, default=4,
+                                     help='Invocations the endpoint serves at once before throttling')
+    batch_detect_parser.add_argument('--concurrency', type=int, default=16,
+                                     help='Concurrent /detect Lambdas, or the batch worker\'s maximum limit')
+    batch_detect_parser.add_argument('--model-latency-ms', type=float, default=300.0,
+                                     help='Simulated SageMaker latency per invocation')
+    batch_detect_parser.add_argument('--retry-delay', type=float, default=1.0,
+                                     help='First retry delay of a throttled /detect (SAGEMAKER_RETRY_DELAY)')
+
+    args = parser.parse_args()
+
+    if args.benchmark == 'index':
+        benchmark_index(args.sizes, args.lookups, args.latency_ms, args.scan_max)
+    elif args.benchmark == 'async':
+        benchmark_async(args.requests, args.concurrency, args.model_latency_ms)
+    elif args.benchmark == 'worker-batch':
+        benchmark_worker_batch(args.jobs, args.batch_sizes, args.model_latency_ms, args.image_latency_ms, args.wait_ms)
+    elif args.benchmark == 'status':
+        benchmark_status(args.blueprints, args.latency_ms, args.model_latency_ms)
+    elif args.benchmark == 'cache':
+        benchmark_cache(args.uploads, args.unique, args.max_entries, args.latency_ms, args.model_latency_ms)
+    elif args.benchmark == 'threshold':
+        benchmark_threshold(args.detections, args.thresholds, args.latency_ms, args.model_latency_ms)
+    elif args.benchmark == 'clients':
+        benchmark_clients(args.requests, args.concurrency, args.handshake_ms)
+    elif args.benchmark == 'push':
+        benchmark_push(args.users, args.poll_interval_ms, args.model_latency_ms, args.latency_ms)
+    elif args.benchmark == 'conditional':
+        benchmark_conditional(args.polls, args.changes, args.detections, args.handshake_ms)
+    elif args.benchmark == 'codec':
+        benchmark_codec(args.sizes, args.repeats)
+    elif args.benchmark == 'viewport':
+        benchmark_viewport(args.detections, args.queries, args.latency_ms)
+    elif args.benchmark == 'startup':
+        benchmark_startup(args.runs)
+    elif args.benchmark == 'upload':
+        benchmark_upload(args.size_mb, args.part_mb, args.concurrency, args.connection_mbps, args.link_mbps)
+    elif args.benchmark == 'batch':
+        benchmark_batch(args.files, args.round_trip_ms, args.latency_ms, args.browser_connections)
+    elif args.benchmark == 'batch-detect':
+        benchmark_batch_detect(args.blueprints, args.capacity, args.concurrency, args.model_latency_ms,
+                               args.retry_delay)
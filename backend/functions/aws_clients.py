@@ -0,0 +1,124 @@
+"""
+Shared boto3 clients for the Lambda handlers.
+
+Every handler module used to create its own default client at import.
+Clients are now created once per Lambda container, on first use, with a
+tuned botocore Config:
+
+- a connection pool large enough for the handlers' background threads
+  (status writer, concurrent batch work), with TCP keepalive so warm
+  containers reuse connections instead of paying a new TLS handshake
+- adaptive retries, which back off client-side when AWS throttles
+- connect/read timeouts that leave a failed call time to be retried within
+  the Lambda timeout (serverless.yml)
+
+Handler modules bind `lazy_client(...)` at import; no client exists until
+the first request needs it, so cold starts that never touch a service do
+not pay for it.
+"""
+import os
+import threading
+
+# Connections kept per client; botocore's default of 10 is shared by all threads
+MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', '32'))
+
+# Attempts per call, including the first, with adaptive retry mode
+MAX_ATTEMPTS = int(os.environ.get('AWS_MAX_ATTEMPTS', '3'))
+
+# S3 and SQS answer in milliseconds; several attempts fit in the 30s API timeout
+CONNECT_TIMEOUT = float(os.environ.get('AWS_CONNECT_TIMEOUT', '2'))
+READ_TIMEOUT = float(os.environ.get('AWS_READ_TIMEOUT', '10'))
+
+# A SageMaker invocation waits for the model; real-time endpoints answer
+# within 60s, the inference Lambda timeout. inference_handler retries
+# invoke_endpoint itself, so botocore makes a single attempt.
+SAGEMAKER_READ_TIMEOUT = float(os.environ.get('SAGEMAKER_READ_TIMEOUT', '60'))
+
+# Per-service overrides of the Config built by client_config
+SERVICE_CONFIG = {
+    'sagemaker-runtime': {'read_timeout': SAGEMAKER_READ_TIMEOUT, 'max_attempts': 1},
+    's3-accelerate': {'s3': {'use_accelerate_endpoint': True}},
+}
+
+# Clients of a service under another name, for a differently configured
+# second client: 's3-accelerate' signs upload URLs for the S3 Transfer
+# Acceleration endpoint
+SERVICE_ALIASES = {
+    's3-accelerate': 's3',
+}
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def client_config(service_name):
+    """
+    botocore Config used for a service's shared client.
+
+    Returns:
+        botocore.config.Config
+    """
+    from botocore.config import Config
+
+    overrides = SERVICE_CONFIG.get(service_name, {})
+    return Config(
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        tcp_keepalive=True,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=overrides.get('read_timeout', READ_TIMEOUT),
+        retries={'mode': 'adaptive', 'max_attempts': overrides.get('max_attempts', MAX_ATTEMPTS)},
+        s3=overrides.get('s3')
+    )
+
+
+def get_client(service_name, endpoint_url=None):
+    """
+    Shared client for a service, created on first use.
+
+    boto3's default session is not safe to create clients from several
+    threads at once, so creation is serialized; the clients themselves are
+    thread-safe.
+
+    Args:
+        service_name: boto3 service name, or a name in SERVICE_ALIASES
+        endpoint_url: Endpoint for services without a regional default,
+            such as the API Gateway management API of a WebSocket stage
+    """
+    cache_key = (service_name, endpoint_url)
+    client = _clients.get(cache_key)
+    if client is not None:
+        return client
+
+    with _lock:
+        if cache_key not in _clients:
+            import boto3
+
+            _clients[cache_key] = boto3.client(
+                SERVICE_ALIASES.get(service_name, service_name),
+                endpoint_url=endpoint_url,
+                config=client_config(service_name)
+            )
+        return _clients[cache_key]
+
+
+class LazyClient:
+    """
+    Module-level stand-in for a shared client. Attribute access (calls,
+    `.exceptions`, `.meta`) goes to the client from get_client, creating it
+    on first use.
+    """
+
+    def __init__(self, service_name, endpoint_url=None):
+        self.service_name = service_name
+        self.endpoint_url = endpoint_url
+
+    def __getattr__(self, name):
+        return getattr(get_client(self.service_name, self.endpoint_url), name)
+
+    def __repr__(self):
+        return f"LazyClient({self.service_name!r})"
+
+
+def lazy_client(service_name, endpoint_url=None):
+    """Shared client for a service, created when first used"""
+    return LazyClient(service_name, endpoint_url)
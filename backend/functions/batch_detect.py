@@ -0,0 +1,255 @@
+"""
+Batch inference over a drawing set.
+
+Processing a set through /detect costs a request per sheet, and in sync
+mode a Lambda held for each SageMaker round trip. A batch job runs every
+sheet of an upload batch (batch_upload_handler) in one worker invocation
+(batch_detect_worker):
+
+- Sheets are sent to SageMaker concurrently, up to a limit that adapts to
+  the endpoint (AdaptiveConcurrency). The limit grows while invocations
+  succeed and halves on a ThrottlingException, and new invocations wait
+  out a backoff before the throttled sheets are retried.
+- Progress of the whole batch (k of N done, ETA) is written to the
+  batch's status.json as sheets finish (BatchProgress).
+- A combined statistics summary of the set is written when the batch
+  finishes (summarize_batch).
+"""
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+
+def is_throttling(error):
+    """Whether an invocation failed because the endpoint is saturated"""
+    code = getattr(error, 'response', {}).get('Error', {}).get('Code')
+    return code == 'ThrottlingException' or 'ThrottlingException' in str(error)
+
+
+class AdaptiveConcurrency:
+    """
+    Concurrency limit adjusted by additive increase, multiplicative
+    decrease (AIMD), as TCP does for its congestion window.
+
+    Each successful call raises the limit by 1/limit, so about one per
+    limit's worth of calls. A throttled call halves it and holds back new
+    calls for a backoff that doubles, with jitter, while throttles follow
+    each other. Throttles of calls started before the last decrease belong
+    to the same overload and do not halve the limit again.
+
+    Args:
+        max_limit: Highest limit
+        initial: Starting limit (default: half of max_limit)
+        backoff: Seconds new calls wait after a throttle
+        max_backoff: Longest wait after consecutive throttles
+    """
+
+    def __init__(self, max_limit, initial=None, backoff=0.5, max_backoff=20.0):
+        self.max_limit = max(1, max_limit)
+        self.limit = float(min(self.max_limit, initial or max(1, self.max_limit // 2)))
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.in_flight = 0
+        self.throttles = 0
+        self._epoch = 0
+        self._consecutive_throttles = 0
+        self._resume_at = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """
+        Wait for a free slot.
+
+        Returns:
+            int: Ticket to pass to release()
+        """
+        with self._condition:
+            while True:
+                delay = self._resume_at - time.monotonic()
+                if delay <= 0 and self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return self._epoch
+                self._condition.wait(delay if delay > 0 else None)
+
+    def release(self, ticket, throttled=False):
+        """Free a slot and adjust the limit to how its call went"""
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.throttles += 1
+                if ticket == self._epoch:
+                    self._epoch += 1
+                    self.limit = max(1.0, self.limit / 2)
+                    backoff = min(self.max_backoff, self.backoff * 2 ** self._consecutive_throttles)
+                    self._resume_at = time.monotonic() + backoff * random.uniform(0.5, 1.0)
+                    self._consecutive_throttles += 1
+            else:
+                self._consecutive_throttles = 0
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class BatchProgress:
+    """
+    Aggregate progress of a batch: sheets done out of the total, and the
+    time remaining estimated from the rate they finished at so far.
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.completed = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, succeeded):
+        """Count a finished sheet"""
+        with self._lock:
+            if succeeded:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def estimated_time_remaining(self):
+        """Seconds until every sheet is done, or None before the first is"""
+        done = self.completed + self.failed
+        if not done:
+            return None
+        return round((time.monotonic() - self.started) / done * (self.total - done))
+
+    def status_fields(self):
+        """Fields of the batch's status.json"""
+        with self._lock:
+            done = self.completed + self.failed
+            return {
+                'completed': self.completed,
+                'failed': self.failed,
+                'total': self.total,
+                'progress': round(100 * done / self.total) if self.total else 100,
+                'estimatedTimeRemaining': self.estimated_time_remaining(),
+                'message': f"{done} of {self.total} blueprints processed"
+            }
+
+
+def run_batch(sheets, process, limiter, max_attempts=6, retryable=is_throttling, on_done=None):
+    """
+    Run process(sheet) for every sheet, as many at once as the limiter
+    allows.
+
+    A sheet whose call fails with a retryable error goes back in the queue,
+    up to max_attempts calls; throttles also lower the limit. Other errors
+    are final for the sheet. A blueprint listed more than once is run once.
+
+    Args:
+        sheets: batch.json 'blueprints' entries ({blueprintId, ...})
+        process: Called with a sheet; returns its outcome or raises
+        limiter: AdaptiveConcurrency; its max_limit worker threads are used
+        max_attempts: Calls per sheet
+        retryable: Whether an error may succeed when the call is repeated
+        on_done: Called as on_done(sheet, outcome) when a sheet is
+            finished, with the exception for a failed sheet
+
+    Returns:
+        dict: Outcome per blueprint ID, or the exception for failed sheets
+    """
+    # outcomes is keyed by blueprint ID, so a repeated ID would never let it
+    # reach one entry per sheet
+    unique, seen = [], set()
+    for sheet in sheets:
+        if sheet['blueprintId'] not in seen:
+            seen.add(sheet['blueprintId'])
+            unique.append(sheet)
+    pending = deque((sheet, 1) for sheet in unique)
+    outcomes = {}
+    condition = threading.Condition()
+
+    def worker():
+        while True:
+            with condition:
+                while not pending and len(outcomes) < len(unique):
+                    condition.wait()
+                if not pending:
+                    return
+                sheet, attempt = pending.popleft()
+
+            ticket = limiter.acquire()
+            throttled = retry = False
+            try:
+                outcome = process(sheet)
+            except Exception as e:
+                outcome = e
+                throttled = is_throttling(e)
+                retry = attempt < max_attempts and (throttled or retryable(e))
+            finally:
+                limiter.release(ticket, throttled)
+
+            if not retry and on_done:
+                on_done(sheet, outcome)
+            with condition:
+                if retry:
+                    pending.append((sheet, attempt + 1))
+                else:
+                    outcomes[sheet['blueprintId']] = outcome
+                condition.notify_all()
+
+    threads = [threading.Thread(target=worker) for _ in range(min(limiter.max_limit, len(unique)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+def summarize_batch(batch_id, sheets, results):
+    """
+    Combined statistics of a drawing set.
+
+    Args:
+        batch_id: Batch ID
+        sheets: batch.json 'blueprints' entries
+        results: results.json documents by blueprint ID; sheets without
+            one are reported as failed
+
+    Returns:
+        dict: Totals over the set and a row per sheet
+    """
+    element_counts = {}
+    total_detections = 0
+    confidence_sum = 0.0
+    rows = []
+
+    for sheet in sheets:
+        result = results.get(sheet['blueprintId'])
+        row = {'blueprintId': sheet['blueprintId'], 'fileName': sheet.get('fileName')}
+        if not result:
+            rows.append({**row, 'status': 'failed'})
+            continue
+
+        statistics = result['statistics']
+        for element_class, count in statistics['elementCounts'].items():
+            element_counts[element_class] = element_counts.get(element_class, 0) + count
+        total_detections += statistics['totalDetections']
+        confidence_sum += sum(d['confidence'] for d in result['detections'])
+        rows.append({
+            **row,
+            'status': 'completed',
+            'totalDetections': statistics['totalDetections'],
+            'elementCounts': statistics['elementCounts']
+        })
+
+    completed = sum(1 for row in rows if row['status'] == 'completed')
+    return {
+        'batchId': batch_id,
+        'totalBlueprints': len(sheets),
+        'completed': completed,
+        'failed': len(sheets) - completed,
+        'statistics': {
+            'totalDetections': total_detections,
+            'avgConfidence': round(confidence_sum / total_detections, 2) if total_detections else 0,
+            'elementCounts': element_counts
+        },
+        'blueprints': rows,
+        'generatedAt': datetime.utcnow().isoformat() + 'Z'
+    }
@@ -0,0 +1,146 @@
+import json
+import os
+import uuid
+from datetime import datetime
+
+from functions.aws_clients import lazy_client
+from functions.blueprint_index import is_valid_blueprint_id, write_index
+from functions.status_store import S3StatusBackend, StatusStore
+
+s3_client = lazy_client('s3')
+sqs_client = lazy_client('sqs')
+
+BUCKET_NAME = os.environ.get('BUCKET_NAME', 'innergy-blueprints-dev')
+BATCH_JOB_QUEUE_URL = os.environ.get('BATCH_JOB_QUEUE_URL', '')
+
+# Blueprint statuses are reset synchronously before the job is queued
+status_store = StatusStore(S3StatusBackend(s3_client, BUCKET_NAME), write_behind=False)
+
+def lambda_handler(event, context):
+    """
+    Lambda function to start inference for a whole upload batch.
+
+    POST /detect/batch with {"sessionId": ..., "batchId": ..., "confidence":
+    0.5} queues one job for batch_detect_worker, which runs every blueprint
+    of the batch (uploads/{sessionId}/{batchId}/batch.json), and returns
+    202. Aggregate progress is read through GET /status/{batchId}; the
+    combined statistics are stored in the batch's summary.json.
+
+    Every blueprint of the batch is queued again, including ones that
+    completed or failed before, so a new request (e.g. with another
+    confidence) reprocesses the whole set. Each blueprint's status records
+    the job's ID, which lets the worker tell a redelivery of this job from
+    a new one.
+    """
+    try:
+        body = json.loads(event.get('body') or '{}')
+        session_id = body.get('sessionId')
+        batch_id = body.get('batchId')
+        confidence = body.get('confidence', 0.5)
+
+        if not session_id or not is_valid_blueprint_id(batch_id):
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Allow-Headers': 'Content-Type',
+                    'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+                },
+                'body': json.dumps({
+                    'error': 'Missing required fields: batchId, sessionId'
+                })
+            }
+
+        prefix = f"uploads/{session_id}/{batch_id}/"
+        try:
+            response = s3_client.get_object(Bucket=BUCKET_NAME, Key=f"{prefix}batch.json")
+            sheets = json.loads(response['Body'].read().decode('utf-8'))['blueprints']
+        except s3_client.exceptions.NoSuchKey:
+            return {
+                'statusCode': 404,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Allow-Headers': 'Content-Type',
+                    'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+                },
+                'body': json.dumps({
+                    'error': 'Batch not found'
+                })
+            }
+
+        total = len(sheets)
+        job_id = uuid.uuid4().hex
+
+        # The status endpoint resolves the batch ID like a blueprint ID
+        write_index(s3_client, BUCKET_NAME, batch_id, session_id)
+
+        for sheet in sheets:
+            sheet_status_key = f"uploads/{session_id}/{sheet['blueprintId']}/status.json"
+            status_store.set_stage(sheet_status_key, 'upload', 'Queued for processing...', restart=True,
+                                   blueprintId=sheet['blueprintId'], batchJobId=job_id)
+            status_store.release(sheet_status_key)
+
+        # Written before the job is queued, so it cannot replace the
+        # worker's progress
+        s3_client.put_object(
+            Bucket=BUCKET_NAME,
+            Key=f"{prefix}status.json",
+            Body=json.dumps({
+                'batchId': batch_id,
+                'status': 'processing',
+                'stage': 'upload',
+                'progress': 0,
+                'completed': 0,
+                'failed': 0,
+                'total': total,
+                'estimatedTimeRemaining': None,
+                'message': 'Queued for processing...',
+                'updatedAt': datetime.utcnow().isoformat() + 'Z'
+            }),
+            ContentType='application/json'
+        )
+
+        job = sqs_client.send_message(
+            QueueUrl=BATCH_JOB_QUEUE_URL,
+            MessageBody=json.dumps({
+                'batchId': batch_id,
+                'sessionId': session_id,
+                'jobId': job_id,
+                'confidence': confidence,
+                'queuedAt': datetime.utcnow().isoformat() + 'Z'
+            })
+        )
+
+        print(f"Queued batch {batch_id} ({total} blueprints) as message {job['MessageId']}")
+
+        return {
+            'statusCode': 202,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+            },
+            'body': json.dumps({
+                'message': 'Batch inference queued',
+                'batchId': batch_id,
+                'jobId': job['MessageId'],
+                'total': total,
+                'status': 'processing',
+                'stage': 'upload'
+            })
+        }
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+            },
+            'body': json.dumps({
+                'error': 'Internal server error',
+                'details': str(e)
+            })
+        }
@@ -0,0 +1,135 @@
+import json
+import os
+
+from functions import inference_handler
+from functions.aws_clients import lazy_client
+from functions.batch_detect import AdaptiveConcurrency, BatchProgress, run_batch, summarize_batch
+
+s3_client = lazy_client('s3')
+BUCKET_NAME = os.environ.get('BUCKET_NAME', 'innergy-blueprints-dev')
+
+# Most blueprints of a batch sent to SageMaker at once; the limit adapts
+# below this to what the endpoint accepts without throttling
+MAX_CONCURRENCY = int(os.environ.get('BATCH_DETECT_CONCURRENCY', '8'))
+
+# SageMaker calls per blueprint before it is marked failed
+MAX_ATTEMPTS = int(os.environ.get('BATCH_DETECT_MAX_ATTEMPTS', '6'))
+
+def read_json(key):
+    """JSON object from the bucket, or None"""
+    try:
+        response = s3_client.get_object(Bucket=BUCKET_NAME, Key=key)
+    except s3_client.exceptions.NoSuchKey:
+        return None
+    return json.loads(response['Body'].read().decode('utf-8'))
+
+def process_sheet(session_id, confidence, job_id):
+    """
+    process() for run_batch: run inference for one blueprint of the batch
+    with a single SageMaker attempt, so throttles reach the limiter.
+
+    batch_detect_handler resets every blueprint's status for the job and
+    records the job's ID in it. A blueprint that finished under this job
+    ID was finished by an earlier delivery of the job: it is not run again,
+    and its results are read from results.json. A blueprint whose status
+    carries another job ID was not reset for this job and is restarted.
+    """
+    status_store = inference_handler.status_store
+
+    def process(sheet):
+        blueprint_id = sheet['blueprintId']
+        prefix = f"uploads/{session_id}/{blueprint_id}/"
+        status_key = f"{prefix}status.json"
+        try:
+            if status_store.get(status_key).get('batchJobId') != job_id:
+                status_store.set_stage(status_key, 'upload', 'Queued for processing...', restart=True,
+                                       blueprintId=blueprint_id, batchJobId=job_id)
+            results = inference_handler.process_blueprint(
+                blueprint_id, session_id, sheet['s3Key'], confidence, restart=False, max_retries=1
+            )
+        finally:
+            status_store.release(status_key)
+        return results if results is not None else read_json(f"{prefix}results.json")
+    return process
+
+def run_batch_job(job):
+    """
+    Run inference for every blueprint of an upload batch.
+
+    Aggregate progress is kept in the batch's status.json and the combined
+    statistics are written to summary.json. Blueprints already finished by
+    an earlier delivery of the job are not run again (see process_sheet).
+
+    Args:
+        job: Message body written by batch_detect_handler
+
+    Returns:
+        dict: The summary
+    """
+    batch_id = job['batchId']
+    session_id = job['sessionId']
+    prefix = f"uploads/{session_id}/{batch_id}/"
+    status_key = f"{prefix}status.json"
+    status_store = inference_handler.status_store
+
+    sheets = read_json(f"{prefix}batch.json")['blueprints']
+    progress = BatchProgress(len(sheets))
+    status_store.update(status_key, restart=True, batchId=batch_id, status='processing',
+                        stage='inference', **progress.status_fields())
+
+    def on_done(sheet, outcome):
+        succeeded = bool(outcome) and not isinstance(outcome, Exception)
+        if not succeeded:
+            print(f"Blueprint {sheet['blueprintId']} of {batch_id} failed: {str(outcome)}")
+            blueprint_status_key = f"uploads/{session_id}/{sheet['blueprintId']}/status.json"
+            inference_handler.mark_failed(
+                blueprint_status_key, sheet['blueprintId'], f'Failed to invoke SageMaker endpoint: {str(outcome)}'
+            )
+            status_store.release(blueprint_status_key)
+        progress.record(succeeded)
+        status_store.update(status_key, **progress.status_fields())
+
+    limiter = AdaptiveConcurrency(MAX_CONCURRENCY)
+    outcomes = run_batch(
+        sheets, process_sheet(session_id, job.get('confidence', 0.5), job.get('jobId')), limiter,
+        MAX_ATTEMPTS, inference_handler.is_retryable_error, on_done
+    )
+
+    results = {
+        blueprint_id: outcome for blueprint_id, outcome in outcomes.items()
+        if outcome and not isinstance(outcome, Exception)
+    }
+    summary = summarize_batch(batch_id, sheets, results)
+    s3_client.put_object(
+        Bucket=BUCKET_NAME,
+        Key=f"{prefix}summary.json",
+        Body=json.dumps(summary),
+        ContentType='application/json'
+    )
+
+    fields = progress.status_fields()
+    fields['message'] = f"{summary['completed']} of {summary['totalBlueprints']} blueprints processed successfully"
+    status_store.update(status_key, status='completed', stage='complete', summaryKey=f"{prefix}summary.json",
+                        **fields)
+    status_store.release(status_key)
+
+    print(f"Batch {batch_id}: {summary['completed']}/{summary['totalBlueprints']} blueprints, "
+          f"{summary['statistics']['totalDetections']} detections, {limiter.throttles} throttles")
+    return summary
+
+def lambda_handler(event, context):
+    """
+    SQS-triggered worker for POST /detect/batch jobs.
+
+    Returns the IDs of failed messages as a partial batch response; a
+    redelivered job resumes with the blueprints that are not finished.
+    """
+    failures = []
+    for record in event.get('Records', []):
+        try:
+            run_batch_job(json.loads(record['body']))
+        except Exception as e:
+            print(f"Error processing batch message {record.get('messageId')}: {str(e)}")
+            failures.append({'itemIdentifier': record['messageId']})
+
+    return {'batchItemFailures': failures}
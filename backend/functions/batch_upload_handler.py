@@ -0,0 +1,184 @@
+import json
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from functions import upload_handler
+from functions.aws_clients import lazy_client
+
+s3_client = lazy_client('s3')
+BUCKET_NAME = os.environ.get('BUCKET_NAME', 'innergy-blueprints-dev')
+
+# Files per batch; a drawing set is typically 20-200 sheets
+MAX_BATCH_FILES = int(os.environ.get('UPLOAD_BATCH_MAX_FILES', '200'))
+
+# Total bytes per batch. Bounds the number of part URLs in the response,
+# which must stay under Lambda's 6MB response limit
+MAX_BATCH_BYTES = int(os.environ.get('UPLOAD_BATCH_MAX_BYTES', str(2 * 1024 * 1024 * 1024)))
+
+# Files prepared at once. Each costs three S3 writes (metadata, status,
+# index), plus CreateMultipartUpload for large files; stays below the
+# shared client's connection pool (AWS_MAX_POOL_CONNECTIONS)
+CONCURRENCY = int(os.environ.get('UPLOAD_BATCH_CONCURRENCY', '16'))
+
+def validate_files(files):
+    """
+    Check every file descriptor of a batch.
+
+    Returns:
+        list: [{index, fileName, error}] for the files that cannot be
+        uploaded
+    """
+    errors = []
+    for index, file in enumerate(files):
+        if not isinstance(file, dict) or not file.get('fileName') or not file.get('fileType'):
+            errors.append({'index': index, 'error': 'Missing required fields: fileName, fileType, fileSize'})
+            continue
+        error = upload_handler.validate_file(file.get('fileType'), file.get('fileSize'))
+        if error:
+            errors.append({'index': index, 'fileName': file['fileName'], 'error': error})
+    return errors
+
+def lambda_handler(event, context):
+    """
+    Lambda function to handle the upload of a whole drawing set.
+
+    POST /upload/batch with {"sessionId": ..., "files": [{"fileName": ...,
+    "fileType": ..., "fileSize": ...}, ...]} prepares every file as
+    upload_handler does for one, preparing files concurrently, and groups
+    them under a batch ID. The response lists a blueprint per file, in
+    request order, with its uploadUrl or multipart upload. The batch is
+    recorded in uploads/{sessionId}/{batchId}/batch.json.
+
+    The batch is rejected as a whole if any file is invalid.
+    """
+    try:
+        body = json.loads(event.get('body') or '{}')
+        session_id = body.get('sessionId')
+        files = body.get('files')
+
+        if not session_id or not isinstance(files, list) or not files:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Allow-Headers': 'Content-Type',
+                    'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+                },
+                'body': json.dumps({
+                    'error': 'Missing required fields: sessionId, files'
+                })
+            }
+
+        if len(files) > MAX_BATCH_FILES:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Allow-Headers': 'Content-Type',
+                    'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+                },
+                'body': json.dumps({
+                    'error': f"A batch holds at most {MAX_BATCH_FILES} files."
+                })
+            }
+
+        errors = validate_files(files)
+        if errors:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Allow-Headers': 'Content-Type',
+                    'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+                },
+                'body': json.dumps({
+                    'error': 'Invalid files in batch',
+                    'files': errors
+                })
+            }
+
+        if sum(file['fileSize'] for file in files) > MAX_BATCH_BYTES:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Allow-Headers': 'Content-Type',
+                    'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+                },
+                'body': json.dumps({
+                    'error': f"Batch exceeds {MAX_BATCH_BYTES // (1024 * 1024)}MB limit."
+                })
+            }
+
+        batch_id = f"batch-{uuid.uuid4().hex[:12]}"
+
+        def prepare(file):
+            return upload_handler.create_upload(
+                session_id, file['fileName'], file['fileType'], file['fileSize'], batch_id
+            )
+
+        with ThreadPoolExecutor(max_workers=min(CONCURRENCY, len(files))) as executor:
+            blueprints = list(executor.map(prepare, files))
+
+        s3_client.put_object(
+            Bucket=BUCKET_NAME,
+            Key=f"uploads/{session_id}/{batch_id}/batch.json",
+            Body=json.dumps({
+                'batchId': batch_id,
+                'sessionId': session_id,
+                'createdAt': datetime.utcnow().isoformat() + 'Z',
+                'blueprints': [
+                    {'blueprintId': blueprint['blueprintId'], 'fileName': file['fileName'], 's3Key': blueprint['s3Key']}
+                    for file, blueprint in zip(files, blueprints)
+                ]
+            }),
+            ContentType='application/json'
+        )
+
+        print(f"Prepared batch {batch_id}: {len(blueprints)} files")
+
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+            },
+            'body': json.dumps({
+                'batchId': batch_id,
+                'blueprints': blueprints,
+                'message': 'Presigned URLs generated successfully'
+            })
+        }
+
+    except s3_client.exceptions.ClientError as e:
+        print(f"S3 Error: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+            },
+            'body': json.dumps({
+                'error': 'Failed to generate upload URLs',
+                'details': str(e)
+            })
+        }
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+            },
+            'body': json.dumps({
+                'error': 'Internal server error',
+                'details': str(e)
+            })
+        }
@@ -0,0 +1,179 @@
+"""
+Blueprint ID index.
+
+Every upload writes a small pointer object at index/{blueprintId}.json that
+records the session the blueprint belongs to. The GET handlers only receive
+the blueprint ID, so they resolve the uploads/{sessionId}/{blueprintId}/
+prefix with a single GET on the pointer instead of listing the bucket.
+
+Blueprints uploaded before the index existed have no pointer. Running
+`python -m functions.blueprint_index` once after deploying writes their
+pointers (backfill_index), so the request path never lists the bucket unless
+BLUEPRINT_INDEX_FALLBACK is set.
+"""
+import json
+import os
+import threading
+from datetime import datetime
+
+INDEX_PREFIX = 'index/'
+
+# Search uploads/ on the request path for blueprints without a pointer. Off
+# by default; backfill_index writes the pointers instead
+LEGACY_FALLBACK = os.environ.get('BLUEPRINT_INDEX_FALLBACK', 'false').lower() == 'true'
+
+# List pages (1000 keys each) that search may read before giving up
+LEGACY_MAX_PAGES = int(os.environ.get('BLUEPRINT_INDEX_FALLBACK_PAGES', '1'))
+
+# IDs the search did not find, so polling an unknown ID does not list the
+# bucket again. Cleared when full
+MISS_CACHE_SIZE = 10000
+_misses = set()
+_misses_lock = threading.Lock()
+
+
+def index_key(blueprint_id):
+    """Return the S3 key of the index pointer for a blueprint"""
+    return f"{INDEX_PREFIX}{blueprint_id}.json"
+
+
+def blueprint_prefix(session_id, blueprint_id):
+    """Return the S3 prefix under which a blueprint's objects are stored"""
+    return f"uploads/{session_id}/{blueprint_id}/"
+
+
+def is_valid_blueprint_id(blueprint_id):
+    """Reject IDs that could escape the index prefix"""
+    return bool(blueprint_id) and '/' not in blueprint_id and '..' not in blueprint_id
+
+
+def write_index(s3_client, bucket, blueprint_id, session_id):
+    """
+    Store the index pointer for a blueprint.
+
+    Args:
+        s3_client: boto3 S3 client
+        bucket: Bucket name
+        blueprint_id: Blueprint ID
+        session_id: Session the blueprint was uploaded in
+    """
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=index_key(blueprint_id),
+        Body=json.dumps({
+            'blueprintId': blueprint_id,
+            'sessionId': session_id,
+            'prefix': blueprint_prefix(session_id, blueprint_id),
+            'createdAt': datetime.utcnow().isoformat() + 'Z'
+        }),
+        ContentType='application/json'
+    )
+
+
+def _list_keys(s3_client, bucket, prefix, max_pages=None):
+    """Yield the keys under a prefix, listing at most max_pages pages"""
+    token = None
+    pages = 0
+    while max_pages is None or pages < max_pages:
+        kwargs = {'Bucket': bucket, 'Prefix': prefix, 'MaxKeys': 1000}
+        if token:
+            kwargs['ContinuationToken'] = token
+        response = s3_client.list_objects_v2(**kwargs)
+        pages += 1
+        for obj in response.get('Contents', []):
+            yield obj['Key']
+        if not response.get('IsTruncated'):
+            return
+        token = response['NextContinuationToken']
+
+
+def find_legacy_prefix(s3_client, bucket, blueprint_id):
+    """
+    Search the first LEGACY_MAX_PAGES pages of uploads/ for a blueprint that
+    has no index pointer. IDs that are not found are remembered.
+
+    Returns:
+        str: The blueprint's prefix, or None if it was not found
+    """
+    with _misses_lock:
+        if blueprint_id in _misses:
+            return None
+
+    for key in _list_keys(s3_client, bucket, 'uploads/', LEGACY_MAX_PAGES):
+        parts = key.split('/')
+        if len(parts) > 3 and parts[2] == blueprint_id:
+            return blueprint_prefix(parts[1], blueprint_id)
+
+    with _misses_lock:
+        if len(_misses) >= MISS_CACHE_SIZE:
+            _misses.clear()
+        _misses.add(blueprint_id)
+    return None
+
+
+def backfill_index(s3_client, bucket):
+    """
+    Write index pointers for blueprints uploaded before the index existed.
+
+    Lists index/ and uploads/ once each; blueprints that already have a
+    pointer are left alone.
+
+    Args:
+        s3_client: boto3 S3 client
+        bucket: Bucket name
+
+    Returns:
+        int: Number of pointers written
+    """
+    indexed = {key[len(INDEX_PREFIX):-len('.json')]
+               for key in _list_keys(s3_client, bucket, INDEX_PREFIX)}
+    written = 0
+    for key in _list_keys(s3_client, bucket, 'uploads/'):
+        parts = key.split('/')
+        if len(parts) <= 3 or parts[2] in indexed or not is_valid_blueprint_id(parts[2]):
+            continue
+        write_index(s3_client, bucket, parts[2], parts[1])
+        indexed.add(parts[2])
+        written += 1
+    return written
+
+
+def resolve_prefix(s3_client, bucket, blueprint_id):
+    """
+    Resolve the storage prefix of a blueprint with one GET.
+
+    With LEGACY_FALLBACK set, a blueprint without a pointer is searched for
+    in a bounded part of uploads/ and its pointer is written.
+
+    Args:
+        s3_client: boto3 S3 client
+        bucket: Bucket name
+        blueprint_id: Blueprint ID
+
+    Returns:
+        str: uploads/{sessionId}/{blueprintId}/ prefix, or None if the
+        blueprint is unknown
+    """
+    if not is_valid_blueprint_id(blueprint_id):
+        return None
+
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=index_key(blueprint_id))
+    except s3_client.exceptions.NoSuchKey:
+        if not LEGACY_FALLBACK:
+            return None
+        prefix = find_legacy_prefix(s3_client, bucket, blueprint_id)
+        if prefix:
+            write_index(s3_client, bucket, blueprint_id, prefix.split('/')[1])
+        return prefix
+
+    entry = json.loads(response['Body'].read().decode('utf-8'))
+    return entry.get('prefix') or blueprint_prefix(entry['sessionId'], blueprint_id)
+
+
+if __name__ == '__main__':
+    from functions.aws_clients import get_client
+
+    bucket_name = os.environ.get('BUCKET_NAME', 'innergy-blueprints-dev')
+    count = backfill_index(get_client('s3'), bucket_name)
+    print(f"Wrote {count} index pointers in {bucket_name}")
@@ -0,0 +1,374 @@
+"""
+Raw detection sets and threshold views over them.
+
+Inference runs once per blueprint at a low confidence (RAW_CONFIDENCE) and
+the full detection set is stored at
+
+    uploads/{sessionId}/{blueprintId}/detections.json
+
+Any higher confidence threshold or class filter is then a view computed
+from that set: NMS only lets a box suppress lower-scoring boxes, so
+filtering the raw set gives the same detections as running the model at
+the higher threshold.
+
+The raw set also carries a grid index over the image ('spatialIndex'),
+built once when it is stored, so a viewport query only tests the
+detections in the grid cells the viewport covers. PDF sets get a grid per
+page, each sized to its page.
+"""
+import json
+
+# Threshold the stored raw set is computed at
+RAW_CONFIDENCE = 0.05
+
+# Grid cells per image side in the spatial index
+SPATIAL_GRID_CELLS = 32
+
+# Largest page the results endpoint returns
+MAX_PAGE_SIZE = 1000
+
+# Pipeline steps reported in results statistics
+PROCESSING_STEPS = ['upload', 'inference', 'postprocess']
+
+
+def detections_key(prefix):
+    """S3 key of a blueprint's raw detection set"""
+    return f"{prefix}detections.json"
+
+
+def fetch_raw_detections(s3_client, bucket, prefix, **conditions):
+    """
+    Load a blueprint's raw detection set, with the GetObject response it
+    was read from.
+
+    Blueprints processed before raw sets were stored only have results.json;
+    its detections are used instead, valid for thresholds at or above the
+    confidence they were computed at.
+
+    Args:
+        conditions: IfNoneMatch / IfModifiedSince for the GetObject
+
+    Returns:
+        tuple: (raw set with 'detections', 'rawConfidence' and the
+        'confidence' originally requested for the blueprint, GetObject
+        response)
+
+    Raises:
+        s3_client.exceptions.NoSuchKey: If the blueprint has no results yet
+        s3_client.exceptions.ClientError: 304 Not Modified if a condition
+            was given and the object matches it
+    """
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=detections_key(prefix), **conditions)
+        return json.loads(response['Body'].read().decode('utf-8')), response
+    except s3_client.exceptions.NoSuchKey:
+        response = s3_client.get_object(Bucket=bucket, Key=f"{prefix}results.json", **conditions)
+
+    results = json.loads(response['Body'].read().decode('utf-8'))
+    results['rawConfidence'] = results.get('confidence', 0.5)
+    return results, response
+
+
+def load_raw_detections(s3_client, bucket, prefix):
+    """
+    Load a blueprint's raw detection set (see fetch_raw_detections).
+
+    Returns:
+        dict: Raw set with 'detections', 'rawConfidence' and the
+        'confidence' originally requested for the blueprint
+
+    Raises:
+        s3_client.exceptions.NoSuchKey: If the blueprint has no results yet
+    """
+    return fetch_raw_detections(s3_client, bucket, prefix)[0]
+
+
+def filter_detections(detections, confidence, classes=None):
+    """
+    Keep detections scoring above a threshold, optionally of given classes.
+
+    Args:
+        detections: Detection dicts in the endpoint's schema
+        confidence: Threshold; strict `>` like the model's own filtering
+        classes: Class names to keep (None keeps all)
+
+    Returns:
+        list: Matching detections, in their original order and with their
+        original roomId
+    """
+    if classes:
+        classes = set(classes)
+        return [d for d in detections if d['confidence'] > confidence and d.get('class') in classes]
+    return [d for d in detections if d['confidence'] > confidence]
+
+
+def parse_viewport(value):
+    """
+    Parse a viewport query parameter.
+
+    Args:
+        value: 'x,y,width,height' in image pixels
+
+    Returns:
+        dict: Box in the boundingBox schema
+
+    Raises:
+        ValueError: If the value is not four numbers with a positive size
+    """
+    try:
+        x, y, width, height = (float(part) for part in value.split(','))
+    except ValueError:
+        raise ValueError('viewport must be x,y,width,height') from None
+    if width <= 0 or height <= 0:
+        raise ValueError('viewport width and height must be positive')
+    return {'x': x, 'y': y, 'width': width, 'height': height}
+
+
+def intersects(box, viewport):
+    """Whether a bounding box overlaps a viewport"""
+    return (box['x'] < viewport['x'] + viewport['width'] and viewport['x'] < box['x'] + box['width']
+            and box['y'] < viewport['y'] + viewport['height'] and viewport['y'] < box['y'] + box['height'])
+
+
+def _cell(coordinate, cell_size, cells):
+    """Grid cell along one axis holding a coordinate, clamped to the grid"""
+    return min(max(int(coordinate // cell_size), 0), cells - 1)
+
+
+def build_spatial_index(detections, dimensions=None, cells=SPATIAL_GRID_CELLS, positions=None):
+    """
+    Grid index over a detection set.
+
+    The image is split into cells x cells cells. Each detection is listed,
+    by its position in `detections`, in the cell holding its box's top-left
+    corner (boxes starting outside the image go to the nearest edge cell).
+    The largest box size bounds how far left of or above a viewport a box
+    overlapping it can start.
+
+    Args:
+        detections: Detection dicts in the endpoint's schema
+        dimensions: Image {'width', 'height'}; the extent of the boxes is
+            used if missing
+        cells: Cells per side
+        positions: Positions in `detections` to index (None for all)
+
+    Returns:
+        dict: {'cells', 'cellWidth', 'cellHeight', 'maxWidth', 'maxHeight',
+        'index'}, index[row * cells + column] being a cell's positions
+    """
+    dimensions = dimensions or {}
+    if positions is None:
+        positions = range(len(detections))
+    boxes = [(position, detections[position]['boundingBox']) for position in positions]
+    width = dimensions.get('width') or max((b['x'] + b['width'] for _, b in boxes), default=1)
+    height = dimensions.get('height') or max((b['y'] + b['height'] for _, b in boxes), default=1)
+    cell_width = max(width / cells, 1)
+    cell_height = max(height / cells, 1)
+
+    index = [[] for _ in range(cells * cells)]
+    for position, box in boxes:
+        row = _cell(box['y'], cell_height, cells)
+        column = _cell(box['x'], cell_width, cells)
+        index[row * cells + column].append(position)
+
+    return {
+        'cells': cells,
+        'cellWidth': cell_width,
+        'cellHeight': cell_height,
+        'maxWidth': max((b['width'] for _, b in boxes), default=0),
+        'maxHeight': max((b['height'] for _, b in boxes), default=0),
+        'index': index
+    }
+
+
+def index_detections(detections, dimensions=None, pages=None):
+    """
+    Spatial index of a raw set.
+
+    Boxes of a PDF set are in their own page's pixels, so such sets get a
+    grid per page, sized to that page and listing its detections only.
+
+    Args:
+        detections: Detection dicts in the endpoint's schema
+        dimensions: Image {'width', 'height'}
+        pages: The set's 'pages' entries (None for a single image)
+
+    Returns:
+        dict: A build_spatial_index grid, or {'pages': {page: grid}} keyed
+        by the page number as a string
+    """
+    if not pages:
+        return build_spatial_index(detections, dimensions)
+
+    positions = {}
+    for position, detection in enumerate(detections):
+        positions.setdefault(detection.get('page', 1), []).append(position)
+    return {
+        'pages': {
+            str(page['page']): build_spatial_index(
+                detections, page.get('dimensions'), positions=positions.get(page['page'], [])
+            )
+            for page in pages
+        }
+    }
+
+
+def has_current_index(raw):
+    """Whether a raw set carries an index of the layout index_detections builds"""
+    grid = raw.get('spatialIndex')
+    return grid is not None and ('pages' in grid) == bool(raw.get('pages'))
+
+
+def on_page(detections, page):
+    """Detections found on a page; single images are page 1"""
+    return [d for d in detections if d.get('page', 1) == page]
+
+
+def page_dimensions(raw, page):
+    """A page's {'width', 'height'}, or the set's for single images"""
+    for entry in raw.get('pages') or []:
+        if entry['page'] == page:
+            return entry.get('dimensions', {})
+    return raw.get('dimensions', {})
+
+
+def detections_in_viewport(raw, viewport, page=None):
+    """
+    Detections of a raw set overlapping a viewport, in their stored order.
+
+    Uses the set's spatial index when it has one (sets stored before the
+    index existed are scanned).
+
+    Args:
+        page: Page the viewport is on; required for PDF sets, whose pages
+            share a coordinate space
+
+    Raises:
+        ValueError: If the set has several pages and no page is given
+    """
+    detections = raw['detections']
+    grid = raw.get('spatialIndex')
+    if raw.get('pages'):
+        if page is None:
+            raise ValueError('page is required for a viewport on a multi-page blueprint')
+        grid = (grid or {}).get('pages', {}).get(str(page))
+
+    if grid is None:
+        if page is not None:
+            detections = on_page(detections, page)
+        return [d for d in detections if intersects(d['boundingBox'], viewport)]
+    if page is not None and not raw.get('pages') and page != 1:
+        return []
+
+    cells, index = grid['cells'], grid['index']
+    rows = range(_cell(viewport['y'] - grid['maxHeight'], grid['cellHeight'], cells),
+                 _cell(viewport['y'] + viewport['height'], grid['cellHeight'], cells) + 1)
+    columns = range(_cell(viewport['x'] - grid['maxWidth'], grid['cellWidth'], cells),
+                    _cell(viewport['x'] + viewport['width'], grid['cellWidth'], cells) + 1)
+
+    positions = [position for row in rows for column in columns for position in index[row * cells + column]]
+    positions.sort()
+    return [detections[position] for position in positions
+            if intersects(detections[position]['boundingBox'], viewport)]
+
+
+def summarize(detections):
+    """
+    Results statistics for a set of detections.
+
+    Returns:
+        dict: totalDetections, totalRooms, avgConfidence, elementCounts
+    """
+    class_counts = {}
+    for detection in detections:
+        element_class = detection.get('class', 'unknown')
+        class_counts[element_class] = class_counts.get(element_class, 0) + 1
+
+    avg_confidence = sum(d['confidence'] for d in detections) / len(detections) if detections else 0
+    return {
+        'totalDetections': len(detections),
+        'totalRooms': len(detections),
+        'avgConfidence': round(avg_confidence, 2),
+        'elementCounts': class_counts,
+        'processingSteps': PROCESSING_STEPS
+    }
+
+
+def build_results(raw, confidence, classes=None, viewport=None, page=None):
+    """
+    Results document for a threshold, in the results.json schema.
+
+    Args:
+        raw: Raw detection set (see load_raw_detections)
+        confidence: Threshold; values below the raw set's own threshold
+            are raised to it
+        classes: Class names to keep (None keeps all)
+        viewport: Box (see parse_viewport) detections must overlap (None
+            keeps all)
+        page: Page of a PDF set to keep (None keeps all); its detections
+            and dimensions are returned
+
+    Returns:
+        dict: Results with filtered detections and recomputed statistics
+
+    Raises:
+        ValueError: For a viewport on a multi-page set without a page
+    """
+    confidence = max(float(confidence), raw.get('rawConfidence', RAW_CONFIDENCE))
+    if viewport is not None:
+        detections = detections_in_viewport(raw, viewport, page)
+    elif page is not None:
+        detections = on_page(raw['detections'], page)
+    else:
+        detections = raw['detections']
+    detections = filter_detections(detections, confidence, classes)
+
+    results = {
+        'blueprintId': raw['blueprintId'],
+        'modelVersion': raw['modelVersion'],
+        'processingTime': raw['processingTime'],
+        'cached': raw.get('cached', False),
+        'detectedAt': raw['detectedAt'],
+        'confidence': confidence,
+        'detections': detections,
+        'statistics': summarize(detections),
+        'dimensions': raw.get('dimensions', {}) if page is None else page_dimensions(raw, page)
+    }
+    if 'pages' in raw:
+        results['pages'] = raw['pages']
+    if page is not None:
+        results['selectedPage'] = page
+    if classes:
+        results['classes'] = sorted(classes)
+    if viewport is not None:
+        results['viewport'] = viewport
+    return results
+
+
+def paginate(results, limit=None, cursor=None):
+    """
+    One page of a results document's detections.
+
+    Statistics still describe every matching detection. The cursor is
+    opaque to clients: they pass back the page's 'nextCursor'.
+
+    Args:
+        results: Results document
+        limit: Detections per page (None for the rest of the set)
+        cursor: 'nextCursor' of the previous page (None for the first)
+
+    Returns:
+        dict: Results with the page's detections and a 'page' entry
+    """
+    detections = results['detections']
+    start = int(cursor or 0)
+    end = len(detections) if limit is None else start + limit
+    page = dict(results)
+    page['detections'] = detections[start:end]
+    page['page'] = {
+        'limit': limit,
+        'cursor': cursor,
+        'nextCursor': str(end) if end < len(detections) else None,
+        'total': len(detections)
+    }
+    return page
@@ -0,0 +1,155 @@
+"""
+Conditional GETs for the status and results endpoints.
+
+Responses carry the ETag and Last-Modified of the S3 object they were read
+from, with `Cache-Control: no-cache`, so browsers revalidate each poll
+with If-None-Match / If-Modified-Since. The handlers forward those
+conditions to S3 GetObject: an unchanged object comes back as 304 Not
+Modified without its body, and the handler answers 304 without reading or
+re-serializing anything.
+
+Filtered results (?confidence / ?classes) are computed, not stored, so
+their ETag is the source object's ETag plus a hash of the query:
+
+    "<source etag>-q<query hash>"
+
+which lets the handler recover the source ETag from If-None-Match and
+still make the S3 request conditional.
+"""
+import hashlib
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+# Revalidate on every use; a 304 is cheap
+CACHE_CONTROL = 'no-cache'
+
+
+def request_header(event, name):
+    """Value of a request header, matched case-insensitively, or None"""
+    name = name.lower()
+    for header, value in (event.get('headers') or {}).items():
+        if header.lower() == name:
+            return value
+    return None
+
+
+def entity_tags(if_none_match):
+    """
+    Entity tags listed in an If-None-Match header.
+
+    Weak tags ('W/"..."', as added by compressing proxies) are compared as
+    their strong form.
+
+    Returns:
+        list: Quoted tags, empty for None or '*'
+    """
+    if not if_none_match:
+        return []
+    tags = []
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag and tag != '*':
+            tags.append(tag)
+    return tags
+
+
+def get_conditions(event):
+    """
+    GetObject arguments making a read conditional on the request's
+    validators.
+
+    If-None-Match takes precedence over If-Modified-Since, as in HTTP.
+
+    Args:
+        event: API Gateway proxy event
+
+    Returns:
+        dict: IfNoneMatch or IfModifiedSince, or empty for an
+        unconditional read
+    """
+    if_none_match = request_header(event, 'If-None-Match')
+    if if_none_match is not None:
+        tags = entity_tags(if_none_match)
+        return {'IfNoneMatch': tags[0]} if tags else {}
+
+    if_modified_since = request_header(event, 'If-Modified-Since')
+    if if_modified_since:
+        try:
+            return {'IfModifiedSince': parsedate_to_datetime(if_modified_since)}
+        except (TypeError, ValueError):
+            pass
+    return {}
+
+
+def is_not_modified(error):
+    """Whether a ClientError from GetObject is S3's 304 Not Modified"""
+    return error.response.get('Error', {}).get('Code') in ('304', 'NotModified')
+
+
+def query_tag(*parts):
+    """Short hash identifying the query a derived ETag was computed for"""
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:12]
+
+
+def derived_etag(source_etag, *parts):
+    """ETag of a document computed from a source object and query parts"""
+    return f'"{source_etag.strip(chr(34))}-q{query_tag(*parts)}"'
+
+
+def source_etag(event, *parts):
+    """
+    Source ETag carried by the request's If-None-Match, if it names a
+    derived ETag for the same query parts.
+
+    Returns:
+        str: Quoted source ETag, or None
+    """
+    suffix = f"-q{query_tag(*parts)}"
+    for tag in entity_tags(request_header(event, 'If-None-Match')):
+        tag = tag.strip('"')
+        if tag.endswith(suffix):
+            return f'"{tag[:-len(suffix)]}"'
+    return None
+
+
+def validator_headers(response, etag=None):
+    """
+    ETag, Last-Modified and Cache-Control headers for a response built
+    from an S3 GetObject response.
+
+    Args:
+        response: GetObject response
+        etag: ETag to send instead of the object's own
+    """
+    headers = {
+        'ETag': etag or response['ETag'],
+        'Cache-Control': CACHE_CONTROL
+    }
+    last_modified = response.get('LastModified')
+    if last_modified is not None:
+        headers['Last-Modified'] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+    return headers
+
+
+def not_modified_headers(error, event, etag=None):
+    """
+    Validator headers for a 304 answering a request whose conditional
+    GetObject failed with Not Modified.
+
+    Args:
+        error: ClientError from GetObject (see is_not_modified)
+        event: API Gateway proxy event
+        etag: ETag to send instead of the object's own
+    """
+    s3_headers = error.response.get('ResponseMetadata', {}).get('HTTPHeaders', {})
+    request_tags = entity_tags(request_header(event, 'If-None-Match'))
+    etag = etag or s3_headers.get('etag') or (request_tags[0] if request_tags else None)
+
+    headers = {'Cache-Control': CACHE_CONTROL}
+    if etag:
+        headers['ETag'] = etag
+    if s3_headers.get('last-modified'):
+        headers['Last-Modified'] = s3_headers['last-modified']
+    return headers
@@ -1,12 +1,17 @@
 import json
-import boto3
 import os
 import time
 from datetime import datetime
-from botocore.exceptions import ClientError
 
-s3_client = boto3.client('s3')
-sagemaker_client = boto3.client('sagemaker-runtime')
+from functions.aws_clients import lazy_client
+from functions.detections import RAW_CONFIDENCE, build_results, detections_key, index_detections
+from functions.progress_push import ProgressNotifier
+from functions.results_cache import ResultsCache, cache_key, content_hash
+from functions.status_store import S3StatusBackend, StatusStore
+
+s3_client = lazy_client('s3')
+sagemaker_client = lazy_client('sagemaker-runtime')
+sqs_client = lazy_client('sqs')
 
 BUCKET_NAME = os.environ.get('BUCKET_NAME', 'innergy-blueprints-dev')
 SAGEMAKER_ENDPOINT = os.environ.get('SAGEMAKER_ENDPOINT', 'yolov5-blueprint-detector')
@@ -14,6 +19,49 @@ MODEL_VERSION = os.environ.get('MODEL_VERSION', 'yolov5-v1.0')
 MAX_RETRIES = int(os.environ.get('SAGEMAKER_MAX_RETRIES', '3'))
 RETRY_DELAY = float(os.environ.get('SAGEMAKER_RETRY_DELAY', '1.0'))
 
+# sync: /detect waits for SageMaker and returns the results
+# async: /detect queues a job for inference_worker and returns 202
+INFERENCE_MODE = os.environ.get('INFERENCE_MODE', 'sync')
+JOB_QUEUE_URL = os.environ.get('JOB_QUEUE_URL', '')
+
+# Stage changes are pushed to WebSocket subscribers of the blueprint
+# (websocket_handler) when the WebSocket API endpoint is configured
+WEBSOCKET_ENDPOINT = os.environ.get('WEBSOCKET_ENDPOINT', '')
+progress_notifier = ProgressNotifier(
+    s3_client, BUCKET_NAME,
+    lazy_client('apigatewaymanagementapi', WEBSOCKET_ENDPOINT) if WEBSOCKET_ENDPOINT else None
+)
+
+def push_status(status_key, status):
+    """
+    StatusStore listener: push every stored status to subscribers. A
+    batch's aggregate status is pushed to the subscribers of its batch ID.
+    """
+    progress_notifier.notify(status.get('blueprintId') or status.get('batchId'), status)
+
+# Progress updates are written in the background; flush before returning
+status_store = StatusStore(S3StatusBackend(s3_client, BUCKET_NAME), on_write=push_status)
+
+# The model runs once at this threshold; requested thresholds and class
+# filters are applied to the stored raw set (see functions/detections.py)
+RAW_DETECTION_CONFIDENCE = float(os.environ.get('RAW_DETECTION_CONFIDENCE', str(RAW_CONFIDENCE)))
+
+# SageMaker responses cached by image content, model version and raw threshold
+RESULTS_CACHE_ENABLED = os.environ.get('RESULTS_CACHE_ENABLED', 'true').lower() == 'true'
+RESULTS_CACHE_TTL = int(os.environ.get('RESULTS_CACHE_TTL', str(7 * 24 * 3600)))
+RESULTS_CACHE_MAX_ENTRIES = int(os.environ.get('RESULTS_CACHE_MAX_ENTRIES', '256'))
+results_cache = ResultsCache(s3_client, BUCKET_NAME, RESULTS_CACHE_TTL, RESULTS_CACHE_MAX_ENTRIES)
+
+def is_retryable_error(error):
+    """Whether a failed SageMaker invocation may succeed when repeated"""
+    error_msg = str(error)
+    return (
+        'ServiceUnavailable' in error_msg or
+        'ThrottlingException' in error_msg or
+        'InternalFailure' in error_msg or
+        'timeout' in error_msg.lower()
+    )
+
 def invoke_sagemaker_with_retry(endpoint_name, payload, max_retries=MAX_RETRIES):
     """
     Invoke SageMaker endpoint with exponential backoff retry logic
@@ -50,15 +98,7 @@ def invoke_sagemaker_with_retry(endpoint_name, payload, max_retries=MAX_RETRIES)
             error_msg = str(e)
             print(f"Attempt {attempt + 1}/{max_retries} failed: {error_msg}")
 
-            # Check if error is retryable
-            is_retryable = (
-                'ServiceUnavailable' in error_msg or
-                'ThrottlingException' in error_msg or
-                'InternalFailure' in error_msg or
-                'timeout' in error_msg.lower()
-            )
-
-            if attempt < max_retries - 1 and is_retryable:
+            if attempt < max_retries - 1 and is_retryable_error(e):
                 # Exponential backoff
                 delay = RETRY_DELAY * (2 ** attempt)
                 print(f"Retrying in {delay}s...")
@@ -67,10 +107,203 @@ def invoke_sagemaker_with_retry(endpoint_name, payload, max_retries=MAX_RETRIES)
                 print(f"Max retries reached or non-retryable error")
                 raise
 
+def update_status(status_key, blueprint_id, stage, message, restart=False):
+    """
+    Move a blueprint to a stage in the status object polled by the frontend
+
+    Args:
+        status_key: S3 key of status.json
+        blueprint_id: Blueprint ID
+        stage: upload, preprocessing, inference, postprocess, complete or failed
+        message: Human-readable progress message
+        restart: Replace a completed or failed status (a new request)
+
+    Returns:
+        bool: False if the blueprint already completed or failed
+    """
+    return status_store.set_stage(status_key, stage, message, restart=restart, blueprintId=blueprint_id)
+
+def mark_failed(status_key, blueprint_id, message):
+    """Write a terminal failed status"""
+    update_status(status_key, blueprint_id, 'failed', message)
+
+def lookup_cached_result(s3_key, confidence):
+    """
+    Find a cached SageMaker response for the uploaded image.
+
+    Returns:
+        tuple: (cached response or None, cache key or None, content hash or None).
+        The key is None if the cache is disabled or unavailable.
+    """
+    if not RESULTS_CACHE_ENABLED:
+        return None, None, None
+    try:
+        image_hash = content_hash(s3_client, BUCKET_NAME, s3_key)
+        key = cache_key(image_hash, MODEL_VERSION, confidence)
+        result, source = results_cache.get(key)
+    except Exception as e:
+        # The cache is an optimization; inference must not depend on it
+        print(f"Results cache unavailable: {str(e)}")
+        return None, None, None
+
+    results_cache.emit_metrics(source)
+    if source:
+        print(f"Results cache hit ({source}): {key}")
+    return result, key, image_hash
+
+def process_blueprint(blueprint_id, session_id, s3_key, confidence, restart=True, max_retries=MAX_RETRIES,
+                      invoke=None):
+    """
+    Run inference for an uploaded blueprint and store the results.
+
+    Moves the status through preprocessing, inference, postprocess and
+    complete along the way. A SageMaker failure is raised without touching
+    the status, so the caller decides whether it is final.
+
+    Args:
+        blueprint_id: Blueprint ID
+        session_id: Session the blueprint was uploaded in
+        s3_key: S3 key of the uploaded image
+        confidence: Confidence threshold
+        restart: Reprocess a blueprint that already completed or failed.
+            Queue workers pass False so a redelivered job is a no-op.
+        max_retries: SageMaker attempts (see invoke_sagemaker_with_retry).
+            The batch worker makes one and retries throttled blueprints
+            itself.
+        invoke: Called with the SageMaker payload instead of
+            invoke_sagemaker_with_retry, e.g. InvocationBatcher.submit
+
+    Returns:
+        dict: Formatted results as stored in results.json, or None if the
+        blueprint was already finished
+    """
+    # Construct S3 URI for SageMaker
+    s3_uri = f"s3://{BUCKET_NAME}/{s3_key}"
+
+    # The endpoint runs at the raw threshold so the stored set serves any
+    # threshold at or above it without another invocation
+    raw_confidence = min(float(confidence), RAW_DETECTION_CONFIDENCE)
+    payload = {
+        's3_uri': s3_uri,
+        'confidence': raw_confidence
+    }
+
+    print(f"Invoking SageMaker endpoint: {SAGEMAKER_ENDPOINT}")
+    print(f"Blueprint: {blueprint_id}, S3 URI: {s3_uri}")
+
+    # Record start time for processing metrics
+    start_time = time.time()
+
+    status_key = f"uploads/{session_id}/{blueprint_id}/status.json"
+    if not update_status(status_key, blueprint_id, 'preprocessing',
+                         'Preparing image for inference...', restart=restart):
+        print(f"Blueprint {blueprint_id} already finished, skipping")
+        return None
+    update_status(status_key, blueprint_id, 'inference', 'Running AI model inference...')
+
+    # Identical bytes were already analysed by this model version
+    result, cache_entry_key, image_hash = lookup_cached_result(s3_key, raw_confidence)
+    cached = result is not None
+
+    if not cached:
+        # Invoke SageMaker endpoint with retry logic
+        if invoke:
+            result = invoke(payload)
+        else:
+            result = invoke_sagemaker_with_retry(SAGEMAKER_ENDPOINT, payload, max_retries)
+        if cache_entry_key:
+            try:
+                results_cache.put(cache_entry_key, result, image_hash)
+            except Exception as e:
+                print(f"Failed to cache results: {str(e)}")
+
+    update_status(status_key, blueprint_id, 'postprocess', 'Finalizing detection results...')
+
+    # Calculate processing time
+    processing_time = time.time() - start_time
+
+    # Store the raw detection set, then the requested threshold's view of it
+    prefix = f"uploads/{session_id}/{blueprint_id}/"
+    raw = {
+        'blueprintId': blueprint_id,
+        'modelVersion': MODEL_VERSION,
+        'processingTime': round(processing_time, 2),
+        'cached': cached,
+        'detectedAt': datetime.utcnow().isoformat() + 'Z',
+        'rawConfidence': raw_confidence,
+        'confidence': float(confidence),
+        'detections': result.get('detections', []),
+        'dimensions': result.get('dimensions', {})
+    }
+    if 'pages' in result:
+        # PDF sets: each detection's 'page' refers to an entry here
+        raw['pages'] = result['pages']
+    # Built once here so viewport queries do not scan the whole set
+    raw['spatialIndex'] = index_detections(raw['detections'], raw['dimensions'], raw.get('pages'))
+    s3_client.put_object(
+        Bucket=BUCKET_NAME,
+        Key=detections_key(prefix),
+        Body=json.dumps(raw),
+        ContentType='application/json'
+    )
+
+    # Format results according to PRD specification
+    formatted_results = build_results(raw, confidence)
+
+    # Store results in S3
+    results_key = f"{prefix}results.json"
+    s3_client.put_object(
+        Bucket=BUCKET_NAME,
+        Key=results_key,
+        Body=json.dumps(formatted_results),
+        ContentType='application/json'
+    )
+
+    update_status(status_key, blueprint_id, 'complete', 'Processing completed successfully')
+
+    print(f"Results stored at s3://{BUCKET_NAME}/{results_key}")
+    print(f"Detected {formatted_results['statistics']['totalDetections']} elements "
+          f"({len(raw['detections'])} above {raw_confidence}) in {processing_time:.2f}s")
+    print(f"Element breakdown: {formatted_results['statistics']['elementCounts']}")
+
+    return formatted_results
+
+def enqueue_job(blueprint_id, session_id, s3_key, confidence):
+    """
+    Queue a blueprint for inference_worker and mark it as queued.
+
+    The status stays 'processing' so the frontend keeps polling until the
+    worker writes completed or failed.
+
+    Returns:
+        str: SQS message ID
+    """
+    response = sqs_client.send_message(
+        QueueUrl=JOB_QUEUE_URL,
+        MessageBody=json.dumps({
+            'blueprintId': blueprint_id,
+            'sessionId': session_id,
+            's3Key': s3_key,
+            'confidence': confidence,
+            'queuedAt': datetime.utcnow().isoformat() + 'Z'
+        })
+    )
+
+    status_key = f"uploads/{session_id}/{blueprint_id}/status.json"
+    update_status(status_key, blueprint_id, 'upload', 'Queued for processing...', restart=True)
+    status_store.release(status_key)
+
+    print(f"Queued blueprint {blueprint_id} as message {response['MessageId']}")
+    return response['MessageId']
+
 def lambda_handler(event, context):
     """
     Lambda function to trigger SageMaker inference.
-    This will be fully implemented in Task 5.
+
+    In sync mode the request waits for the model and returns the results.
+    In async mode (INFERENCE_MODE=async) the job is queued for
+    inference_worker and the request returns 202 immediately; progress is
+    read through the status endpoint.
     """
     try:
         body = json.loads(event.get('body', '{}'))
@@ -120,129 +353,28 @@ def lambda_handler(event, context):
                 })
             }
 
-        # Construct S3 URI for SageMaker
-        s3_uri = f"s3://{BUCKET_NAME}/{s3_key}"
-
-        # Prepare payload for SageMaker endpoint
-        payload = {
-            's3_uri': s3_uri,
-            'confidence': confidence
-        }
-
-        print(f"Invoking SageMaker endpoint: {SAGEMAKER_ENDPOINT}")
-        print(f"Blueprint: {blueprint_id}, S3 URI: {s3_uri}")
-
-        # Record start time for processing metrics
-        start_time = time.time()
-
-        # Update status: preprocessing
-        status_key = f"uploads/{session_id}/{blueprint_id}/status.json"
-        s3_client.put_object(
-            Bucket=BUCKET_NAME,
-            Key=status_key,
-            Body=json.dumps({
-                'blueprintId': blueprint_id,
-                'status': 'processing',
-                'stage': 'preprocessing',
-                'progress': 25,
-                'estimatedTimeRemaining': 15,
-                'message': 'Preparing image for inference...',
-                'updatedAt': datetime.utcnow().isoformat() + 'Z'
-            }),
-            ContentType='application/json'
-        )
-
-        try:
-            # Update status: inference
-            s3_client.put_object(
-                Bucket=BUCKET_NAME,
-                Key=status_key,
-                Body=json.dumps({
-                    'blueprintId': blueprint_id,
-                    'status': 'processing',
-                    'stage': 'inference',
-                    'progress': 50,
-                    'estimatedTimeRemaining': 10,
-                    'message': 'Running AI model inference...',
-                    'updatedAt': datetime.utcnow().isoformat() + 'Z'
-                }),
-                ContentType='application/json'
-            )
-
-            # Invoke SageMaker endpoint with retry logic
-            result = invoke_sagemaker_with_retry(SAGEMAKER_ENDPOINT, payload)
-
-            # Update status: postprocess
-            s3_client.put_object(
-                Bucket=BUCKET_NAME,
-                Key=status_key,
-                Body=json.dumps({
+        if INFERENCE_MODE == 'async':
+            job_id = enqueue_job(blueprint_id, session_id, s3_key, confidence)
+            return {
+                'statusCode': 202,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Allow-Headers': 'Content-Type',
+                    'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+                },
+                'body': json.dumps({
+                    'message': 'Inference queued',
                     'blueprintId': blueprint_id,
+                    'jobId': job_id,
                     'status': 'processing',
-                    'stage': 'postprocess',
-                    'progress': 75,
-                    'estimatedTimeRemaining': 5,
-                    'message': 'Finalizing detection results...',
-                    'updatedAt': datetime.utcnow().isoformat() + 'Z'
-                }),
-                ContentType='application/json'
-            )
-
-            # Calculate processing time
-            processing_time = time.time() - start_time
-
-            # Calculate statistics by element class
-            detections = result.get('detections', [])
-            class_counts = {}
-            for detection in detections:
-                element_class = detection.get('class', 'unknown')
-                class_counts[element_class] = class_counts.get(element_class, 0) + 1
-
-            # Format results according to PRD specification
-            formatted_results = {
-                'blueprintId': blueprint_id,
-                'modelVersion': MODEL_VERSION,
-                'processingTime': round(processing_time, 2),
-                'detectedAt': datetime.utcnow().isoformat() + 'Z',
-                'detections': detections,
-                'statistics': {
-                    'totalDetections': len(detections),
-                    'totalRooms': result.get('totalRooms', 0),
-                    'avgConfidence': round(result.get('avgConfidence', 0), 2),
-                    'elementCounts': class_counts,
-                    'processingSteps': ['upload', 'inference', 'postprocess']
-                },
-                'dimensions': result.get('dimensions', {})
+                    'stage': 'upload'
+                })
             }
 
-            # Store results in S3
-            results_key = f"uploads/{session_id}/{blueprint_id}/results.json"
-            s3_client.put_object(
-                Bucket=BUCKET_NAME,
-                Key=results_key,
-                Body=json.dumps(formatted_results),
-                ContentType='application/json'
-            )
-
-            # Update status: complete
-            s3_client.put_object(
-                Bucket=BUCKET_NAME,
-                Key=status_key,
-                Body=json.dumps({
-                    'blueprintId': blueprint_id,
-                    'status': 'completed',
-                    'stage': 'complete',
-                    'progress': 100,
-                    'estimatedTimeRemaining': 0,
-                    'message': 'Processing completed successfully',
-                    'updatedAt': datetime.utcnow().isoformat() + 'Z'
-                }),
-                ContentType='application/json'
-            )
+        status_key = f"uploads/{session_id}/{blueprint_id}/status.json"
 
-            print(f"Results stored at s3://{BUCKET_NAME}/{results_key}")
-            print(f"Detected {formatted_results['statistics']['totalDetections']} elements in {processing_time:.2f}s")
-            print(f"Element breakdown: {class_counts}")
+        try:
+            formatted_results = process_blueprint(blueprint_id, session_id, s3_key, confidence)
 
             return {
                 'statusCode': 200,
@@ -260,21 +392,7 @@ def lambda_handler(event, context):
 
         except sagemaker_client.exceptions.ModelError as e:
             print(f"SageMaker Model Error: {str(e)}")
-            # Update status: failed
-            s3_client.put_object(
-                Bucket=BUCKET_NAME,
-                Key=status_key,
-                Body=json.dumps({
-                    'blueprintId': blueprint_id,
-                    'status': 'failed',
-                    'stage': 'failed',
-                    'progress': 0,
-                    'estimatedTimeRemaining': 0,
-                    'message': f'Model inference failed: {str(e)}',
-                    'updatedAt': datetime.utcnow().isoformat() + 'Z'
-                }),
-                ContentType='application/json'
-            )
+            mark_failed(status_key, blueprint_id, f'Model inference failed: {str(e)}')
             return {
                 'statusCode': 500,
                 'headers': {
@@ -290,21 +408,7 @@ def lambda_handler(event, context):
 
         except Exception as e:
             print(f"SageMaker invocation error: {str(e)}")
-            # Update status: failed
-            s3_client.put_object(
-                Bucket=BUCKET_NAME,
-                Key=status_key,
-                Body=json.dumps({
-                    'blueprintId': blueprint_id,
-                    'status': 'failed',
-                    'stage': 'failed',
-                    'progress': 0,
-                    'estimatedTimeRemaining': 0,
-                    'message': f'Failed to invoke SageMaker endpoint: {str(e)}',
-                    'updatedAt': datetime.utcnow().isoformat() + 'Z'
-                }),
-                ContentType='application/json'
-            )
+            mark_failed(status_key, blueprint_id, f'Failed to invoke SageMaker endpoint: {str(e)}')
             return {
                 'statusCode': 500,
                 'headers': {
@@ -318,6 +422,9 @@ def lambda_handler(event, context):
                 })
             }
 
+        finally:
+            status_store.release(status_key)
+
     except Exception as e:
         print(f"Error: {str(e)}")
         return {
@@ -0,0 +1,114 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from functions import inference_handler
+from functions.invocation_batching import InvocationBatcher
+
+# Must match maxReceiveCount of the queue's redrive policy
+MAX_RECEIVE_COUNT = int(os.environ.get('JOB_MAX_RECEIVE_COUNT', '3'))
+
+# Jobs delivered together (the SQS event source's batchSize and
+# maximumBatchingWindow) run at once, and their invocations are merged into
+# batch invocations of up to INVOKE_BATCH_MAX_IMAGES images, held for up to
+# INVOKE_BATCH_WAIT_MS for the others to arrive (1 invokes per job)
+INVOKE_BATCH_MAX_IMAGES = int(os.environ.get('INVOKE_BATCH_MAX_IMAGES', '8'))
+INVOKE_BATCH_WAIT_MS = float(os.environ.get('INVOKE_BATCH_WAIT_MS', '50'))
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+def get_batcher():
+    """Create the invocation batcher for this container on first use"""
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = InvocationBatcher(
+                lambda payload: inference_handler.invoke_sagemaker_with_retry(
+                    inference_handler.SAGEMAKER_ENDPOINT, payload
+                ),
+                max_wait_ms=INVOKE_BATCH_WAIT_MS,
+                max_images=INVOKE_BATCH_MAX_IMAGES
+            )
+        return _batcher
+
+def handle_job(job, receive_count, invoke=None):
+    """
+    Process one queued /detect job.
+
+    A redelivered job for a blueprint that already completed is skipped.
+    Model errors are final and acknowledged. Any other failure is raised so
+    SQS redelivers the message; only the last attempt before the message
+    moves to the dead-letter queue marks the blueprint as failed, so the
+    frontend does not stop polling while a retry is still pending.
+
+    Args:
+        job: Message body written by inference_handler.enqueue_job
+        receive_count: ApproximateReceiveCount of the message
+        invoke: SageMaker invocation override (see process_blueprint)
+    """
+    blueprint_id = job['blueprintId']
+    session_id = job['sessionId']
+    status_key = f"uploads/{session_id}/{blueprint_id}/status.json"
+
+    try:
+        inference_handler.process_blueprint(
+            blueprint_id, session_id, job['s3Key'], job.get('confidence', 0.5), restart=False,
+            invoke=invoke
+        )
+
+    except inference_handler.sagemaker_client.exceptions.ModelError as e:
+        print(f"SageMaker Model Error: {str(e)}")
+        inference_handler.mark_failed(status_key, blueprint_id, f'Model inference failed: {str(e)}')
+
+    except Exception as e:
+        print(f"Attempt {receive_count}/{MAX_RECEIVE_COUNT} for {blueprint_id} failed: {str(e)}")
+        if receive_count >= MAX_RECEIVE_COUNT:
+            inference_handler.mark_failed(
+                status_key, blueprint_id, f'Failed to invoke SageMaker endpoint: {str(e)}'
+            )
+        else:
+            inference_handler.update_status(
+                status_key, blueprint_id, 'upload', 'Inference delayed, retrying...'
+            )
+        raise
+
+    finally:
+        # Progress updates are written behind; they must land before the
+        # Lambda is frozen
+        inference_handler.status_store.release(status_key)
+
+def lambda_handler(event, context):
+    """
+    SQS-triggered worker for asynchronous /detect requests.
+
+    Several messages are processed at once, with their SageMaker calls
+    batched (see INVOKE_BATCH_MAX_IMAGES). Returns the IDs of failed
+    messages as a partial batch response, so a failure only redelivers its
+    own message.
+    """
+    records = event.get('Records', [])
+    batcher = get_batcher() if len(records) > 1 and INVOKE_BATCH_MAX_IMAGES > 1 else None
+
+    def process(record):
+        try:
+            job = json.loads(record['body'])
+            receive_count = int(record.get('attributes', {}).get('ApproximateReceiveCount', '1'))
+            handle_job(job, receive_count, invoke=batcher.submit if batcher else None)
+        except Exception as e:
+            print(f"Error processing message {record.get('messageId')}: {str(e)}")
+            return {'itemIdentifier': record['messageId']}
+        finally:
+            if batcher:
+                batcher.job_done()
+        return None
+
+    if batcher:
+        batcher.add_jobs(len(records))
+        with ThreadPoolExecutor(max_workers=len(records)) as executor:
+            outcomes = list(executor.map(process, records))
+    else:
+        outcomes = [process(record) for record in records]
+
+    return {'batchItemFailures': [failure for failure in outcomes if failure]}
@@ -0,0 +1,179 @@
+"""
+Micro-batching of SageMaker invocations in the inference worker.
+
+Each /detect job used to cost one InvokeEndpoint call. The model server
+gives every worker one invocation at a time, so requests cannot be merged
+inside the endpoint; the place where independent jobs meet is the SQS
+inference worker, which receives up to the event source's batch size of
+messages per invocation.
+
+The worker runs those jobs concurrently and routes their invocations
+through an InvocationBatcher. It holds them for up to max_wait_ms, until
+max_images are queued, or until every running job is waiting, then sends
+one {"s3_uris": [...]} invocation per confidence threshold and hands each
+job its own result. Queue depth, batch fill ratio and queueing delay are
+logged per dispatched batch in CloudWatch Embedded Metric Format.
+"""
+import json
+import threading
+import time
+from concurrent.futures import Future
+
+
+class _Request:
+    __slots__ = ('s3_uri', 'confidence', 'future', 'enqueued_at')
+
+    def __init__(self, s3_uri, confidence):
+        self.s3_uri = s3_uri
+        self.confidence = confidence
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class InvocationBatcher:
+    """
+    Collects concurrent single-image invocations into batch invocations.
+
+    Args:
+        invoke: Callable taking a SageMaker payload and returning the
+            parsed response (inference_handler.invoke_sagemaker_with_retry)
+        max_wait_ms: Longest time the first queued request waits for others
+        max_images: Images per batch invocation
+    """
+
+    NAMESPACE = 'MaxTrace/Backend'
+
+    def __init__(self, invoke, max_wait_ms=50, max_images=8):
+        self.invoke = invoke
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_images = max_images
+        self._queue = []
+        self._active = 0
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._dispatch_loop, name='invocation-batcher', daemon=True)
+        self._thread.start()
+
+    def add_jobs(self, count):
+        """
+        Announce jobs before they start. The batcher stops waiting once
+        every announced job has queued its invocation or called job_done().
+        """
+        with self._condition:
+            self._active += count
+
+    def job_done(self):
+        """Mark an announced job as finished"""
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    def submit(self, payload):
+        """
+        Invoke the endpoint for one payload, batched with concurrent ones.
+
+        Payloads that cannot share a batch (PDFs, which are processed page
+        by page) are invoked directly.
+
+        Returns:
+            dict: The single-image response for the payload
+        """
+        if payload['s3_uri'].lower().endswith('.pdf'):
+            return self.invoke(payload)
+
+        request = _Request(payload['s3_uri'], payload['confidence'])
+        with self._condition:
+            self._queue.append(request)
+            self._in_flight += 1
+            self._condition.notify_all()
+        try:
+            return request.future.result()
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+                self._condition.notify_all()
+
+    def _ready(self):
+        """Whether the queued requests should be dispatched now"""
+        if len(self._queue) >= self.max_images:
+            return True
+        # Every running job is queued or waiting for a dispatched batch
+        if self._in_flight >= self._active:
+            return True
+        return time.monotonic() >= self._queue[0].enqueued_at + self.max_wait
+
+    def _dispatch_loop(self):
+        while True:
+            with self._condition:
+                while not self._queue or not self._ready():
+                    if self._queue:
+                        remaining = self._queue[0].enqueued_at + self.max_wait - time.monotonic()
+                        self._condition.wait(max(remaining, 0.001))
+                    else:
+                        self._condition.wait()
+                batch = self._queue[:self.max_images]
+                del self._queue[:self.max_images]
+                queue_depth = len(self._queue)
+
+            dispatched_at = time.monotonic()
+            groups = {}
+            for request in batch:
+                groups.setdefault(request.confidence, []).append(request)
+            for confidence, requests in groups.items():
+                self._run(requests, confidence)
+            self.emit_metrics(batch, queue_depth, dispatched_at)
+
+    def _run(self, requests, confidence):
+        """Invoke the endpoint once for requests sharing a threshold"""
+        if len(requests) == 1:
+            try:
+                requests[0].future.set_result(self.invoke({'s3_uri': requests[0].s3_uri, 'confidence': confidence}))
+            except Exception as e:
+                requests[0].future.set_exception(e)
+            return
+
+        try:
+            results = self.invoke({'s3_uris': [request.s3_uri for request in requests], 'confidence': confidence})
+        except Exception as e:
+            # One bad image must not fail the others: invoke one by one, so
+            # each job sees its own error
+            print(f"Batch invocation of {len(requests)} images failed, invoking singly: {str(e)}")
+            for request in requests:
+                self._run([request], confidence)
+            return
+
+        for request, result in zip(requests, results['results']):
+            result.pop('s3_uri', None)
+            request.future.set_result(result)
+
+    def emit_metrics(self, batch, queue_depth, dispatched_at):
+        """
+        Log one dispatched batch as a CloudWatch Embedded Metric Format line.
+
+        Args:
+            batch: Requests in the batch
+            queue_depth: Requests still queued after the batch was taken
+            dispatched_at: monotonic time the batch was taken
+        """
+        delays = [(dispatched_at - request.enqueued_at) * 1000 for request in batch]
+        print(json.dumps({
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': self.NAMESPACE,
+                    'Dimensions': [[]],
+                    'Metrics': [
+                        {'Name': 'InvocationBatchSize', 'Unit': 'Count'},
+                        {'Name': 'InvocationBatchFillRatio', 'Unit': 'None'},
+                        {'Name': 'InvocationQueueDepth', 'Unit': 'Count'},
+                        {'Name': 'InvocationQueueDelayMs', 'Unit': 'Milliseconds'},
+                        {'Name': 'InvocationMaxQueueDelayMs', 'Unit': 'Milliseconds'}
+                    ]
+                }]
+            },
+            'InvocationBatchSize': len(batch),
+            'InvocationBatchFillRatio': round(len(batch) / self.max_images, 3),
+            'InvocationQueueDepth': queue_depth,
+            'InvocationQueueDelayMs': round(sum(delays) / len(delays), 1),
+            'InvocationMaxQueueDelayMs': round(max(delays), 1)
+        }))
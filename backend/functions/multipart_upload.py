@@ -0,0 +1,133 @@
+"""
+Multipart uploads for large blueprint files.
+
+A single presigned PUT sends the whole file over one connection: a large
+scan on a slow site link is limited to what one TCP stream achieves, can
+outlive the URL, and restarts from zero when the connection drops. Files
+above UPLOAD_MULTIPART_THRESHOLD go up as an S3 multipart upload instead:
+
+1. POST /upload creates the upload and returns a presigned UploadPart URL
+   per part (upload_handler)
+2. the client PUTs the parts in parallel, retrying a failed part on its own
+3. POST /upload/{blueprintId}/complete assembles the parts from their
+   ETags, or POST /upload/{blueprintId}/abort discards them
+   (multipart_upload_handler)
+
+Uploads that are never completed or aborted are removed by the bucket's
+AbortIncompleteMultipartUpload lifecycle rule (serverless.yml).
+"""
+import math
+import os
+
+# Largest accepted file, single PUT or multipart. Shared by upload_handler
+# and multipart_upload_handler so both enforce the same limit
+MAX_UPLOAD_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', str(100 * 1024 * 1024)))
+
+# S3 limits: every part but the last is at least 5MB, at most 10,000 parts
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+
+def plan_parts(file_size, part_size):
+    """
+    Part size and count for a file, within S3's limits.
+
+    Args:
+        file_size: File size in bytes
+        part_size: Preferred part size in bytes
+
+    Returns:
+        tuple: (part size, part count)
+    """
+    part_size = max(part_size, MIN_PART_SIZE, math.ceil(file_size / MAX_PARTS))
+    return part_size, max(1, math.ceil(file_size / part_size))
+
+
+def start_upload(s3_client, bucket, key, content_type, file_size, part_size, expires_in, presign_client=None):
+    """
+    Create a multipart upload and presign a PUT URL for each part.
+
+    Args:
+        s3_client: boto3 S3 client
+        bucket: Bucket name
+        key: Object key the parts are assembled into
+        content_type: Content type of the assembled object
+        file_size: File size in bytes
+        part_size: Preferred part size (see plan_parts)
+        expires_in: Lifetime of the part URLs in seconds
+        presign_client: Client signing the part URLs, e.g. one using the
+            S3 Transfer Acceleration endpoint (default: s3_client)
+
+    Returns:
+        dict: uploadId, partSize and parts ([{partNumber, size, url}])
+    """
+    presign_client = presign_client or s3_client
+    part_size, part_count = plan_parts(file_size, part_size)
+    upload_id = s3_client.create_multipart_upload(
+        Bucket=bucket,
+        Key=key,
+        ContentType=content_type
+    )['UploadId']
+
+    parts = []
+    for index in range(part_count):
+        parts.append({
+            'partNumber': index + 1,
+            'size': min(part_size, file_size - index * part_size),
+            'url': presign_client.generate_presigned_url(
+                'upload_part',
+                Params={'Bucket': bucket, 'Key': key, 'UploadId': upload_id, 'PartNumber': index + 1},
+                ExpiresIn=expires_in
+            )
+        })
+    return {'uploadId': upload_id, 'partSize': part_size, 'parts': parts}
+
+
+def parse_parts(parts, part_count):
+    """
+    Validate the parts a client reports as uploaded.
+
+    Args:
+        parts: [{'partNumber': n, 'etag': '"..."'}] in any order
+        part_count: Parts the upload was planned with
+
+    Returns:
+        list: CompleteMultipartUpload parts in ascending order
+
+    Raises:
+        ValueError: If parts are missing, repeated or out of range
+    """
+    if not isinstance(parts, list):
+        raise ValueError('parts must be a list of {partNumber, etag}')
+
+    by_number = {}
+    for part in parts:
+        try:
+            number = int(part['partNumber'])
+            etag = str(part['etag'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('parts must be a list of {partNumber, etag}')
+        if not 1 <= number <= part_count or number in by_number:
+            raise ValueError(f"Invalid or repeated part number: {number}")
+        by_number[number] = etag
+
+    if len(by_number) != part_count:
+        missing = sorted(set(range(1, part_count + 1)) - set(by_number))
+        raise ValueError(f"Missing parts: {missing[:10]}")
+
+    return [{'PartNumber': number, 'ETag': by_number[number]} for number in sorted(by_number)]
+
+
+def complete_upload(s3_client, bucket, key, upload_id, parts):
+    """Assemble an upload's parts (from parse_parts) into the object"""
+    return s3_client.complete_multipart_upload(
+        Bucket=bucket,
+        Key=key,
+        UploadId=upload_id,
+        MultipartUpload={'Parts': parts}
+    )
+
+
+def abort_upload(s3_client, bucket, key, upload_id):
+    """Discard an upload and the parts stored for it"""
+    s3_client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
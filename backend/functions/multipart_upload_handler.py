@@ -0,0 +1,211 @@
+import json
+import os
+from datetime import datetime
+
+from functions.aws_clients import lazy_client
+from functions.blueprint_index import resolve_prefix
+from functions.multipart_upload import MAX_UPLOAD_BYTES, abort_upload, complete_upload, parse_parts
+from functions.results_cache import hash_object
+
+s3_client = lazy_client('s3')
+BUCKET_NAME = os.environ.get('BUCKET_NAME', 'innergy-blueprints-dev')
+
+def read_metadata(prefix):
+    """metadata.json written by upload_handler, or None"""
+    try:
+        response = s3_client.get_object(Bucket=BUCKET_NAME, Key=f"{prefix}metadata.json")
+    except s3_client.exceptions.NoSuchKey:
+        return None
+    return json.loads(response['Body'].read().decode('utf-8'))
+
+def mark_cancelled(prefix, blueprint_id, message):
+    """Record in status.json that the upload will not complete"""
+    s3_client.put_object(
+        Bucket=BUCKET_NAME,
+        Key=f"{prefix}status.json",
+        Body=json.dumps({
+            'blueprintId': blueprint_id,
+            'status': 'failed',
+            'stage': 'upload',
+            'progress': 0,
+            'message': message,
+            'updatedAt': datetime.utcnow().isoformat() + 'Z'
+        }),
+        ContentType='application/json'
+    )
+
+def lambda_handler(event, context):
+    """
+    Lambda function finishing a multipart blueprint upload.
+
+    - POST /upload/{blueprintId}/complete with {"uploadId": ..., "parts":
+      [{"partNumber": 1, "etag": "..."}, ...]} assembles the uploaded parts
+      into the blueprint's original.* object
+    - POST /upload/{blueprintId}/abort with {"uploadId": ...} discards them
+
+    The upload ID must be the one upload_handler created for the blueprint.
+    """
+    path_parameters = event.get('pathParameters') or {}
+    blueprint_id = path_parameters.get('blueprintId')
+    action = path_parameters.get('action')
+
+    try:
+        body = json.loads(event.get('body') or '{}')
+        upload_id = body.get('uploadId')
+
+        if action not in ('complete', 'abort') or not blueprint_id or not upload_id:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Allow-Headers': 'Content-Type',
+                    'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+                },
+                'body': json.dumps({
+                    'error': 'Expected POST /upload/{blueprintId}/complete or /abort with an uploadId'
+                })
+            }
+
+        prefix = resolve_prefix(s3_client, BUCKET_NAME, blueprint_id)
+        metadata = read_metadata(prefix) if prefix else None
+        if not metadata or metadata.get('uploadId') != upload_id:
+            return {
+                'statusCode': 404,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Allow-Headers': 'Content-Type',
+                    'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+                },
+                'body': json.dumps({
+                    'error': 'No such upload for this blueprint',
+                    'blueprintId': blueprint_id
+                })
+            }
+
+        s3_key = metadata['s3Key']
+
+        if action == 'abort':
+            try:
+                abort_upload(s3_client, BUCKET_NAME, s3_key, upload_id)
+            except s3_client.exceptions.NoSuchUpload:
+                # Already aborted, or removed by the lifecycle rule
+                pass
+            mark_cancelled(prefix, blueprint_id, 'Upload was cancelled')
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Allow-Headers': 'Content-Type',
+                    'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+                },
+                'body': json.dumps({
+                    'blueprintId': blueprint_id,
+                    'message': 'Upload aborted'
+                })
+            }
+
+        try:
+            parts = parse_parts(body.get('parts'), metadata['partCount'])
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Allow-Headers': 'Content-Type',
+                    'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+                },
+                'body': json.dumps({
+                    'error': str(e)
+                })
+            }
+
+        try:
+            complete_upload(s3_client, BUCKET_NAME, s3_key, upload_id, parts)
+        except s3_client.exceptions.NoSuchUpload:
+            return {
+                'statusCode': 404,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Allow-Headers': 'Content-Type',
+                    'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+                },
+                'body': json.dumps({
+                    'error': 'Upload already completed, aborted or expired',
+                    'blueprintId': blueprint_id
+                })
+            }
+        except s3_client.exceptions.ClientError as e:
+            # InvalidPart (wrong ETag), EntityTooSmall: the client can
+            # re-upload the parts and complete again
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Allow-Headers': 'Content-Type',
+                    'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+                },
+                'body': json.dumps({
+                    'error': 'Parts could not be assembled',
+                    'details': str(e)
+                })
+            }
+
+        # Part URLs do not bound the bytes sent, so the assembled object is
+        # checked against the limit
+        size = s3_client.head_object(Bucket=BUCKET_NAME, Key=s3_key)['ContentLength']
+        if size > MAX_UPLOAD_BYTES:
+            s3_client.delete_object(Bucket=BUCKET_NAME, Key=s3_key)
+            mark_cancelled(prefix, blueprint_id, 'Uploaded file exceeds the size limit')
+            return {
+                'statusCode': 413,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Allow-Headers': 'Content-Type',
+                    'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+                },
+                'body': json.dumps({
+                    'error': f"File size exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)}MB limit."
+                })
+            }
+
+        # Multipart ETags are not content hashes; hash the object once here
+        # so /detect's results cache lookup does not download it again
+        metadata['contentHash'] = hash_object(s3_client, BUCKET_NAME, s3_key)
+        s3_client.put_object(
+            Bucket=BUCKET_NAME,
+            Key=f"{prefix}metadata.json",
+            Body=json.dumps(metadata),
+            ContentType='application/json'
+        )
+
+        print(f"Completed upload of {blueprint_id}: {len(parts)} parts, {size} bytes")
+
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+            },
+            'body': json.dumps({
+                'blueprintId': blueprint_id,
+                's3Key': s3_key,
+                'size': size,
+                'message': 'Upload completed'
+            })
+        }
+
+    except Exception as e:
+        print(f"Error finishing upload for {blueprint_id}: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+            },
+            'body': json.dumps({
+                'error': 'Internal server error',
+                'details': str(e)
+            })
+        }
@@ -0,0 +1,166 @@
+"""
+Push channel for blueprint processing progress.
+
+The frontend used to poll /status every 2s, each poll costing a Lambda
+invocation and two S3 GETs whether or not anything had changed. It now
+opens a WebSocket (API Gateway WebSocket API, websocket_handler) and
+subscribes to a blueprint; every status write by inference_handler or the
+worker is then pushed to the blueprint's subscribers.
+
+Subscriptions are small S3 objects, like the blueprint index:
+
+    subscriptions/{blueprintId}/{connectionId}   one per subscriber
+    connections/{connectionId}.json              blueprint of a connection,
+                                                 for cleanup on disconnect
+
+Polling stays available as the fallback when a connection cannot be
+opened or drops.
+
+Listing a blueprint's subscriptions costs an S3 LIST, and a blueprint's
+status is written many times while it is processed. The notifier keeps
+each blueprint's subscriber list for a few seconds; final statuses always
+list again, so a client that subscribed within that window still gets
+them.
+"""
+import json
+import threading
+import time
+
+SUBSCRIPTIONS_PREFIX = 'subscriptions/'
+CONNECTIONS_PREFIX = 'connections/'
+
+# Seconds a blueprint's subscriber list is reused between status writes
+SUBSCRIBERS_TTL = 5.0
+
+# Statuses after which a blueprint is not written again
+FINAL_STATUSES = ('completed', 'failed')
+
+
+def subscription_prefix(blueprint_id):
+    """S3 prefix holding a blueprint's subscriptions"""
+    return f"{SUBSCRIPTIONS_PREFIX}{blueprint_id}/"
+
+
+def connection_key(connection_id):
+    """S3 key recording which blueprint a connection subscribed to"""
+    return f"{CONNECTIONS_PREFIX}{connection_id}.json"
+
+
+class ProgressNotifier:
+    """
+    Subscriptions and delivery of status updates to WebSocket connections.
+
+    Args:
+        s3_client: boto3 S3 client
+        bucket: Bucket holding the subscriptions
+        gateway_client: boto3 'apigatewaymanagementapi' client for the
+            WebSocket stage (None disables pushing)
+        subscribers_ttl: Seconds a listed subscriber list is reused
+    """
+
+    def __init__(self, s3_client, bucket, gateway_client, subscribers_ttl=SUBSCRIBERS_TTL):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.gateway_client = gateway_client
+        self.subscribers_ttl = subscribers_ttl
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, connection_id, blueprint_id):
+        """Register a connection for a blueprint's updates"""
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=f"{subscription_prefix(blueprint_id)}{connection_id}",
+            Body=b'',
+            ContentType='application/octet-stream'
+        )
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=connection_key(connection_id),
+            Body=json.dumps({'blueprintId': blueprint_id}),
+            ContentType='application/json'
+        )
+        self._forget(blueprint_id)
+
+    def unsubscribe(self, connection_id, blueprint_id=None):
+        """
+        Remove a connection's subscription.
+
+        Args:
+            connection_id: WebSocket connection ID
+            blueprint_id: Subscribed blueprint, if known; otherwise it is
+                read from the connection record
+        """
+        if blueprint_id is None:
+            try:
+                response = self.s3_client.get_object(Bucket=self.bucket, Key=connection_key(connection_id))
+            except self.s3_client.exceptions.NoSuchKey:
+                return
+            blueprint_id = json.loads(response['Body'].read().decode('utf-8'))['blueprintId']
+
+        self.s3_client.delete_object(Bucket=self.bucket, Key=f"{subscription_prefix(blueprint_id)}{connection_id}")
+        self.s3_client.delete_object(Bucket=self.bucket, Key=connection_key(connection_id))
+        self._forget(blueprint_id)
+
+    def subscribers(self, blueprint_id, refresh=False):
+        """
+        Connection IDs subscribed to a blueprint.
+
+        Args:
+            refresh: List the subscriptions even if a recent list is cached
+        """
+        now = time.monotonic()
+        with self._lock:
+            cached = self._subscribers.get(blueprint_id)
+        if cached and not refresh and now < cached[0]:
+            return cached[1]
+
+        prefix = subscription_prefix(blueprint_id)
+        response = self.s3_client.list_objects_v2(Bucket=self.bucket, Prefix=prefix)
+        connection_ids = [obj['Key'][len(prefix):] for obj in response.get('Contents', [])]
+        with self._lock:
+            self._subscribers[blueprint_id] = (now + self.subscribers_ttl, connection_ids)
+        return connection_ids
+
+    def _forget(self, blueprint_id):
+        """Drop a blueprint's cached subscriber list"""
+        with self._lock:
+            self._subscribers.pop(blueprint_id, None)
+
+    def send(self, connection_id, status, blueprint_id=None):
+        """
+        Push a status document to one connection.
+
+        Returns:
+            bool: False if the connection is gone; its subscription is
+            removed
+        """
+        try:
+            self.gateway_client.post_to_connection(
+                ConnectionId=connection_id,
+                Data=json.dumps(status).encode('utf-8')
+            )
+            return True
+        except self.gateway_client.exceptions.GoneException:
+            print(f"Connection {connection_id} is gone, removing its subscription")
+            self.unsubscribe(connection_id, blueprint_id)
+            return False
+
+    def notify(self, blueprint_id, status):
+        """
+        Push a status document to every subscriber of a blueprint.
+
+        Returns:
+            int: Connections the update was delivered to
+        """
+        if self.gateway_client is None or not blueprint_id:
+            return 0
+        delivered = 0
+        refresh = status.get('status') in FINAL_STATUSES
+        for connection_id in self.subscribers(blueprint_id, refresh):
+            try:
+                delivered += self.send(connection_id, status, blueprint_id)
+            except Exception as e:
+                # Progress pushes are best effort; clients fall back to polling
+                print(f"Push to {connection_id} failed: {str(e)}")
+        return delivered
@@ -0,0 +1,76 @@
+"""
+In-process cache of parsed raw detection sets.
+
+A viewport or threshold query on a dense blueprint spends most of its time
+transferring and parsing detections.json, not filtering it. Exploring a
+blueprint sends many such queries for the same set, so warm Lambdas keep
+the parsed sets of recently queried blueprints, keyed by storage prefix,
+and revalidate them with a conditional GET on every use: an unchanged set
+costs a 304 instead of a transfer and a parse.
+"""
+import threading
+from collections import OrderedDict
+
+from functions.detections import fetch_raw_detections, has_current_index, index_detections
+from functions.http_cache import is_not_modified
+
+
+class RawSetCache:
+    """
+    Size-bounded LRU of raw detection sets, revalidated against S3.
+
+    Args:
+        max_entries: Sets kept; 0 disables the cache
+    """
+
+    def __init__(self, max_entries=4):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def fetch(self, s3_client, bucket, prefix, if_none_match=None):
+        """
+        Load a raw set like fetch_raw_detections, from the cache when S3
+        reports the cached copy current.
+
+        Sets stored before the spatial index existed, and PDF sets stored
+        with a single grid for all pages, get one built on load.
+
+        Args:
+            if_none_match: Source ETag the client holds. A 304 for it is
+                raised to the caller, as from fetch_raw_detections.
+
+        Returns:
+            tuple: (raw set, dict with the object's ETag and LastModified)
+        """
+        with self._lock:
+            entry = self._entries.get(prefix)
+        etag = if_none_match or (entry['response']['ETag'] if entry else None)
+
+        try:
+            raw, response = fetch_raw_detections(
+                s3_client, bucket, prefix, **({'IfNoneMatch': etag} if etag else {})
+            )
+        except s3_client.exceptions.ClientError as e:
+            if if_none_match or entry is None or not is_not_modified(e):
+                raise
+            with self._lock:
+                self.hits += 1
+                if prefix in self._entries:
+                    self._entries.move_to_end(prefix)
+            return entry['raw'], entry['response']
+
+        if not has_current_index(raw):
+            raw['spatialIndex'] = index_detections(raw['detections'], raw.get('dimensions'), raw.get('pages'))
+        response = {'ETag': response['ETag'], 'LastModified': response.get('LastModified')}
+
+        with self._lock:
+            self.misses += 1
+            if self.max_entries:
+                self._entries[prefix] = {'raw': raw, 'response': response}
+                self._entries.move_to_end(prefix)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return raw, response
@@ -0,0 +1,182 @@
+"""
+Inference results cache keyed by image content.
+
+Users re-upload the same drawing sets, and every upload gets a new blueprint
+ID. The SageMaker response depends only on the image bytes, the model and
+the confidence threshold, so it is cached under
+
+    cache/{modelVersion}/{contentHash}-{confidence}.json
+
+Entries expire after a TTL, enforced on read and by a bucket lifecycle rule
+on cache/. Recently used entries are also kept in a size-bounded in-process
+LRU, so a warm Lambda answers repeats without touching S3.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_PREFIX = 'cache/'
+
+# Bytes read per chunk when hashing an object that has no MD5 ETag
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_object(s3_client, bucket, key):
+    """
+    Stream an object through SHA-256.
+
+    Returns:
+        str: 'sha256:<hex>'
+    """
+    digest = hashlib.sha256()
+    body = s3_client.get_object(Bucket=bucket, Key=key)['Body']
+    for chunk in body.iter_chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    return f"sha256:{digest.hexdigest()}"
+
+
+def content_hash(s3_client, bucket, key):
+    """
+    Identify an object by its content.
+
+    Objects uploaded in one PUT (presigned uploads, up to 5GB) have the
+    MD5 of their bytes as ETag, so a HEAD is enough. Multipart ETags
+    ("<md5>-<parts>") depend on the part size; multipart_upload_handler
+    hashes those objects once on completion and stores the hash as
+    'contentHash' in the metadata.json next to them. Objects without it
+    are streamed through SHA-256 here.
+
+    Args:
+        s3_client: boto3 S3 client
+        bucket: Bucket name
+        key: Object key
+
+    Returns:
+        str: 'md5:<hex>' or 'sha256:<hex>'
+    """
+    etag = s3_client.head_object(Bucket=bucket, Key=key)['ETag'].strip('"')
+    if '-' not in etag:
+        return f"md5:{etag}"
+
+    metadata_key = f"{key.rsplit('/', 1)[0]}/metadata.json"
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=metadata_key)
+        stored = json.loads(response['Body'].read().decode('utf-8')).get('contentHash')
+    except s3_client.exceptions.NoSuchKey:
+        stored = None
+    return stored or hash_object(s3_client, bucket, key)
+
+
+def cache_key(image_hash, model_version, confidence):
+    """S3 key of the cached SageMaker response for an image"""
+    algorithm, digest = image_hash.split(':', 1)
+    return f"{CACHE_PREFIX}{model_version}/{algorithm}-{digest}-{float(confidence):.3f}.json"
+
+
+class ResultsCache:
+    """
+    Two-level cache of SageMaker responses: an in-process LRU in front of
+    S3 objects.
+
+    Args:
+        s3_client: boto3 S3 client
+        bucket: Bucket name
+        ttl_seconds: Age after which an entry is ignored
+        max_entries: Entries kept in the in-process LRU
+    """
+
+    NAMESPACE = 'MaxTrace/Backend'
+
+    def __init__(self, s3_client, bucket, ttl_seconds=7 * 24 * 3600, max_entries=256):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _fresh(self, entry):
+        return time.time() - entry['cachedAt'] < self.ttl_seconds
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, key):
+        """
+        Look up a cached SageMaker response.
+
+        Returns:
+            tuple: (response dict or None, 'memory' / 's3' / None)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._fresh(entry):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    self.memory_hits += 1
+                    return entry['result'], 'memory'
+                del self._entries[key]
+
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=key)
+            entry = json.loads(response['Body'].read().decode('utf-8'))
+        except self.s3_client.exceptions.NoSuchKey:
+            entry = None
+
+        if entry is None or not self._fresh(entry):
+            with self._lock:
+                self.misses += 1
+            return None, None
+
+        self._remember(key, entry)
+        with self._lock:
+            self.hits += 1
+        return entry['result'], 's3'
+
+    def put(self, key, result, image_hash=None):
+        """Store a SageMaker response"""
+        entry = {'cachedAt': time.time(), 'contentHash': image_hash, 'result': result}
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=key,
+            Body=json.dumps(entry),
+            ContentType='application/json'
+        )
+        self._remember(key, entry)
+
+    def emit_metrics(self, source):
+        """
+        Log one lookup as a CloudWatch Embedded Metric Format line.
+
+        Args:
+            source: 'memory' or 's3' for a hit, None for a miss
+        """
+        print(json.dumps({
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': self.NAMESPACE,
+                    'Dimensions': [[]],
+                    'Metrics': [
+                        {'Name': 'ResultsCacheHit', 'Unit': 'Count'},
+                        {'Name': 'ResultsCacheMiss', 'Unit': 'Count'},
+                        {'Name': 'ResultsCacheMemoryHit', 'Unit': 'Count'}
+                    ]
+                }]
+            },
+            'ResultsCacheHit': int(source is not None),
+            'ResultsCacheMiss': int(source is None),
+            'ResultsCacheMemoryHit': int(source == 'memory')
+        }))
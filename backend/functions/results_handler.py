@@ -1,15 +1,55 @@
 import json
-import boto3
 import os
-from botocore.exceptions import ClientError
 
-s3_client = boto3.client('s3')
+from functions.aws_clients import lazy_client
+from functions.blueprint_index import resolve_prefix
+from functions.detections import MAX_PAGE_SIZE, build_results, paginate, parse_viewport
+from functions.http_cache import (
+    derived_etag,
+    get_conditions,
+    is_not_modified,
+    not_modified_headers,
+    request_header,
+    source_etag,
+    validator_headers,
+)
+from functions.raw_set_cache import RawSetCache
+from functions.results_codec import (
+    COLUMNAR_MEDIA_TYPE,
+    accepts_columnar,
+    choose_encoding,
+    encode_body,
+    to_columnar,
+)
+
+s3_client = lazy_client('s3')
 BUCKET_NAME = os.environ.get('BUCKET_NAME', 'innergy-blueprints-dev')
 
+# Parsed raw sets kept by a warm container for repeated queries
+raw_sets = RawSetCache(int(os.environ.get('RAW_SET_CACHE_ENTRIES', '4')))
+
 def lambda_handler(event, context):
     """
     Lambda function to retrieve detection results.
     Returns the results.json file from S3.
+
+    With ?confidence=0.3 and/or ?classes=door,window the results are
+    recomputed from the stored raw detection set instead, so a threshold
+    change costs one S3 GET rather than a model invocation.
+    ?viewport=x,y,width,height keeps the detections overlapping a region of
+    the image, found through the raw set's spatial index, and
+    ?limit=500&cursor=... pages through the detections. ?page=3 keeps the
+    detections of one page of a PDF set; a viewport on a multi-page set
+    needs one.
+
+    Responses carry an ETag (for filtered results, one derived from the raw
+    set's ETag and the query); a request with a current If-None-Match is
+    answered 304 by a conditional S3 GET, without transferring or parsing
+    the stored document.
+
+    Clients accepting application/vnd.maxtrace.columnar+json get the
+    detections as compressed columns (see results_codec); plain JSON stays
+    the default.
     """
     try:
         # Get blueprint ID from path parameters
@@ -28,26 +68,72 @@ def lambda_handler(event, context):
                 })
             }
 
-        # Find the results file in S3
-        # The file structure is: uploads/{sessionId}/{blueprintId}/results.json
-        # We'll need to search for it since we don't have sessionId in the request
+        query = event.get('queryStringParameters') or {}
+        confidence = query.get('confidence')
+        classes = [c for c in query.get('classes', '').split(',') if c] or None
+
+        if confidence is not None:
+            try:
+                confidence = float(confidence)
+                if not 0 <= confidence <= 1:
+                    raise ValueError(confidence)
+            except ValueError:
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Access-Control-Allow-Origin': '*',
+                        'Access-Control-Allow-Headers': 'Content-Type',
+                        'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+                    },
+                    'body': json.dumps({
+                        'error': 'confidence must be a number between 0 and 1'
+                    })
+                }
 
         try:
-            # List objects with prefix matching the blueprint ID
-            response = s3_client.list_objects_v2(
-                Bucket=BUCKET_NAME,
-                Prefix=f'uploads/',
-                MaxKeys=100
-            )
+            viewport = query.get('viewport')
+            viewport = parse_viewport(viewport) if viewport is not None else None
+
+            limit = query.get('limit')
+            if limit is not None:
+                limit = int(limit) if limit.isdigit() else 0
+                if not 1 <= limit <= MAX_PAGE_SIZE:
+                    raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
 
-            # Find the results file for this blueprint
-            results_key = None
-            for obj in response.get('Contents', []):
-                if blueprint_id in obj['Key'] and obj['Key'].endswith('results.json'):
-                    results_key = obj['Key']
-                    break
+            cursor = query.get('cursor')
+            if cursor is not None and not cursor.isdigit():
+                raise ValueError('cursor must be a nextCursor value')
 
-            if not results_key:
+            page = query.get('page')
+            if page is not None:
+                page = int(page) if page.isdigit() else 0
+                if page < 1:
+                    raise ValueError('page must be a positive page number')
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Allow-Headers': 'Content-Type',
+                    'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+                },
+                'body': json.dumps({
+                    'error': str(e)
+                })
+            }
+
+        # Pages are cut from the raw set too, so paging through a blueprint
+        # reuses the cached parsed set instead of parsing results.json
+        paged = limit is not None or cursor is not None
+        filtered = confidence is not None or classes or viewport is not None or page is not None or paged
+
+        # Resolve the blueprint's storage prefix through the ID index
+        # The file structure is: uploads/{sessionId}/{blueprintId}/results.json
+
+        try:
+            prefix = resolve_prefix(s3_client, BUCKET_NAME, blueprint_id)
+
+            if not prefix:
                 return {
                     'statusCode': 404,
                     'headers': {
@@ -60,22 +146,84 @@ def lambda_handler(event, context):
                     })
                 }
 
-            # Retrieve the results file
-            response = s3_client.get_object(
-                Bucket=BUCKET_NAME,
-                Key=results_key
-            )
+            # The representation is part of the ETag, like the query
+            columnar = accepts_columnar(request_header(event, 'Accept'))
+            encoding = choose_encoding(request_header(event, 'Accept-Encoding')) if columnar else None
+            variant = (COLUMNAR_MEDIA_TYPE, encoding) if columnar else ()
+
+            if filtered:
+                query_parts = (confidence, sorted(classes or []), viewport, page, limit, cursor) + variant
+            else:
+                query_parts = variant or None
+
+            if query_parts:
+                # Only a derived ETag for this query says which stored object
+                # the client holds; other validators are not forwarded
+                etag = source_etag(event, *query_parts)
+                conditions = {'IfNoneMatch': etag} if etag else {}
+            else:
+                conditions = get_conditions(event)
 
-            results = json.loads(response['Body'].read().decode('utf-8'))
+            if filtered:
+                # Filter the raw detection set server-side
+                raw, response = raw_sets.fetch(s3_client, BUCKET_NAME, prefix, etag)
+                if confidence is None:
+                    confidence = raw.get('confidence', raw['rawConfidence'])
+                try:
+                    results = build_results(raw, confidence, classes, viewport, page)
+                except ValueError as e:
+                    return {
+                        'statusCode': 400,
+                        'headers': {
+                            'Access-Control-Allow-Origin': '*',
+                            'Access-Control-Allow-Headers': 'Content-Type',
+                            'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+                        },
+                        'body': json.dumps({
+                            'error': str(e)
+                        })
+                    }
+            else:
+                results_key = f"{prefix}results.json"
+
+                # Retrieve the results file, unless the client's copy is current
+                response = s3_client.get_object(
+                    Bucket=BUCKET_NAME,
+                    Key=results_key,
+                    **conditions
+                )
+
+                # Passed through as stored unless another representation is
+                # needed; no decode/re-encode round trip
+                body = response['Body'].read().decode('utf-8')
+                results = json.loads(body) if columnar else None
+
+            if paged:
+                results = paginate(results, limit, cursor)
+            if results is not None and not columnar:
+                body = json.dumps(results)
+
+            headers = validator_headers(
+                response, derived_etag(response['ETag'], *query_parts) if query_parts else None
+            )
+            is_base64 = False
+            if columnar:
+                body, content_encoding, is_base64 = encode_body(to_columnar(results), encoding)
+                headers['Content-Type'] = COLUMNAR_MEDIA_TYPE
+                if content_encoding:
+                    headers['Content-Encoding'] = content_encoding
 
             return {
                 'statusCode': 200,
                 'headers': {
                     'Access-Control-Allow-Origin': '*',
                     'Access-Control-Allow-Headers': 'Content-Type',
-                    'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+                    'Access-Control-Allow-Methods': 'OPTIONS,POST,GET',
+                    'Vary': 'Accept, Accept-Encoding',
+                    **headers
                 },
-                'body': json.dumps(results)
+                'body': body,
+                'isBase64Encoded': is_base64
             }
 
         except s3_client.exceptions.NoSuchKey:
@@ -90,6 +238,21 @@ def lambda_handler(event, context):
                     'error': 'Results not found for this blueprint ID'
                 })
             }
+        except s3_client.exceptions.ClientError as e:
+            if not is_not_modified(e):
+                raise
+            etag = derived_etag(etag, *query_parts) if query_parts else None
+            return {
+                'statusCode': 304,
+                'headers': {
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Allow-Headers': 'Content-Type',
+                    'Access-Control-Allow-Methods': 'OPTIONS,POST,GET',
+                    'Vary': 'Accept, Accept-Encoding',
+                    **not_modified_headers(e, event, etag)
+                },
+                'body': ''
+            }
 
     except Exception as e:
         print(f"Error: {str(e)}")
@@ -1,15 +1,31 @@
 import json
-import boto3
 import os
-from botocore.exceptions import ClientError
 
-s3_client = boto3.client('s3')
+from functions.aws_clients import lazy_client
+from functions.blueprint_index import resolve_prefix
+from functions.http_cache import get_conditions, is_not_modified, not_modified_headers, validator_headers
+
+s3_client = lazy_client('s3')
 BUCKET_NAME = os.environ.get('BUCKET_NAME', 'innergy-blueprints-dev')
 
+def object_exists(key):
+    """Check for an object with a HEAD request"""
+    try:
+        s3_client.head_object(Bucket=BUCKET_NAME, Key=key)
+        return True
+    except s3_client.exceptions.ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+            return False
+        raise
+
 def lambda_handler(event, context):
     """
     Lambda function to check processing status of a blueprint.
     Returns current status, progress stage, and estimated time remaining.
+
+    The status.json body is passed through as stored, with its ETag and
+    Last-Modified; a poll carrying If-None-Match / If-Modified-Since is
+    answered 304 by a conditional S3 GET when the status is unchanged.
     """
     try:
         # Get blueprint ID from path parameters
@@ -28,33 +44,37 @@ def lambda_handler(event, context):
                 })
             }
 
-        # Find the status file in S3
+        # Resolve the blueprint's storage prefix through the ID index
         # The file structure is: uploads/{sessionId}/{blueprintId}/status.json
 
         try:
-            # List objects with prefix matching the blueprint ID
-            response = s3_client.list_objects_v2(
-                Bucket=BUCKET_NAME,
-                Prefix=f'uploads/',
-                MaxKeys=100
-            )
+            prefix = resolve_prefix(s3_client, BUCKET_NAME, blueprint_id)
 
-            # Find the status file for this blueprint
-            status_key = None
-            for obj in response.get('Contents', []):
-                if blueprint_id in obj['Key'] and obj['Key'].endswith('status.json'):
-                    status_key = obj['Key']
-                    break
+            if not prefix:
+                return {
+                    'statusCode': 404,
+                    'headers': {
+                        'Access-Control-Allow-Origin': '*',
+                        'Access-Control-Allow-Headers': 'Content-Type',
+                        'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+                    },
+                    'body': json.dumps({
+                        'error': 'Blueprint not found or processing not started'
+                    })
+                }
 
-            if not status_key:
-                # Status file not found - check if results exist
-                results_key = None
-                for obj in response.get('Contents', []):
-                    if blueprint_id in obj['Key'] and obj['Key'].endswith('results.json'):
-                        results_key = obj['Key']
-                        break
+            status_key = f"{prefix}status.json"
 
-                if results_key:
+            try:
+                # Retrieve the status file, unless the client's copy is current
+                response = s3_client.get_object(
+                    Bucket=BUCKET_NAME,
+                    Key=status_key,
+                    **get_conditions(event)
+                )
+            except s3_client.exceptions.NoSuchKey:
+                # Status file not found - check if results exist
+                if object_exists(f"{prefix}results.json"):
                     # Results exist, processing is complete
                     return {
                         'statusCode': 200,
@@ -72,36 +92,31 @@ def lambda_handler(event, context):
                             'message': 'Processing completed successfully'
                         })
                     }
-                else:
-                    # Neither status nor results found
-                    return {
-                        'statusCode': 404,
-                        'headers': {
-                            'Access-Control-Allow-Origin': '*',
-                            'Access-Control-Allow-Headers': 'Content-Type',
-                            'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
-                        },
-                        'body': json.dumps({
-                            'error': 'Blueprint not found or processing not started'
-                        })
-                    }
-
-            # Retrieve the status file
-            response = s3_client.get_object(
-                Bucket=BUCKET_NAME,
-                Key=status_key
-            )
-
-            status = json.loads(response['Body'].read().decode('utf-8'))
+                raise
+            except s3_client.exceptions.ClientError as e:
+                if not is_not_modified(e):
+                    raise
+                return {
+                    'statusCode': 304,
+                    'headers': {
+                        'Access-Control-Allow-Origin': '*',
+                        'Access-Control-Allow-Headers': 'Content-Type',
+                        'Access-Control-Allow-Methods': 'OPTIONS,POST,GET',
+                        **not_modified_headers(e, event)
+                    },
+                    'body': ''
+                }
 
             return {
                 'statusCode': 200,
                 'headers': {
                     'Access-Control-Allow-Origin': '*',
                     'Access-Control-Allow-Headers': 'Content-Type',
-                    'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
+                    'Access-Control-Allow-Methods': 'OPTIONS,POST,GET',
+                    **validator_headers(response)
                 },
-                'body': json.dumps(status)
+                # status.json is written by StatusStore as JSON; no re-encode
+                'body': response['Body'].read().decode('utf-8')
             }
 
         except s3_client.exceptions.NoSuchKey:
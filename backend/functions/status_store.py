@@ -0,0 +1,376 @@
+"""
+Blueprint status store.
+
+status.json is what the frontend polls while a blueprint is processed.
+Writing it used to be one full put_object per stage on the request's
+critical path. StatusStore keeps the document in memory, applies partial
+updates to it and writes it through a pluggable backend:
+
+- Progress updates are written behind a background thread after a short
+  coalescing window; stages that follow each other within the window cost
+  one request, and a progress update overtaken by a terminal one is never
+  written.
+- Terminal updates (completed, failed) are written synchronously and make
+  any pending progress write redundant.
+- Every write is conditional on the version that was read. On a conflict
+  the fields this store changed are merged into the newly read document,
+  so fields written by others (e.g. batchJobId) survive, and a status
+  that is already completed or failed is never replaced by a progress
+  update, so a duplicate worker cannot regress a finished blueprint.
+- An optional on_write callback sees every stored document, e.g. to push
+  it to subscribed clients (see progress_push.py).
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+
+TERMINAL_STATUSES = ('completed', 'failed')
+
+# Status, progress and estimated seconds remaining reported for each stage
+STAGES = {
+    'upload': ('processing', 10, 20),
+    'preprocessing': ('processing', 25, 15),
+    'inference': ('processing', 50, 10),
+    'postprocess': ('processing', 75, 5),
+    'complete': ('completed', 100, 0),
+    'failed': ('failed', 0, 0),
+}
+
+# Version of a document that was not read first; its write is unconditional
+ANY_VERSION = '*'
+
+# Seconds a progress update waits to be merged with later ones
+COALESCE_WINDOW = 0.25
+
+# Attempts at a conditional write before giving up on a contended key
+MAX_CONFLICT_RETRIES = 5
+
+
+class VersionConflict(Exception):
+    """The stored status changed since it was read"""
+
+
+class S3StatusBackend:
+    """Status documents as S3 objects, versioned by ETag"""
+
+    def __init__(self, s3_client, bucket):
+        self.s3_client = s3_client
+        self.bucket = bucket
+
+    def read(self, key):
+        """
+        Returns:
+            tuple: (status dict, ETag), or (None, None) if there is no status
+        """
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=key)
+        except self.s3_client.exceptions.NoSuchKey:
+            return None, None
+        return json.loads(response['Body'].read().decode('utf-8')), response['ETag']
+
+    def write(self, key, status, version):
+        """
+        Store a status if the stored version is still `version`.
+
+        Args:
+            key: S3 key of status.json
+            status: Status document
+            version: ETag the update was based on (None: key must not
+                exist, ANY_VERSION: unconditional)
+
+        Returns:
+            str: New ETag
+
+        Raises:
+            VersionConflict: If the object changed in the meantime
+        """
+        if version == ANY_VERSION:
+            condition = {}
+        elif version:
+            condition = {'IfMatch': version}
+        else:
+            condition = {'IfNoneMatch': '*'}
+        try:
+            response = self.s3_client.put_object(
+                Bucket=self.bucket,
+                Key=key,
+                Body=json.dumps(status),
+                ContentType='application/json',
+                **condition
+            )
+        except self.s3_client.exceptions.ClientError as e:
+            # NoSuchKey: the object was deleted since it was read
+            if e.response['Error']['Code'] in ('PreconditionFailed', 'ConditionalRequestConflict', '412', 'NoSuchKey'):
+                raise VersionConflict(key) from e
+            raise
+        return response['ETag']
+
+
+class MemoryStatusBackend:
+    """In-process status documents, for tests and local runs"""
+
+    def __init__(self):
+        self.documents = {}
+        self.request_counts = {'read': 0, 'write': 0}
+        self._lock = threading.Lock()
+
+    def read(self, key):
+        with self._lock:
+            self.request_counts['read'] += 1
+            body, version = self.documents.get(key, (None, None))
+        return (json.loads(body), version) if body else (None, None)
+
+    def write(self, key, status, version):
+        body = json.dumps(status)
+        with self._lock:
+            self.request_counts['write'] += 1
+            if version != ANY_VERSION and self.documents.get(key, (None, None))[1] != version:
+                raise VersionConflict(key)
+            new_version = hashlib.md5(body.encode('utf-8')).hexdigest() + f"-{self.request_counts['write']}"
+            self.documents[key] = (body, new_version)
+        return new_version
+
+
+class LocalFileStatusBackend(MemoryStatusBackend):
+    """
+    Status documents as JSON files under a directory, so separate local
+    processes (API handler, worker) can share them.
+    """
+
+    def __init__(self, root):
+        super().__init__()
+        self.root = root
+
+    def _path(self, key):
+        return os.path.join(self.root, key)
+
+    def read(self, key):
+        path = self._path(key)
+        with self._lock:
+            self.request_counts['read'] += 1
+            if not os.path.exists(path):
+                return None, None
+            with open(path, 'rb') as f:
+                body = f.read()
+        return json.loads(body), hashlib.md5(body).hexdigest()
+
+    def write(self, key, status, version):
+        path = self._path(key)
+        body = json.dumps(status).encode('utf-8')
+        with self._lock:
+            self.request_counts['write'] += 1
+            current = None
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    current = hashlib.md5(f.read()).hexdigest()
+            if version != ANY_VERSION and current != version:
+                raise VersionConflict(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+        return hashlib.md5(body).hexdigest()
+
+
+class StatusStore:
+    """
+    Write-behind, version-checked status documents.
+
+    Args:
+        backend: S3StatusBackend, MemoryStatusBackend or LocalFileStatusBackend
+        write_behind: Write progress updates from a background thread.
+            Call flush() or release() before the Lambda handler returns.
+        coalesce_window: Seconds a progress update waits for later updates
+            to the same key before it is written. The frontend polls every
+            2s, so a short delay is invisible but merges stages that follow
+            each other closely.
+        on_write: Called as on_write(key, status) after each stored write.
+            Errors are logged and do not fail the write.
+    """
+
+    def __init__(self, backend, write_behind=True, coalesce_window=COALESCE_WINDOW, on_write=None):
+        self.backend = backend
+        self.write_behind = write_behind
+        self.coalesce_window = coalesce_window
+        self.on_write = on_write
+        self._documents = {}
+        self._versions = {}
+        self._written = {}
+        self._changes = {}
+        self._dirty = {}
+        self._lock = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._writer = None
+        self._in_flight = 0
+
+    def get(self, key):
+        """Current status for a key, read from the backend once per store"""
+        with self._lock:
+            if key in self._documents:
+                return dict(self._documents[key])
+        status, version = self.backend.read(key)
+        with self._lock:
+            if key not in self._documents:
+                self._documents[key] = status or {}
+                self._versions[key] = version
+            return dict(self._documents[key])
+
+    def update(self, key, restart=False, **fields):
+        """
+        Merge fields into a status document.
+
+        Args:
+            key: S3 key of status.json
+            restart: Allow replacing a completed or failed status (a new
+                /detect request for the blueprint)
+            **fields: Status fields to change
+
+        Returns:
+            bool: False if the update was dropped because the status is final
+        """
+        terminal = fields.get('status') in TERMINAL_STATUSES
+        with self._lock:
+            if restart and key not in self._documents:
+                # A restart replaces whatever is stored, so skip the read
+                self._documents[key] = {}
+                self._versions[key] = ANY_VERSION
+        self.get(key)
+        with self._lock:
+            current = self._documents[key]
+            if current.get('status') in TERMINAL_STATUSES and not restart:
+                return False
+            changes = dict(fields, updatedAt=datetime.utcnow().isoformat() + 'Z')
+            current.update(changes)
+            self._changes.setdefault(key, {}).update(changes)
+
+            if self.write_behind and not terminal:
+                first_update, restarted = self._dirty.get(key, (time.monotonic(), False))
+                self._dirty[key] = (first_update, restarted or restart)
+                self._start_writer()
+                self._lock.notify_all()
+                return True
+            restart = self._dirty.pop(key, (0, False))[1] or restart
+
+        return self._write(key, restart)
+
+    def set_stage(self, key, stage, message, restart=False, **fields):
+        """Move a blueprint to a stage, with that stage's progress defaults"""
+        status, progress, estimated_time_remaining = STAGES[stage]
+        return self.update(
+            key,
+            restart=restart,
+            status=status,
+            stage=stage,
+            progress=progress,
+            estimatedTimeRemaining=estimated_time_remaining,
+            message=message,
+            **fields
+        )
+
+    def flush(self):
+        """Write every pending progress update now"""
+        with self._lock:
+            pending = list(self._dirty.items())
+            self._dirty.clear()
+        for key, (_, restart) in pending:
+            self._write(key, restart)
+        with self._lock:
+            while self._in_flight:
+                self._lock.wait()
+
+    def release(self, key):
+        """
+        Flush and forget a key. Call when a handler is done with a blueprint,
+        so a warm Lambda container does not keep serving a stale copy.
+        """
+        self.flush()
+        with self._lock:
+            self._documents.pop(key, None)
+            self._versions.pop(key, None)
+            self._written.pop(key, None)
+            self._changes.pop(key, None)
+
+    def _start_writer(self):
+        if self._writer is None or not self._writer.is_alive():
+            self._writer = threading.Thread(target=self._write_loop, daemon=True)
+            self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            with self._lock:
+                while True:
+                    if not self._dirty:
+                        self._lock.wait()
+                        continue
+                    key, (first_update, restart) = min(self._dirty.items(), key=lambda item: item[1][0])
+                    remaining = first_update + self.coalesce_window - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._lock.wait(remaining)
+                del self._dirty[key]
+                self._in_flight += 1
+            try:
+                self._write(key, restart)
+            except Exception as e:
+                print(f"Status write for {key} failed: {str(e)}")
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+                    self._lock.notify_all()
+
+    def _write(self, key, restart):
+        """
+        Write the in-memory document for a key. On a version conflict the
+        stored document is re-read and the fields changed since the last
+        write are applied to it, leaving other writers' fields in place.
+        """
+        with self._write_lock:
+            for _ in range(MAX_CONFLICT_RETRIES):
+                with self._lock:
+                    status = dict(self._documents[key])
+                    version = self._versions[key]
+                    changes = dict(self._changes.get(key, {}))
+                    if status == self._written.get(key):
+                        # The background writer already stored this state
+                        return True
+                try:
+                    new_version = self.backend.write(key, status, version)
+                except VersionConflict:
+                    stored, stored_version = self.backend.read(key)
+                    with self._lock:
+                        self._versions[key] = stored_version
+                        if stored and stored.get('status') in TERMINAL_STATUSES and not restart:
+                            # Another worker finished first; keep its status
+                            self._documents[key] = stored
+                            self._changes.pop(key, None)
+                            return False
+                        # Re-apply everything changed since the last write,
+                        # including updates made while this one was tried
+                        self._documents[key] = {**(stored or {}), **self._changes.get(key, {})}
+                    continue
+                with self._lock:
+                    self._versions[key] = new_version
+                    self._written[key] = status
+                    pending = self._changes.get(key, {})
+                    for field, value in changes.items():
+                        if pending.get(field, object()) == value:
+                            del pending[field]
+                break
+            else:
+                raise VersionConflict(key)
+
+        # Outside the write lock, so a slow listener does not hold up writes.
+        # A newer write that landed meanwhile reports its own state instead
+        with self._lock:
+            superseded = self._written.get(key) is not status
+        if self.on_write and not superseded:
+            try:
+                self.on_write(key, status)
+            except Exception as e:
+                print(f"Status listener for {key} failed: {str(e)}")
+        return True
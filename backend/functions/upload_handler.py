@@ -1,17 +1,146 @@
 import json
-import boto3
 import uuid
 import os
 from datetime import datetime
-from botocore.exceptions import ClientError
 
-s3_client = boto3.client('s3')
+from functions.aws_clients import lazy_client
+from functions.blueprint_index import write_index
+from functions.multipart_upload import MAX_UPLOAD_BYTES, start_upload
+
+s3_client = lazy_client('s3')
 BUCKET_NAME = os.environ.get('BUCKET_NAME', 'innergy-blueprints-dev')
 
+# Files above this size are uploaded in parts of UPLOAD_PART_SIZE bytes (see
+# multipart_upload.py); smaller ones with a single presigned PUT
+MULTIPART_THRESHOLD = int(os.environ.get('UPLOAD_MULTIPART_THRESHOLD', str(10 * 1024 * 1024)))
+PART_SIZE = int(os.environ.get('UPLOAD_PART_SIZE', str(8 * 1024 * 1024)))
+
+# Lifetime of the upload URLs. Parts of a large file on a slow link are
+# uploaded over a longer period than a single PUT
+UPLOAD_URL_EXPIRES = int(os.environ.get('UPLOAD_URL_EXPIRES', '300'))
+PART_URL_EXPIRES = int(os.environ.get('UPLOAD_PART_URL_EXPIRES', '3600'))
+
+# Sign upload URLs for the S3 Transfer Acceleration endpoint; the bucket must
+# have acceleration enabled
+ACCELERATE = os.environ.get('UPLOAD_ACCELERATE', 'false').lower() == 'true'
+presign_client = lazy_client('s3-accelerate') if ACCELERATE else s3_client
+
+ALLOWED_TYPES = ['image/png', 'image/jpeg', 'image/jpg', 'application/pdf']
+
+def validate_file(file_type, file_size):
+    """Reason a file cannot be uploaded, or None"""
+    if file_type not in ALLOWED_TYPES:
+        return 'Invalid file type. Only PNG, JPG, and PDF are allowed.'
+    if not isinstance(file_size, int) or file_size <= 0:
+        return 'fileSize must be a positive number of bytes.'
+    if file_size > MAX_UPLOAD_BYTES:
+        return f"File size exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)}MB limit."
+    return None
+
+def create_upload(session_id, file_name, file_type, file_size, batch_id=None):
+    """
+    Prepare the upload of one validated file: sign its upload URL(s) and
+    store its metadata, initial status and index pointer.
+
+    Args:
+        session_id: Session the blueprint belongs to
+        file_name: Original file name
+        file_type: MIME type (see ALLOWED_TYPES)
+        file_size: File size in bytes
+        batch_id: Batch the file was uploaded in (batch_upload_handler)
+
+    Returns:
+        dict: blueprintId, uploadUrl, multipart and s3Key for the client
+    """
+    # Generate unique blueprint ID
+    blueprint_id = f"blueprint-{uuid.uuid4().hex[:12]}"
+
+    # Create S3 object key
+    file_extension = file_name.split('.')[-1]
+    s3_key = f"uploads/{session_id}/{blueprint_id}/original.{file_extension}"
+
+    if file_size > MULTIPART_THRESHOLD:
+        # Presigned URL per part, uploaded in parallel by the client
+        presigned_url = None
+        multipart = start_upload(
+            s3_client, BUCKET_NAME, s3_key, file_type, file_size,
+            PART_SIZE, PART_URL_EXPIRES, presign_client
+        )
+    else:
+        # Generate presigned URL for a single PUT upload
+        multipart = None
+        presigned_url = presign_client.generate_presigned_url(
+            'put_object',
+            Params={
+                'Bucket': BUCKET_NAME,
+                'Key': s3_key,
+                'ContentType': file_type
+            },
+            ExpiresIn=UPLOAD_URL_EXPIRES
+        )
+
+    # Create metadata object
+    metadata = {
+        'blueprintId': blueprint_id,
+        'sessionId': session_id,
+        'fileName': file_name,
+        'uploadedAt': datetime.utcnow().isoformat() + 'Z',
+        'fileSize': file_size,
+        'format': file_extension,
+        's3Key': s3_key
+    }
+    if batch_id:
+        metadata['batchId'] = batch_id
+    if multipart:
+        # Checked by multipart_upload_handler before completing or
+        # aborting the upload
+        metadata['uploadId'] = multipart['uploadId']
+        metadata['partCount'] = len(multipart['parts'])
+
+    # Store metadata in S3
+    metadata_key = f"uploads/{session_id}/{blueprint_id}/metadata.json"
+    s3_client.put_object(
+        Bucket=BUCKET_NAME,
+        Key=metadata_key,
+        Body=json.dumps(metadata),
+        ContentType='application/json'
+    )
+
+    # Create initial status
+    status_key = f"uploads/{session_id}/{blueprint_id}/status.json"
+    s3_client.put_object(
+        Bucket=BUCKET_NAME,
+        Key=status_key,
+        Body=json.dumps({
+            'blueprintId': blueprint_id,
+            'status': 'processing',
+            'stage': 'upload',
+            'progress': 10,
+            'estimatedTimeRemaining': 20,
+            'message': 'Blueprint uploaded, preparing for processing...',
+            'updatedAt': datetime.utcnow().isoformat() + 'Z'
+        }),
+        ContentType='application/json'
+    )
+
+    # Index the blueprint so status/results lookups resolve in one GET
+    write_index(s3_client, BUCKET_NAME, blueprint_id, session_id)
+
+    return {
+        'blueprintId': blueprint_id,
+        'uploadUrl': presigned_url,
+        'multipart': multipart,
+        's3Key': s3_key
+    }
+
 def lambda_handler(event, context):
     """
     Lambda function to handle blueprint uploads.
-    Generates a presigned URL for direct S3 upload from the frontend.
+    Generates a presigned URL for direct S3 upload from the frontend, or
+    for files over UPLOAD_MULTIPART_THRESHOLD a multipart upload with one
+    presigned URL per part ('multipart' in the response; see
+    multipart_upload.py). Drawing sets of many files go through
+    batch_upload_handler instead.
     """
     try:
         # Parse request body
@@ -36,9 +165,9 @@ def lambda_handler(event, context):
                 })
             }
 
-        # Validate file type
-        allowed_types = ['image/png', 'image/jpeg', 'image/jpg', 'application/pdf']
-        if file_type not in allowed_types:
+        # Validate file type and size
+        error = validate_file(file_type, file_size)
+        if error:
             return {
                 'statusCode': 400,
                 'headers': {
@@ -47,79 +176,11 @@ def lambda_handler(event, context):
                     'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
                 },
                 'body': json.dumps({
-                    'error': 'Invalid file type. Only PNG, JPG, and PDF are allowed.'
+                    'error': error
                 })
             }
 
-        # Validate file size (10MB max)
-        max_size = 10 * 1024 * 1024
-        if file_size > max_size:
-            return {
-                'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Headers': 'Content-Type',
-                    'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
-                },
-                'body': json.dumps({
-                    'error': 'File size exceeds 10MB limit.'
-                })
-            }
-
-        # Generate unique blueprint ID
-        blueprint_id = f"blueprint-{uuid.uuid4().hex[:12]}"
-
-        # Create S3 object key
-        file_extension = file_name.split('.')[-1]
-        s3_key = f"uploads/{session_id}/{blueprint_id}/original.{file_extension}"
-
-        # Generate presigned URL for PUT upload (valid for 5 minutes)
-        presigned_url = s3_client.generate_presigned_url(
-            'put_object',
-            Params={
-                'Bucket': BUCKET_NAME,
-                'Key': s3_key,
-                'ContentType': file_type
-            },
-            ExpiresIn=300  # 5 minutes
-        )
-
-        # Create metadata object
-        metadata = {
-            'blueprintId': blueprint_id,
-            'sessionId': session_id,
-            'fileName': file_name,
-            'uploadedAt': datetime.utcnow().isoformat() + 'Z',
-            'fileSize': file_size,
-            'format': file_extension,
-            's3Key': s3_key
-        }
-
-        # Store metadata in S3
-        metadata_key = f"uploads/{session_id}/{blueprint_id}/metadata.json"
-        s3_client.put_object(
-            Bucket=BUCKET_NAME,
-            Key=metadata_key,
-            Body=json.dumps(metadata),
-            ContentType='application/json'
-        )
-
-        # Create initial status
-        status_key = f"uploads/{session_id}/{blueprint_id}/status.json"
-        s3_client.put_object(
-            Bucket=BUCKET_NAME,
-            Key=status_key,
-            Body=json.dumps({
-                'blueprintId': blueprint_id,
-                'status': 'processing',
-                'stage': 'upload',
-                'progress': 10,
-                'estimatedTimeRemaining': 20,
-                'message': 'Blueprint uploaded, preparing for processing...',
-                'updatedAt': datetime.utcnow().isoformat() + 'Z'
-            }),
-            ContentType='application/json'
-        )
+        upload = create_upload(session_id, file_name, file_type, file_size)
 
         return {
             'statusCode': 200,
@@ -129,14 +190,12 @@ def lambda_handler(event, context):
                 'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
             },
             'body': json.dumps({
-                'blueprintId': blueprint_id,
-                'uploadUrl': presigned_url,
-                's3Key': s3_key,
+                **upload,
                 'message': 'Presigned URL generated successfully'
             })
         }
 
-    except ClientError as e:
+    except s3_client.exceptions.ClientError as e:
         print(f"S3 Error: {str(e)}")
         return {
             'statusCode': 500,
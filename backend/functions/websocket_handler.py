@@ -0,0 +1,81 @@
+import json
+import os
+
+from functions.aws_clients import lazy_client
+from functions.blueprint_index import resolve_prefix
+from functions.progress_push import ProgressNotifier
+
+s3_client = lazy_client('s3')
+BUCKET_NAME = os.environ.get('BUCKET_NAME', 'innergy-blueprints-dev')
+
+# https://{apiId}.execute-api.{region}.amazonaws.com/{stage}; derived from
+# the request when unset
+WEBSOCKET_ENDPOINT = os.environ.get('WEBSOCKET_ENDPOINT', '')
+
+def get_notifier(event):
+    """Notifier posting back through the WebSocket stage the event came from"""
+    endpoint = WEBSOCKET_ENDPOINT
+    if not endpoint:
+        request_context = event['requestContext']
+        endpoint = f"https://{request_context['domainName']}/{request_context['stage']}"
+    return ProgressNotifier(s3_client, BUCKET_NAME, lazy_client('apigatewaymanagementapi', endpoint))
+
+def read_status(prefix):
+    """
+    Current status document of a blueprint.
+
+    Returns:
+        dict: Status, or None if processing has not started
+    """
+    try:
+        response = s3_client.get_object(Bucket=BUCKET_NAME, Key=f"{prefix}status.json")
+    except s3_client.exceptions.NoSuchKey:
+        return None
+    return json.loads(response['Body'].read().decode('utf-8'))
+
+def lambda_handler(event, context):
+    """
+    WebSocket routes for progress push.
+
+    - $connect: accept the connection
+    - subscribe ({"action": "subscribe", "blueprintId": "..."}): register
+      for a blueprint's status updates and receive its current status
+    - $disconnect: remove the connection's subscription
+    """
+    request_context = event.get('requestContext', {})
+    route = request_context.get('routeKey')
+    connection_id = request_context.get('connectionId')
+
+    try:
+        if route == '$connect':
+            return {'statusCode': 200}
+
+        notifier = get_notifier(event)
+
+        if route == '$disconnect':
+            notifier.unsubscribe(connection_id)
+            return {'statusCode': 200}
+
+        if route == 'subscribe':
+            blueprint_id = json.loads(event.get('body') or '{}').get('blueprintId')
+            prefix = resolve_prefix(s3_client, BUCKET_NAME, blueprint_id)
+            if not prefix:
+                notifier.send(connection_id, {
+                    'blueprintId': blueprint_id,
+                    'error': 'Blueprint not found or processing not started'
+                })
+                return {'statusCode': 404}
+
+            # Subscribe before reading, so a stage written in between is
+            # pushed rather than missed; the client may see it twice
+            notifier.subscribe(connection_id, blueprint_id)
+            status = read_status(prefix)
+            if status:
+                notifier.send(connection_id, status, blueprint_id)
+            return {'statusCode': 200}
+
+        return {'statusCode': 400}
+
+    except Exception as e:
+        print(f"Error handling {route} for {connection_id}: {str(e)}")
+        return {'statusCode': 500}
@@ -0,0 +1,702 @@
+"""
+Local AWS stand-ins for benchmarks and offline testing of the Lambda handlers.
+Implements the subset of the boto3 client API the handlers use, in memory.
+LocalS3Server exposes the in-memory bucket over HTTP for real boto3 clients.
+"""
+import bisect
+import hashlib
+import json
+import queue
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlencode, urlsplit
+
+from botocore.exceptions import ClientError
+
+
+class LocalStreamingBody:
+    """
+    Minimal botocore StreamingBody replacement backed by bytes.
+
+    Every read returns a new bytes object, as reading from a socket does,
+    so memory measurements see the same copies as with real S3.
+    """
+
+    def __init__(self, data):
+        self._data = memoryview(data)
+        self._position = 0
+        self._length = len(data)
+
+    def read(self, amt=None):
+        end = self._length if amt is None else min(self._length, self._position + amt)
+        chunk = bytes(self._data[self._position:end])
+        self._position = max(self._position, end)
+        return chunk
+
+    def iter_chunks(self, chunk_size=1024):
+        while True:
+            chunk = self.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self):
+        self._data.release()
+
+
+def _client_error(code, message, operation):
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
+
+
+class NoSuchKey(ClientError):
+    pass
+
+
+class NoSuchUpload(ClientError):
+    pass
+
+
+# S3's smallest part, except for the last part of an upload
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+def not_modified(obj, if_none_match=None, if_modified_since=None):
+    """Whether a conditional read of an object is answered 304"""
+    if if_none_match is not None:
+        return obj['ETag'] in [tag.strip() for tag in if_none_match.split(',')]
+    if if_modified_since is not None:
+        if isinstance(if_modified_since, str):
+            if_modified_since = parsedate_to_datetime(if_modified_since)
+        return obj['LastModified'].replace(microsecond=0) <= if_modified_since
+    return False
+
+
+class LocalS3Client:
+    """
+    In-memory S3 client.
+
+    Every call is counted in `request_counts` by operation name, and an
+    optional fixed latency per request models the S3 round trip. PutObject
+    honours IfMatch / IfNoneMatch like S3 conditional writes, GetObject
+    IfNoneMatch / IfModifiedSince like conditional reads; `bytes_sent`
+    counts the object bytes GetObject returned.
+
+    Multipart uploads keep their parts in `uploads` until completed or
+    aborted, and enforce S3's part rules (ETags, ascending part numbers,
+    MIN_PART_SIZE). Presigned URLs point at `endpoint_url` when a
+    LocalS3Server serves this client.
+    """
+
+    class exceptions:
+        NoSuchKey = NoSuchKey
+        NoSuchUpload = NoSuchUpload
+        ClientError = ClientError
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.objects = {}
+        self.uploads = {}
+        self.request_counts = Counter()
+        self.bytes_sent = 0
+        self.endpoint_url = None
+        self._sorted_keys = {}
+        self._put_lock = threading.Lock()
+
+    def _request(self, operation):
+        self.request_counts[operation] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _bucket(self, bucket):
+        return self.objects.setdefault(bucket, {})
+
+    def _get(self, bucket, key, operation):
+        obj = self._bucket(bucket).get(key)
+        if obj is None:
+            raise NoSuchKey(
+                {'Error': {'Code': 'NoSuchKey', 'Message': 'The specified key does not exist.'}},
+                operation
+            )
+        return obj
+
+    def put_object(self, Bucket, Key, Body=b'', ContentType='binary/octet-stream', **kwargs):
+        self._request('PutObject')
+        if isinstance(Body, str):
+            Body = Body.encode('utf-8')
+        elif hasattr(Body, 'read'):
+            Body = Body.read()
+        etag = f'"{hashlib.md5(Body).hexdigest()}"'
+        with self._put_lock:
+            bucket = self._bucket(Bucket)
+            existing = bucket.get(Key)
+            if 'IfNoneMatch' in kwargs and existing is not None:
+                raise _client_error('PreconditionFailed', 'At least one of the pre-conditions you specified did not hold', 'PutObject')
+            if 'IfMatch' in kwargs:
+                if existing is None:
+                    raise NoSuchKey(
+                        {'Error': {'Code': 'NoSuchKey', 'Message': 'The specified key does not exist.'}},
+                        'PutObject'
+                    )
+                if existing['ETag'] != kwargs['IfMatch']:
+                    raise _client_error('PreconditionFailed', 'At least one of the pre-conditions you specified did not hold', 'PutObject')
+            if existing is None:
+                self._sorted_keys.pop(Bucket, None)
+            bucket[Key] = {
+                'Body': Body,
+                'ETag': etag,
+                'ContentType': ContentType,
+                'LastModified': datetime.now(timezone.utc)
+            }
+        return {'ETag': etag}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self._request('GetObject')
+        obj = self._get(Bucket, Key, 'GetObject')
+        if not_modified(obj, kwargs.get('IfNoneMatch'), kwargs.get('IfModifiedSince')):
+            raise ClientError({
+                'Error': {'Code': '304', 'Message': 'Not Modified'},
+                'ResponseMetadata': {'HTTPStatusCode': 304, 'HTTPHeaders': {
+                    'etag': obj['ETag'],
+                    'last-modified': format_datetime(obj['LastModified'], usegmt=True)
+                }}
+            }, 'GetObject')
+        self.bytes_sent += len(obj['Body'])
+        return {
+            'Body': LocalStreamingBody(obj['Body']),
+            'ContentLength': len(obj['Body']),
+            'ContentType': obj['ContentType'],
+            'ETag': obj['ETag'],
+            'LastModified': obj['LastModified']
+        }
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self._request('HeadObject')
+        obj = self._bucket(Bucket).get(Key)
+        if obj is None:
+            raise _client_error('404', 'Not Found', 'HeadObject')
+        return {
+            'ContentLength': len(obj['Body']),
+            'ContentType': obj['ContentType'],
+            'ETag': obj['ETag'],
+            'LastModified': obj['LastModified']
+        }
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self._request('DeleteObject')
+        self._bucket(Bucket).pop(Key, None)
+        self._sorted_keys.pop(Bucket, None)
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix='', MaxKeys=1000, ContinuationToken=None, **kwargs):
+        self._request('ListObjectsV2')
+        keys = self._sorted_keys.get(Bucket)
+        if keys is None:
+            keys = sorted(self._bucket(Bucket))
+            self._sorted_keys[Bucket] = keys
+
+        if ContinuationToken:
+            index = bisect.bisect_right(keys, ContinuationToken)
+        else:
+            index = bisect.bisect_left(keys, Prefix)
+
+        contents = []
+        while index < len(keys) and len(contents) < MaxKeys:
+            key = keys[index]
+            if not key.startswith(Prefix):
+                break
+            contents.append({'Key': key, 'Size': len(self.objects[Bucket][key]['Body'])})
+            index += 1
+
+        truncated = index < len(keys) and keys[index].startswith(Prefix)
+        response = {'KeyCount': len(contents), 'IsTruncated': truncated}
+        if contents:
+            response['Contents'] = contents
+        if truncated:
+            response['NextContinuationToken'] = contents[-1]['Key']
+        return response
+
+    def create_multipart_upload(self, Bucket, Key, ContentType='binary/octet-stream', **kwargs):
+        self._request('CreateMultipartUpload')
+        upload_id = uuid.uuid4().hex
+        with self._put_lock:
+            self.uploads[upload_id] = {
+                'Bucket': Bucket,
+                'Key': Key,
+                'ContentType': ContentType,
+                'Initiated': datetime.now(timezone.utc),
+                'Parts': {}
+            }
+        return {'Bucket': Bucket, 'Key': Key, 'UploadId': upload_id}
+
+    def _upload(self, bucket, key, upload_id, operation):
+        upload = self.uploads.get(upload_id)
+        if upload is None or upload['Bucket'] != bucket or upload['Key'] != key:
+            raise NoSuchUpload(
+                {'Error': {'Code': 'NoSuchUpload', 'Message': 'The specified upload does not exist.'}},
+                operation
+            )
+        return upload
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body=b'', **kwargs):
+        self._request('UploadPart')
+        if hasattr(Body, 'read'):
+            Body = Body.read()
+        etag = f'"{hashlib.md5(Body).hexdigest()}"'
+        with self._put_lock:
+            self._upload(Bucket, Key, UploadId, 'UploadPart')['Parts'][int(PartNumber)] = {
+                'Body': Body,
+                'ETag': etag
+            }
+        return {'ETag': etag}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload=None, **kwargs):
+        self._request('CompleteMultipartUpload')
+        requested = (MultipartUpload or {}).get('Parts', [])
+        with self._put_lock:
+            upload = self._upload(Bucket, Key, UploadId, 'CompleteMultipartUpload')
+            numbers = [part['PartNumber'] for part in requested]
+            if not requested or numbers != sorted(set(numbers)):
+                raise _client_error('InvalidPartOrder', 'The list of parts was not in ascending order.',
+                                    'CompleteMultipartUpload')
+            parts = []
+            for index, part in enumerate(requested):
+                stored = upload['Parts'].get(part['PartNumber'])
+                if stored is None or stored['ETag'] != part['ETag']:
+                    raise _client_error('InvalidPart', 'One or more of the specified parts could not be found.',
+                                        'CompleteMultipartUpload')
+                if index < len(requested) - 1 and len(stored['Body']) < MIN_PART_SIZE:
+                    raise _client_error('EntityTooSmall', 'Your proposed upload is smaller than the minimum allowed size',
+                                        'CompleteMultipartUpload')
+                parts.append(stored)
+            del self.uploads[UploadId]
+
+        digest = hashlib.md5(b''.join(bytes.fromhex(part['ETag'].strip('"')) for part in parts))
+        etag = f'"{digest.hexdigest()}-{len(parts)}"'
+        self.put_object(Bucket=Bucket, Key=Key, Body=b''.join(part['Body'] for part in parts),
+                        ContentType=upload['ContentType'])
+        # put_object set the single-part ETag
+        self._bucket(Bucket)[Key]['ETag'] = etag
+        return {'Bucket': Bucket, 'Key': Key, 'ETag': etag}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        self._request('AbortMultipartUpload')
+        with self._put_lock:
+            self._upload(Bucket, Key, UploadId, 'AbortMultipartUpload')
+            del self.uploads[UploadId]
+        return {}
+
+    def list_multipart_uploads(self, Bucket, Prefix='', **kwargs):
+        self._request('ListMultipartUploads')
+        uploads = [
+            {'Key': upload['Key'], 'UploadId': upload_id, 'Initiated': upload['Initiated']}
+            for upload_id, upload in self.uploads.items()
+            if upload['Bucket'] == Bucket and upload['Key'].startswith(Prefix)
+        ]
+        return {'Uploads': uploads} if uploads else {}
+
+    def generate_presigned_url(self, ClientMethod, Params=None, ExpiresIn=3600, **kwargs):
+        params = Params or {}
+        query = {'X-Amz-Expires': ExpiresIn}
+        if ClientMethod == 'upload_part':
+            query.update(partNumber=params['PartNumber'], uploadId=params['UploadId'])
+        return f"{self.endpoint_url or 'http://localhost'}/{params.get('Bucket')}/{params.get('Key')}?{urlencode(query)}"
+
+
+class Bandwidth:
+    """
+    Paces transfers to a per-connection rate and an optional shared link
+    rate, both in bytes/s (0 = unlimited).
+
+    The per-connection limit stands in for what one TCP stream gets over a
+    long, lossy path; the link limit for the site's uplink, which parallel
+    streams share.
+    """
+
+    def __init__(self, connection_rate=0, link_rate=0):
+        self.connection_rate = connection_rate
+        self.link_rate = link_rate
+        self._link_free_at = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self, started, sent, size):
+        """
+        Block until `size` more bytes may pass on a connection that began
+        transferring at `started` and has passed `sent` bytes.
+        """
+        ready = started + (sent + size) / self.connection_rate if self.connection_rate else 0.0
+        if self.link_rate:
+            with self._lock:
+                self._link_free_at = max(self._link_free_at, time.perf_counter()) + size / self.link_rate
+                ready = max(ready, self._link_free_at)
+        delay = ready - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class LocalS3Server:
+    """
+    Path-style S3 HTTP endpoint serving GetObject (with If-None-Match /
+    If-Modified-Since) and HeadObject from a LocalS3Client, so real boto3 clients (request signing, connection
+    pooling, response parsing) can be measured without AWS. PUTs to
+    presigned PutObject and UploadPart URLs are stored in the client.
+
+    `connections` counts the TCP connections clients opened. An optional
+    handshake delay on each new connection stands in for the TCP + TLS
+    set-up a client pays when it cannot reuse a pooled connection.
+
+    Args:
+        s3: LocalS3Client holding the objects (default: a new empty one)
+        handshake_ms: Delay before a new connection is served
+        upload_bandwidth: Bandwidth pacing PUT bodies (default: unlimited)
+    """
+
+    # Bytes read from a PUT body between bandwidth waits
+    UPLOAD_CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, s3=None, handshake_ms=0.0, upload_bandwidth=None):
+        self.s3 = s3 or LocalS3Client()
+        self.handshake_ms = handshake_ms
+        self.upload_bandwidth = upload_bandwidth or Bandwidth()
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def endpoint_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out as separate writes; without this,
+            # Nagle's algorithm holds the body for the client's delayed ACK
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+                if server.handshake_ms:
+                    time.sleep(server.handshake_ms / 1000)
+
+            def log_message(self, format, *args):
+                pass
+
+            def _object(self):
+                bucket, _, key = unquote(urlsplit(self.path).path).lstrip('/').partition('/')
+                return server.s3._bucket(bucket).get(key)
+
+            def _respond(self, obj, include_body):
+                if obj is None:
+                    body = (b'<?xml version="1.0" encoding="UTF-8"?><Error><Code>NoSuchKey</Code>'
+                            b'<Message>The specified key does not exist.</Message></Error>')
+                    self.send_response(404)
+                    self.send_header('Content-Type', 'application/xml')
+                else:
+                    body = obj['Body']
+                    self.send_response(200)
+                    self.send_header('Content-Type', obj['ContentType'])
+                    self.send_header('ETag', obj['ETag'])
+                    if obj['LastModified']:
+                        self.send_header('Last-Modified', format_datetime(obj['LastModified'], usegmt=True))
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if include_body:
+                    self.wfile.write(body)
+
+            def do_GET(self):
+                server.s3._request('GetObject')
+                obj = self._object()
+                if obj is not None and not_modified(
+                    obj, self.headers.get('If-None-Match'), self.headers.get('If-Modified-Since')
+                ):
+                    self.send_response(304)
+                    self.send_header('ETag', obj['ETag'])
+                    self.send_header('Last-Modified', format_datetime(obj['LastModified'], usegmt=True))
+                    self.end_headers()
+                    return
+                if obj is not None:
+                    server.s3.bytes_sent += len(obj['Body'])
+                self._respond(obj, include_body=True)
+
+            def do_HEAD(self):
+                server.s3._request('HeadObject')
+                self._respond(self._object(), include_body=False)
+
+            def _read_body(self):
+                remaining = int(self.headers.get('Content-Length', 0))
+                chunks, sent, started = [], 0, time.perf_counter()
+                while remaining:
+                    size = min(remaining, server.UPLOAD_CHUNK_SIZE)
+                    server.upload_bandwidth.wait(started, sent, size)
+                    chunk = self.rfile.read(size)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+                    sent += len(chunk)
+                    remaining -= len(chunk)
+                return b''.join(chunks)
+
+            def do_PUT(self):
+                url = urlsplit(self.path)
+                bucket, _, key = unquote(url.path).lstrip('/').partition('/')
+                query = {name: values[0] for name, values in parse_qs(url.query).items()}
+                body = self._read_body()
+                try:
+                    if 'uploadId' in query:
+                        response = server.s3.upload_part(Bucket=bucket, Key=key, UploadId=query['uploadId'],
+                                                         PartNumber=int(query['partNumber']), Body=body)
+                    else:
+                        response = server.s3.put_object(Bucket=bucket, Key=key, Body=body,
+                                                        ContentType=self.headers.get('Content-Type',
+                                                                                     'binary/octet-stream'))
+                except ClientError as e:
+                    code = e.response['Error']['Code']
+                    error = f'<?xml version="1.0" encoding="UTF-8"?><Error><Code>{code}</Code></Error>'.encode()
+                    self.send_response(404 if code == 'NoSuchUpload' else 400)
+                    self.send_header('Content-Type', 'application/xml')
+                    self.send_header('Content-Length', str(len(error)))
+                    self.end_headers()
+                    self.wfile.write(error)
+                    return
+                self.send_response(200)
+                self.send_header('ETag', response['ETag'])
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.s3.endpoint_url = self.endpoint_url
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class LocalQueue:
+    """
+    In-memory SQS queue with the subset of the client API the handlers use.
+
+    drain() stands in for the Lambda SQS event source: it delivers messages
+    to a handler in batches, deletes the ones that succeed, redelivers
+    reported failures and moves a message to `dead_letters` after
+    max_receive_count deliveries.
+    """
+
+    def __init__(self, max_receive_count=3):
+        self.max_receive_count = max_receive_count
+        self.messages = deque()
+        self.dead_letters = []
+        self.request_counts = Counter()
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        self.request_counts['SendMessage'] += 1
+        message_id = str(uuid.uuid4())
+        self.messages.append({'messageId': message_id, 'body': MessageBody, 'receiveCount': 0})
+        return {'MessageId': message_id, 'MD5OfMessageBody': hashlib.md5(MessageBody.encode('utf-8')).hexdigest()}
+
+    def get_queue_attributes(self, QueueUrl, AttributeNames=None, **kwargs):
+        self.request_counts['GetQueueAttributes'] += 1
+        return {'Attributes': {'ApproximateNumberOfMessages': str(len(self.messages))}}
+
+    def drain(self, handler, batch_size=1):
+        """
+        Deliver queued messages until the queue is empty.
+
+        Args:
+            handler: SQS-triggered Lambda handler
+            batch_size: Messages per invocation
+
+        Returns:
+            int: Number of handler invocations
+        """
+        invocations = 0
+        while self.messages:
+            batch = [self.messages.popleft() for _ in range(min(batch_size, len(self.messages)))]
+            for message in batch:
+                message['receiveCount'] += 1
+            event = {'Records': [
+                {
+                    'messageId': message['messageId'],
+                    'body': message['body'],
+                    'attributes': {'ApproximateReceiveCount': str(message['receiveCount'])},
+                    'eventSource': 'aws:sqs'
+                }
+                for message in batch
+            ]}
+
+            response = handler(event, None) or {}
+            invocations += 1
+
+            failed = {item['itemIdentifier'] for item in response.get('batchItemFailures', [])}
+            for message in batch:
+                if message['messageId'] not in failed:
+                    continue
+                if message['receiveCount'] >= self.max_receive_count:
+                    self.dead_letters.append(message)
+                else:
+                    self.messages.append(message)
+        return invocations
+
+
+class GoneException(ClientError):
+    pass
+
+
+class LocalWebSocketConnection:
+    """Client end of a LocalWebSocketGateway connection"""
+
+    def __init__(self, gateway, connection_id):
+        self.gateway = gateway
+        self.connection_id = connection_id
+        self.messages = queue.Queue()
+        self.open = True
+
+    def send(self, message):
+        """Send a JSON message; its 'action' selects the route"""
+        return self.gateway._invoke(message.get('action', '$default'), self.connection_id, json.dumps(message))
+
+    def receive(self, timeout=None):
+        """Next pushed message, decoded, or None on timeout"""
+        try:
+            return json.loads(self.messages.get(timeout=timeout))
+        except queue.Empty:
+            return None
+
+    def close(self):
+        if self.open:
+            self.open = False
+            self.gateway._invoke('$disconnect', self.connection_id)
+
+
+class LocalWebSocketGateway:
+    """
+    API Gateway WebSocket API stand-in.
+
+    Drives a websocket Lambda handler with $connect / route / $disconnect
+    events and implements post_to_connection of the 'apigatewaymanagementapi'
+    client, delivering into the connection's message queue. Posting to a
+    closed connection raises GoneException, as API Gateway does.
+
+    Args:
+        handler: Lambda handler for the WebSocket routes
+    """
+
+    class exceptions:
+        GoneException = GoneException
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.connections = {}
+        self.request_counts = Counter()
+        self._lock = threading.Lock()
+
+    def _invoke(self, route, connection_id, body=None):
+        with self._lock:
+            self.request_counts[f"Invoke {route}"] += 1
+        event = {
+            'requestContext': {
+                'routeKey': route,
+                'connectionId': connection_id,
+                'domainName': 'localhost',
+                'stage': 'local'
+            },
+            'body': body
+        }
+        return self.handler(event, None)
+
+    def connect(self):
+        """Open a connection; None if $connect rejects it"""
+        connection = LocalWebSocketConnection(self, uuid.uuid4().hex)
+        with self._lock:
+            self.connections[connection.connection_id] = connection
+        if self._invoke('$connect', connection.connection_id).get('statusCode') != 200:
+            connection.open = False
+            return None
+        return connection
+
+    def post_to_connection(self, ConnectionId, Data, **kwargs):
+        with self._lock:
+            self.request_counts['PostToConnection'] += 1
+            connection = self.connections.get(ConnectionId)
+        if connection is None or not connection.open:
+            raise GoneException({'Error': {'Code': 'GoneException', 'Message': 'Gone'}}, 'PostToConnection')
+        connection.messages.put(Data.decode('utf-8') if isinstance(Data, bytes) else Data)
+        return {}
+
+
+class ModelError(ClientError):
+    pass
+
+
+class LocalSageMakerRuntime:
+    """
+    SageMaker runtime stand-in that answers invoke_endpoint with a fixed
+    detection set, filtered to the request's confidence, after a fixed
+    latency.
+
+    A batch request ({"s3_uris": [...]}) gets one result per URI and takes
+    `image_latency` longer per image after the first, the cost of the
+    extra images in the model's forward passes.
+
+    With `capacity` set, the endpoint serves that many invocations at once
+    and rejects any beyond it with a ThrottlingException, like an endpoint
+    whose instances are saturated. Rejections are counted in
+    `request_counts['Throttled']`; `peak_concurrency` is the most
+    invocations it served at once.
+    """
+
+    class exceptions:
+        ModelError = ModelError
+        ClientError = ClientError
+
+    def __init__(self, latency=0.0, detections=None, capacity=0, image_latency=0.0):
+        self.latency = latency
+        self.image_latency = image_latency
+        self.detections = detections if detections is not None else []
+        self.capacity = capacity
+        self.request_counts = Counter()
+        self.in_flight = 0
+        self.peak_concurrency = 0
+        self._lock = threading.Lock()
+
+    def invoke_endpoint(self, EndpointName, Body, **kwargs):
+        with self._lock:
+            self.request_counts['InvokeEndpoint'] += 1
+            if self.capacity and self.in_flight >= self.capacity:
+                self.request_counts['Throttled'] += 1
+                raise _client_error('ThrottlingException', 'Rate exceeded', 'InvokeEndpoint')
+            self.in_flight += 1
+            self.peak_concurrency = max(self.peak_concurrency, self.in_flight)
+        request = json.loads(Body)
+        uris = request.get('s3_uris')
+        self.request_counts['Images'] += len(uris) if uris else 1
+        try:
+            delay = self.latency + self.image_latency * (len(uris) - 1 if uris else 0)
+            if delay:
+                time.sleep(delay)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        threshold = request.get('confidence', 0)
+        detections = [d for d in self.detections if d.get('confidence', 0) > threshold]
+        confidences = [d.get('confidence', 0) for d in detections]
+        result = {
+            'detections': detections,
+            'totalRooms': len(detections),
+            'avgConfidence': sum(confidences) / len(confidences) if confidences else 0,
+            'dimensions': {'width': 2048, 'height': 1536}
+        }
+        if uris:
+            result = {'results': [dict(result, s3_uri=uri) for uri in uris], 'totalImages': len(uris)}
+        return {'Body': LocalStreamingBody(json.dumps(result).encode('utf-8')), 'ContentType': 'application/json'}
@@ -71,6 +71,19 @@ def test_inference_handler(
             ContentType='application/json'
         )
 
+        # Index the blueprint so the status/results handlers can find it
+        index_key = f"index/{blueprint_id}.json"
+        s3_client.put_object(
+            Bucket=bucket_name,
+            Key=index_key,
+            Body=json.dumps({
+                'blueprintId': blueprint_id,
+                'sessionId': session_id,
+                'prefix': f"uploads/{session_id}/{blueprint_id}/"
+            }),
+            ContentType='application/json'
+        )
+
     # Prepare Lambda payload
     payload = {
         'body': json.dumps({
@@ -102,6 +115,15 @@ def test_inference_handler(
         print(f"{'='*60}")
         print(f"Status Code: {response_payload.get('statusCode')}")
 
+        if response_payload.get('statusCode') == 202:
+            # Async mode: wait for the worker to finish, then read results.json
+            body = json.loads(response_payload.get('body', '{}'))
+            print(f"\n⏳ Job queued: {body.get('jobId')}")
+            results = wait_for_results(blueprint_id, session_id)
+            if results is None:
+                return response_payload
+            response_payload = {'statusCode': 200, 'body': json.dumps({'results': results})}
+
         if response_payload.get('statusCode') == 200:
             body = json.loads(response_payload.get('body', '{}'))
             results = body.get('results', {})
@@ -144,6 +166,33 @@ def test_inference_handler(
         print(f"\n❌ Error invoking Lambda: {str(e)}")
         return None
 
+def wait_for_results(blueprint_id, session_id, bucket_name='innergy-blueprints-dev', timeout=300):
+    """
+    Poll status.json until the async worker completes or fails the job
+
+    Returns:
+        dict: Stored results, or None if the job failed or timed out
+    """
+    prefix = f"uploads/{session_id}/{blueprint_id}/"
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = json.loads(s3_client.get_object(
+            Bucket=bucket_name, Key=f"{prefix}status.json"
+        )['Body'].read().decode('utf-8'))
+        print(f"  {status.get('stage')}: {status.get('message')}")
+
+        if status.get('status') == 'completed':
+            return json.loads(s3_client.get_object(
+                Bucket=bucket_name, Key=f"{prefix}results.json"
+            )['Body'].read().decode('utf-8'))
+        if status.get('status') == 'failed':
+            print(f"\n❌ Job failed: {status.get('message')}")
+            return None
+        time.sleep(2)
+
+    print(f"\n❌ Timed out after {timeout}s waiting for results")
+    return None
+
 def test_endpoint_config():
     """
     Test if SageMaker endpoint is configured correctly
@@ -168,6 +217,7 @@ def test_endpoint_config():
         print(f"  MODEL_VERSION: {env_vars.get('MODEL_VERSION', 'not set')}")
         print(f"  SAGEMAKER_MAX_RETRIES: {env_vars.get('SAGEMAKER_MAX_RETRIES', 'not set')}")
         print(f"  SAGEMAKER_RETRY_DELAY: {env_vars.get('SAGEMAKER_RETRY_DELAY', 'not set')}")
+        print(f"  INFERENCE_MODE: {env_vars.get('INFERENCE_MODE', 'not set')}")
 
         # Check if endpoint is set
         endpoint = env_vars.get('SAGEMAKER_ENDPOINT')
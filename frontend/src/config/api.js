@@ -8,6 +8,10 @@
 // Base URL for API Gateway
 export const API_BASE_URL = 'https://s4fsv92lt6.execute-api.us-east-1.amazonaws.com/dev';
 
+// WebSocket API for pushed processing progress (wss://.../dev); when unset
+// the Processing page polls the status endpoint instead
+export const WEBSOCKET_URL = import.meta.env.VITE_WS_URL || '';
+
 // Endpoint paths
 export const UPLOAD_ENDPOINT = '/upload';
 export const DETECT_ENDPOINT = '/detect';
@@ -15,8 +19,114 @@ export const RESULTS_ENDPOINT = (blueprintId) => `/results/${blueprintId}`;
 
 // Full endpoint URLs (convenience exports)
 export const getUploadUrl = () => `${API_BASE_URL}${UPLOAD_ENDPOINT}`;
+// Presigned URLs for a whole drawing set in one request
+export const getBatchUploadUrl = () => `${API_BASE_URL}${UPLOAD_ENDPOINT}/batch`;
+export const getUploadActionUrl = (blueprintId, action) =>
+  `${API_BASE_URL}${UPLOAD_ENDPOINT}/${blueprintId}/${action}`;
 export const getDetectUrl = () => `${API_BASE_URL}${DETECT_ENDPOINT}`;
-export const getResultsUrl = (blueprintId) => `${API_BASE_URL}${RESULTS_ENDPOINT(blueprintId)}`;
+// Inference for a whole upload batch; progress via the status endpoint with the batchId
+export const getBatchDetectUrl = () => `${API_BASE_URL}${DETECT_ENDPOINT}/batch`;
+export const getResultsUrl = (blueprintId, params) => {
+  const query = params ? `?${new URLSearchParams(params)}` : '';
+  return `${API_BASE_URL}${RESULTS_ENDPOINT(blueprintId)}${query}`;
+};
+
+// Results in columnar form: parallel arrays per detection field and a class
+// table, compressed with brotli/gzip by the backend. Much smaller and faster
+// to parse than the plain JSON for dense blueprints.
+export const RESULTS_MEDIA_TYPE = 'application/vnd.maxtrace.columnar+json';
+export const resultsHeaders = { Accept: RESULTS_MEDIA_TYPE };
+
+/**
+ * Read a results response into the plain results shape, expanding the
+ * columnar representation into detection objects.
+ * @param {Response} response - fetch response from the results endpoint
+ * @returns {Promise<object>} Results with a detections array
+ */
+export const readResults = async (response) => {
+  const data = await response.json();
+  if (data.format !== 'columnar') {
+    return data;
+  }
+
+  const { format, classTable, detections: columns, ...results } = data;
+  const detections = new Array(columns.count);
+  for (let i = 0; i < columns.count; i += 1) {
+    detections[i] = {
+      roomId: columns.roomId[i],
+      boundingBox: {
+        x: columns.x[i],
+        y: columns.y[i],
+        width: columns.width[i],
+        height: columns.height[i],
+      },
+      confidence: columns.confidence[i],
+      class: classTable[columns.classId[i]],
+      area: columns.area[i],
+    };
+    // PDF results carry the page each detection was found on
+    if (columns.page) {
+      detections[i].page = columns.page[i];
+    }
+  }
+  return { ...results, detections };
+};
+
+// Largest file accepted by the backend (UPLOAD_MAX_BYTES)
+export const MAX_UPLOAD_MB = Number(import.meta.env.VITE_MAX_UPLOAD_MB || 100);
+
+// Parts of a multipart upload sent at once, and attempts per part
+export const UPLOAD_CONCURRENCY = Number(import.meta.env.VITE_UPLOAD_CONCURRENCY || 4);
+export const UPLOAD_PART_ATTEMPTS = 3;
+
+/**
+ * Upload a file's parts to the presigned URLs of a multipart upload, several
+ * at a time. A failed part is retried on its own.
+ * @param {File} file - File being uploaded
+ * @param {object} multipart - 'multipart' from the upload response
+ * @param {function} onProgress - Called with the fraction of bytes uploaded
+ * @returns {Promise<Array>} [{partNumber, etag}] for the complete request
+ */
+export const uploadParts = async (file, multipart, onProgress = () => {}) => {
+  const { partSize, parts } = multipart;
+  const uploaded = new Array(parts.length);
+  let uploadedBytes = 0;
+  let next = 0;
+
+  const uploadPart = async (part) => {
+    const start = (part.partNumber - 1) * partSize;
+    const body = file.slice(start, start + part.size);
+    for (let attempt = 1; ; attempt += 1) {
+      try {
+        const response = await fetch(part.url, { method: 'PUT', body });
+        if (!response.ok) {
+          throw new Error(`Part ${part.partNumber} failed: ${response.statusText}`);
+        }
+        return response.headers.get('ETag');
+      } catch (err) {
+        if (attempt >= UPLOAD_PART_ATTEMPTS) {
+          throw err;
+        }
+      }
+    }
+  };
+
+  const worker = async () => {
+    while (next < parts.length) {
+      const index = next;
+      next += 1;
+      const part = parts[index];
+      uploaded[index] = { partNumber: part.partNumber, etag: await uploadPart(part) };
+      uploadedBytes += part.size;
+      onProgress(uploadedBytes / file.size);
+    }
+  };
+
+  await Promise.all(
+    Array.from({ length: Math.min(UPLOAD_CONCURRENCY, parts.length) }, worker)
+  );
+  return uploaded;
+};
 
 // Default config for fetch requests
 export const defaultHeaders = {
@@ -1,11 +1,15 @@
 import { useState, useEffect, useRef, useCallback } from 'react';
+import { WEBSOCKET_URL } from '../config/api';
 
-const POLL_INTERVAL = 2000; // 2 seconds
+const POLL_INTERVAL = 2000; // 2 seconds (fallback when push is unavailable)
 const MAX_RETRIES = 3;
 const RETRY_DELAY = 1000; // 1 second
 
 /**
- * Custom hook to poll for blueprint processing status
+ * Custom hook to follow blueprint processing status.
+ * Subscribes over WebSocket when WEBSOCKET_URL is configured and receives
+ * each stage change as it is written; polls the status endpoint when push
+ * is unavailable or the connection drops before processing finishes.
  * @param {string} blueprintId - The blueprint ID to check status for
  * @param {boolean} enabled - Whether polling is enabled
  * @returns {object} Status data and control functions
@@ -18,6 +22,7 @@ export function useProcessingStatus(blueprintId, enabled = true) {
 
   const pollIntervalRef = useRef(null);
   const retryTimeoutRef = useRef(null);
+  const socketRef = useRef(null);
 
   const fetchStatus = useCallback(async () => {
     if (!blueprintId) return;
@@ -66,13 +71,7 @@ export function useProcessingStatus(blueprintId, enabled = true) {
     }
   }, [blueprintId, retryCount]);
 
-  const startPolling = useCallback(() => {
-    if (!blueprintId || isPolling) return;
-
-    setIsPolling(true);
-    setError(null);
-    setRetryCount(0);
-
+  const startInterval = useCallback(() => {
     // Fetch immediately
     fetchStatus();
 
@@ -80,11 +79,17 @@ export function useProcessingStatus(blueprintId, enabled = true) {
     pollIntervalRef.current = setInterval(() => {
       fetchStatus();
     }, POLL_INTERVAL);
-  }, [blueprintId, isPolling, fetchStatus]);
+  }, [fetchStatus]);
 
   const stopPolling = useCallback(() => {
     setIsPolling(false);
 
+    if (socketRef.current) {
+      const socket = socketRef.current;
+      socketRef.current = null;
+      socket.close();
+    }
+
     if (pollIntervalRef.current) {
       clearInterval(pollIntervalRef.current);
       pollIntervalRef.current = null;
@@ -96,6 +101,54 @@ export function useProcessingStatus(blueprintId, enabled = true) {
     }
   }, []);
 
+  const subscribe = useCallback(() => {
+    const socket = new WebSocket(WEBSOCKET_URL);
+    socketRef.current = socket;
+
+    socket.onopen = () => {
+      socket.send(JSON.stringify({ action: 'subscribe', blueprintId }));
+    };
+
+    socket.onmessage = (event) => {
+      const data = JSON.parse(event.data);
+
+      // Unknown blueprint: let the polling path report the error
+      if (data.error) {
+        socket.close();
+        return;
+      }
+
+      setStatus(data);
+      setError(null);
+
+      if (data.status === 'completed' || data.status === 'failed') {
+        stopPolling();
+      }
+    };
+
+    // Dropped or refused before a final status: continue by polling
+    socket.onclose = () => {
+      if (socketRef.current === socket) {
+        socketRef.current = null;
+        startInterval();
+      }
+    };
+  }, [blueprintId, startInterval, stopPolling]);
+
+  const startPolling = useCallback(() => {
+    if (!blueprintId || isPolling) return;
+
+    setIsPolling(true);
+    setError(null);
+    setRetryCount(0);
+
+    if (WEBSOCKET_URL && typeof WebSocket !== 'undefined') {
+      subscribe();
+    } else {
+      startInterval();
+    }
+  }, [blueprintId, isPolling, subscribe, startInterval]);
+
   const retry = useCallback(() => {
     setError(null);
     setRetryCount(0);
@@ -1,7 +1,7 @@
 import { useParams, Link } from 'react-router-dom';
 import { useState, useEffect, useRef } from 'react';
 import BlueprintCanvas from '../components/BlueprintCanvas';
-import { getResultsUrl } from '../config/api';
+import { getResultsUrl, readResults, resultsHeaders } from '../config/api';
 
 function Results() {
   const { blueprintId } = useParams();
@@ -10,6 +10,7 @@ function Results() {
   const [error, setError] = useState(null);
   const [confidenceThreshold, setConfidenceThreshold] = useState(0.5);
   const canvasRef = useRef(null);
+  const requestedThreshold = useRef(null);
 
   // Fetch results from backend API
   useEffect(() => {
@@ -18,14 +19,17 @@ function Results() {
         setLoading(true);
         setError(null);
 
-        const response = await fetch(getResultsUrl(blueprintId));
+        const response = await fetch(getResultsUrl(blueprintId), { headers: resultsHeaders });
 
         if (!response.ok) {
           throw new Error(`Failed to fetch results: ${response.statusText}`);
         }
 
-        const data = await response.json();
+        const data = await readResults(response);
         setResults(data);
+        if (data.confidence !== undefined) {
+          setConfidenceThreshold(data.confidence);
+        }
         setLoading(false);
       } catch (err) {
         console.error('Error fetching results:', err);
@@ -39,6 +43,45 @@ function Results() {
     }
   }, [blueprintId]);
 
+  // Re-filter the stored detections server-side when the threshold changes.
+  // The backend keeps a low-threshold detection set, so this is a cheap
+  // lookup rather than another inference run.
+  useEffect(() => {
+    if (
+      !results ||
+      results.confidence === undefined ||
+      results.confidence === confidenceThreshold ||
+      requestedThreshold.current === confidenceThreshold
+    ) {
+      return undefined;
+    }
+
+    const controller = new AbortController();
+    const timeout = setTimeout(async () => {
+      try {
+        const response = await fetch(
+          getResultsUrl(blueprintId, { confidence: confidenceThreshold }),
+          { headers: resultsHeaders, signal: controller.signal }
+        );
+        if (response.ok) {
+          const data = await readResults(response);
+          // The backend may raise the threshold to its stored minimum
+          requestedThreshold.current = confidenceThreshold;
+          setResults(data);
+        }
+      } catch (err) {
+        if (err.name !== 'AbortError') {
+          console.error('Error refreshing results:', err);
+        }
+      }
+    }, 250);
+
+    return () => {
+      clearTimeout(timeout);
+      controller.abort();
+    };
+  }, [blueprintId, confidenceThreshold, results]);
+
   const handleDownloadJSON = () => {
     if (!results) return;
 
@@ -116,7 +159,7 @@ function Results() {
               </label>
               <input
                 type="range"
-                min="0.3"
+                min="0.1"
                 max="0.9"
                 step="0.05"
                 value={confidenceThreshold}
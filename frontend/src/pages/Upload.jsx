@@ -1,6 +1,6 @@
 import { useState, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { getUploadUrl, getDetectUrl } from '../config/api';
+import { getUploadUrl, getUploadActionUrl, getDetectUrl, MAX_UPLOAD_MB, uploadParts } from '../config/api';
 
 function Upload() {
   const [sessionId] = useState(`session-${Math.random().toString(36).substr(2, 9)}`);
@@ -13,7 +13,7 @@ function Upload() {
   const fileInputRef = useRef(null);
   const navigate = useNavigate();
 
-  const MAX_FILE_SIZE = 10 * 1024 * 1024; // 10MB
+  const MAX_FILE_SIZE = MAX_UPLOAD_MB * 1024 * 1024;
   const ALLOWED_TYPES = ['image/png', 'image/jpeg', 'image/jpg', 'application/pdf'];
 
   const validateFile = (file) => {
@@ -26,7 +26,7 @@ function Upload() {
     }
 
     if (file.size > MAX_FILE_SIZE) {
-      return 'File size exceeds 10MB limit.';
+      return `File size exceeds ${MAX_UPLOAD_MB}MB limit.`;
     }
 
     return null;
@@ -121,20 +121,48 @@ function Upload() {
       }
 
       const uploadData = await uploadResponse.json();
-      const { uploadUrl, blueprintId, s3Key } = uploadData;
+      const { uploadUrl, multipart, blueprintId, s3Key } = uploadData;
 
-      // Step 2: Upload file to S3 using presigned URL
+      // Step 2: Upload file to S3 using presigned URL(s)
       setUploadProgress(30);
-      const s3Response = await fetch(uploadUrl, {
-        method: 'PUT',
-        headers: {
-          'Content-Type': selectedFile.type,
-        },
-        body: selectedFile,
-      });
-
-      if (!s3Response.ok) {
-        throw new Error(`S3 upload failed: ${s3Response.statusText}`);
+      if (multipart) {
+        // Large file: parts in parallel, then assembled by the backend
+        const uploadAction = (action, body) => fetch(getUploadActionUrl(blueprintId, action), {
+          method: 'POST',
+          headers: {
+            'Content-Type': 'application/json',
+          },
+          body: JSON.stringify({ uploadId: multipart.uploadId, ...body }),
+        });
+
+        let parts;
+        try {
+          parts = await uploadParts(selectedFile, multipart, (fraction) => {
+            setUploadProgress(30 + Math.round(35 * fraction));
+          });
+        } catch (err) {
+          // Discard the parts already stored; the bucket lifecycle rule
+          // removes them anyway if this request is lost
+          uploadAction('abort', {}).catch(() => {});
+          throw err;
+        }
+
+        const completeResponse = await uploadAction('complete', { parts });
+        if (!completeResponse.ok) {
+          throw new Error(`S3 upload failed: ${completeResponse.statusText}`);
+        }
+      } else {
+        const s3Response = await fetch(uploadUrl, {
+          method: 'PUT',
+          headers: {
+            'Content-Type': selectedFile.type,
+          },
+          body: selectedFile,
+        });
+
+        if (!s3Response.ok) {
+          throw new Error(`S3 upload failed: ${s3Response.statusText}`);
+        }
       }
 
       // Step 3: Trigger inference
@@ -242,7 +270,7 @@ function Upload() {
                   </label>
                   <p className="pl-1 inline">or drag and drop</p>
                 </div>
-                <p className="text-xs text-gray-500">PNG, JPG, PDF up to 10MB</p>
+                <p className="text-xs text-gray-500">PNG, JPG, PDF up to {MAX_UPLOAD_MB}MB</p>
               </div>
             ) : (
               <div className="space-y-4">
@@ -0,0 +1,240 @@
+"""
+Model backends for the inference container.
+
+Every backend exposes `names` (class names by ID) and
+`predict(images, confidence)`, which returns one (N, 6) array of
+[x1, y1, x2, y2, confidence, class] in source-image pixels per image, so
+predict_fn produces the same detection JSON whichever backend serves.
+
+`confidence` is applied per call during NMS and no backend keeps state
+between calls, so one loaded backend can serve concurrent requests.
+
+- TorchHubBackend: eager PyTorch, the YOLOv5 model loaded by torch.hub
+- OnnxBackend: ONNX Runtime on the exported best.onnx
+- TorchScriptBackend: the exported best.torchscript
+"""
+import ast
+import json
+import os
+import threading
+
+import numpy as np
+
+from postprocess import non_max_suppression, scale_boxes
+from preprocess import exif_transpose, prepare_batch
+
+# Class names of blueprint_dataset.yaml, used when an exported model
+# carries no metadata
+DEFAULT_CLASS_NAMES = ['wall', 'door', 'window', 'room', 'stair', 'furniture', 'fixture']
+
+# Thread counts for the CPU runtimes; 0 leaves the runtime default
+INTRA_OP_THREADS = int(os.environ.get('INFERENCE_INTRA_OP_THREADS', '0'))
+INTER_OP_THREADS = int(os.environ.get('INFERENCE_INTER_OP_THREADS', '0'))
+
+
+def configure_torch_threads():
+    """
+    Apply INTRA_OP_THREADS / INTER_OP_THREADS to torch. Both settings are
+    process-wide; the inter-op pool can only be sized before torch first
+    uses it, so later calls leave it unchanged.
+    """
+    import torch
+
+    if INTRA_OP_THREADS:
+        torch.set_num_threads(INTRA_OP_THREADS)
+    if INTER_OP_THREADS:
+        try:
+            torch.set_num_interop_threads(INTER_OP_THREADS)
+        except RuntimeError as e:
+            print(f"Inter-op threads left at {torch.get_num_interop_threads()}: {str(e)}")
+
+
+class ExportedBackend:
+    """
+    Shared pipeline for exported models: letterbox, raw forward pass,
+    NumPy NMS and mapping boxes back to source-image coordinates.
+
+    Subclasses set img_size, stride, names, fixed_batch (None if the batch
+    dimension is dynamic) and rect (True if any input shape is accepted),
+    and implement forward().
+    """
+
+    iou_threshold = 0.45
+    max_det = 1000
+
+    def forward(self, batch):
+        raise NotImplementedError
+
+    def predict(self, images, confidence):
+        chunk_size = self.fixed_batch or len(images)
+        predictions = []
+        for start in range(0, len(images), chunk_size):
+            chunk = [exif_transpose(image) for image in images[start:start + chunk_size]]
+            batch, letterboxes = prepare_batch(chunk, self.img_size, self.stride, self.rect)
+
+            # Pad a short final chunk up to a fixed batch size
+            if self.fixed_batch and len(batch) < self.fixed_batch:
+                padding = np.zeros((self.fixed_batch - len(batch),) + batch.shape[1:], dtype=batch.dtype)
+                batch = np.concatenate([batch, padding])
+
+            raw = self.forward(batch)[:len(chunk)]
+            for image, params, image_predictions in zip(
+                chunk, letterboxes,
+                non_max_suppression(raw, confidence, self.iou_threshold, self.max_det)
+            ):
+                predictions.append(scale_boxes(image_predictions, params, image.size))
+        return predictions
+
+
+class OnnxBackend(ExportedBackend):
+    """YOLOv5 ONNX export served with ONNX Runtime on CPU"""
+
+    name = 'onnx'
+
+    def __init__(self, model_path, img_size=640):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = INTRA_OP_THREADS
+        options.inter_op_num_threads = INTER_OP_THREADS
+
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+
+        # Dimensions exported with --dynamic are symbolic names, not ints
+        batch_dim, _, height_dim, width_dim = model_input.shape
+        self.fixed_batch = batch_dim if isinstance(batch_dim, int) else None
+        self.rect = not isinstance(height_dim, int)
+        self.img_size = img_size if self.rect else max(height_dim, width_dim)
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.stride = int(metadata.get('stride', 32))
+        self.names = ast.literal_eval(metadata['names']) if 'names' in metadata else DEFAULT_CLASS_NAMES
+
+    def forward(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class TorchScriptBackend(ExportedBackend):
+    """YOLOv5 TorchScript export (traced at a fixed square input size)"""
+
+    name = 'torchscript'
+    rect = False
+
+    def __init__(self, model_path):
+        import torch
+
+        configure_torch_threads()
+
+        extra_files = {'config.txt': ''}
+        self.model = torch.jit.load(model_path, _extra_files=extra_files, map_location='cpu')
+        self.model.eval()
+
+        config = json.loads(extra_files['config.txt'] or '{}')
+        shape = config.get('shape', [1, 3, 640, 640])
+        self.fixed_batch = shape[0]
+        self.img_size = max(shape[2:])
+        self.stride = int(config.get('stride', 32))
+        names = config.get('names', DEFAULT_CLASS_NAMES)
+        self.names = {int(k): v for k, v in names.items()} if isinstance(names, dict) else names
+
+    def forward(self, batch):
+        import torch
+
+        with torch.no_grad():
+            output = self.model(torch.from_numpy(batch))
+        if isinstance(output, (list, tuple)):
+            output = output[0]
+        return output.numpy()
+
+
+class ThreadLocalGrids:
+    """
+    Per-thread stand-in for the grid caches of YOLOv5's Detect head.
+
+    Detect rebuilds `grid[i]` / `anchor_grid[i]` whenever the input shape
+    changes and reads them back a few lines later, so two threads running
+    rectangular inputs of different shapes could decode boxes with each
+    other's grids. Giving every thread its own cache removes the race.
+    """
+
+    def __init__(self, grids):
+        self._initial = list(grids)
+        self._local = threading.local()
+
+    def _grids(self):
+        grids = getattr(self._local, 'grids', None)
+        if grids is None:
+            grids = self._local.grids = list(self._initial)
+        return grids
+
+    def __getitem__(self, index):
+        return self._grids()[index]
+
+    def __setitem__(self, index, value):
+        self._grids()[index] = value
+
+    def __len__(self):
+        return len(self._initial)
+
+
+class TorchHubBackend(ExportedBackend):
+    """
+    Eager YOLOv5 model loaded through torch.hub.
+
+    Runs the raw model under the shared letterbox/NMS pipeline instead of
+    AutoShape's __call__, whose confidence threshold is an attribute of the
+    model (`model.conf`) and so cannot differ between concurrent requests.
+    The letterbox reproduces AutoShape's, so detections are unchanged.
+    """
+
+    name = 'torch'
+    fixed_batch = None
+    rect = True
+
+    def __init__(self, model, img_size=640):
+        configure_torch_threads()
+
+        self.model = model
+        self.names = model.names
+        self.img_size = img_size
+        # A tensor of per-level strides, or an int for DetectMultiBackend
+        self.stride = int(model.stride.max()) if hasattr(model.stride, 'max') else int(model.stride)
+
+        for module in model.modules():
+            if hasattr(module, 'anchor_grid') and isinstance(module.grid, list):
+                module.grid = ThreadLocalGrids(module.grid)
+                module.anchor_grid = ThreadLocalGrids(module.anchor_grid)
+
+    def forward(self, batch):
+        import torch
+
+        with torch.no_grad():
+            # AutoShape.model: the DetectionModel, or DetectMultiBackend for
+            # models loaded with 'custom'
+            output = self.model.model(torch.from_numpy(batch))
+        if isinstance(output, (list, tuple)):
+            output = output[0]
+        return output.numpy()
+
+
+def load_exported_backend(model_dir, backend, model_file=None):
+    """
+    Load an exported model from the model directory.
+
+    Args:
+        model_dir: Directory containing the exported model
+        backend: 'onnx' or 'torchscript'
+        model_file: File name inside model_dir (default: best.onnx / best.torchscript)
+
+    Returns:
+        ExportedBackend
+    """
+    if backend == 'onnx':
+        return OnnxBackend(os.path.join(model_dir, model_file or 'best.onnx'))
+    if backend == 'torchscript':
+        return TorchScriptBackend(os.path.join(model_dir, model_file or 'best.torchscript'))
+    raise ValueError(f"Unsupported inference backend: {backend}")
@@ -0,0 +1,888 @@
+"""
+Local Inference Benchmark Script
+Runs the SageMaker handlers in inference.py on CPU against synthetic blueprints
+"""
+import argparse
+import io
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'data'))
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / 'backend'))
+
+import inference
+from download_sample_data import generate_synthetic_data
+from postprocess import format_predictions
+from pdf_pages import pdf_batch_size
+
+CLASS_NAMES = ['wall', 'door', 'window', 'room', 'stair', 'furniture', 'fixture']
+
+
+def print_header(title):
+    print(f"\n{'='*60}")
+    print(title)
+    print(f"{'='*60}")
+
+
+def synthetic_image_bytes(num_images):
+    """
+    Generate synthetic blueprints and return them as PNG bytes
+
+    Args:
+        num_images: Number of images to generate
+
+    Returns:
+        list: PNG-encoded images
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        generate_synthetic_data(temp_dir, num_images)
+        paths = sorted(Path(temp_dir).glob('images/*/*.png'))
+        return [path.read_bytes() for path in paths]
+
+
+def synthetic_sheet(cols, rows):
+    """
+    Stitch synthetic blueprints into one large-format sheet
+
+    Args:
+        cols: Blueprints per row
+        rows: Blueprints per column
+
+    Returns:
+        tuple: (PNG bytes, list of (class, x1, y1, x2, y2) ground-truth boxes)
+    """
+    from PIL import Image
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        generate_synthetic_data(temp_dir, cols * rows)
+        paths = sorted(Path(temp_dir).glob('images/*/*.png'))
+
+        tile_width, tile_height = Image.open(paths[0]).size
+        sheet = Image.new('RGB', (tile_width * cols, tile_height * rows), color='white')
+        boxes = []
+        for index, path in enumerate(paths):
+            x, y = (index % cols) * tile_width, (index // cols) * tile_height
+            sheet.paste(Image.open(path), (x, y))
+
+            label_path = path.parent.parent.parent / 'labels' / path.parent.name / f'{path.stem}.txt'
+            for line in label_path.read_text().splitlines():
+                cls, cx, cy, w, h = (float(v) for v in line.split())
+                cx, cy, w, h = cx * tile_width, cy * tile_height, w * tile_width, h * tile_height
+                boxes.append((int(cls), x + cx - w / 2, y + cy - h / 2, x + cx + w / 2, y + cy + h / 2))
+
+    buffer = io.BytesIO()
+    sheet.save(buffer, format='PNG')
+    return buffer.getvalue(), boxes
+
+
+def detection_recall(detections, boxes, iou_threshold=0.5):
+    """
+    Fraction of ground-truth boxes matched by a detection of the same class
+
+    Returns:
+        dict: Recall by class name, plus 'all'
+    """
+    unmatched = list(detections)
+    hits = {}
+    for cls, x1, y1, x2, y2 in boxes:
+        name = CLASS_NAMES[cls]
+        truth = {'x': x1, 'y': y1, 'width': x2 - x1, 'height': y2 - y1}
+        candidates = [
+            (box_iou(truth, d['boundingBox']), i) for i, d in enumerate(unmatched) if d['class'] == name
+        ]
+        iou, index = max(candidates, default=(0, None))
+        matched = iou >= iou_threshold
+        if matched:
+            unmatched.pop(index)
+        hits.setdefault(name, []).append(matched)
+        hits.setdefault('all', []).append(matched)
+    return {name: sum(values) / len(values) for name, values in hits.items()}
+
+
+def benchmark_tiling(model, grids, repeats, confidence):
+    """
+    Compare whole-image and tiled inference on large synthetic sheets
+
+    Args:
+        model: Loaded model from inference.model_fn
+        grids: (cols, rows) sheet layouts of 800x600 blueprints
+        repeats: Timed runs per mode
+        confidence: Confidence threshold
+    """
+    print_header(f"Tiled Inference (tile {inference.TILE_SIZE}px, overlap {inference.TILE_OVERLAP}px)")
+    print(f"{'Sheet':>12} {'Mode':>7} {'Latency':>10} {'Detections':>11} "
+          f"{'Recall':>7} {'door':>6} {'window':>7}")
+
+    tile_threshold = inference.TILE_THRESHOLD or 2048
+    for cols, rows in grids:
+        sheet, boxes = synthetic_sheet(cols, rows)
+        request = {'image_bytes': sheet, 'confidence': confidence}
+
+        for mode, threshold in (('whole', 0), ('tiled', tile_threshold)):
+            inference.TILE_THRESHOLD = threshold
+            runs = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                result = inference.predict_fn(request, model)
+                runs.append(time.perf_counter() - start)
+
+            recall = detection_recall(result['detections'], boxes)
+            width, height = result['dimensions']['width'], result['dimensions']['height']
+            print(f"{f'{width}x{height}':>12} {mode:>7} {statistics.median(runs):>9.2f}s "
+                  f"{result['totalRooms']:>11} {recall.get('all', 0):>7.1%} "
+                  f"{recall.get('door', 0):>6.1%} {recall.get('window', 0):>7.1%}")
+
+    inference.TILE_THRESHOLD = tile_threshold
+
+
+def read_peak_rss_mb():
+    """Peak resident memory of this process (VmHWM) in MB"""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def read_rss_mb():
+    """Current resident memory of this process (VmRSS) in MB"""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def measure_ingest(image_bytes, mode, draft_size):
+    """
+    Decode one image from a local S3 stand-in and report the peak memory
+    the request added. Runs in a fresh process per measurement.
+    """
+    import gc
+    from PIL import Image
+
+    from ingest import open_s3_image
+    from local_aws import LocalS3Client
+
+    s3 = LocalS3Client()
+    s3.put_object(Bucket='benchmark', Key='sheet', Body=image_bytes)
+    del image_bytes
+    gc.collect()
+
+    # Reset the peak (VmHWM) to the current RSS
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')
+    baseline = read_rss_mb()
+
+    start = time.perf_counter()
+    if mode == 'read':
+        # Previous path: whole object in memory, then decode
+        body = s3.get_object(Bucket='benchmark', Key='sheet')['Body'].read()
+        image = Image.open(io.BytesIO(body))
+        image.load()
+    else:
+        image = open_s3_image(s3, 'benchmark', 'sheet', draft_size if mode == 'draft' else 0)
+    elapsed = time.perf_counter() - start
+
+    return {'peak_mb': read_peak_rss_mb() - baseline, 'seconds': elapsed, 'size': image.size}
+
+
+def benchmark_ingest(grids, formats, draft_size, scan_noise):
+    """
+    Peak RSS per request for read()+BytesIO decoding vs streaming decoding
+
+    Args:
+        grids: (cols, rows) sheet layouts of 800x600 blueprints
+        formats: Image formats to test
+        draft_size: INFERENCE_DRAFT_SIZE for the draft run
+        scan_noise: Standard deviation of grey-level noise added to mimic
+            scanned sheets, which compress far worse than clean renders
+    """
+    import multiprocessing
+
+    import numpy as np
+    from PIL import Image
+
+    print_header(f"S3 Ingest Peak Memory (local S3 stand-in, draft {draft_size}px)")
+    print(f"{'Sheet':>12} {'Format':>7} {'Size':>8} {'Mode':>7} {'Peak RSS':>10} {'Time':>8} {'Decoded':>12}")
+
+    context = multiprocessing.get_context('spawn')
+    for cols, rows in grids:
+        sheet, _ = synthetic_sheet(cols, rows)
+        image = Image.open(io.BytesIO(sheet)).convert('RGB')
+        if scan_noise:
+            pixels = np.asarray(image, dtype=np.int16)
+            noise = np.random.default_rng(0).normal(0, scan_noise, pixels.shape[:2])[..., None]
+            image = Image.fromarray(np.clip(pixels + noise, 0, 255).astype(np.uint8))
+        for fmt in formats:
+            buffer = io.BytesIO()
+            image.save(buffer, format=fmt)
+            data = buffer.getvalue()
+
+            modes = ('read', 'stream', 'draft') if fmt == 'JPEG' else ('read', 'stream')
+            for mode in modes:
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    result = executor.submit(measure_ingest, data, mode, draft_size).result()
+                width, height = result['size']
+                print(f"{f'{image.width}x{image.height}':>12} {fmt:>7} {len(data) / 1024 ** 2:>6.1f}MB "
+                      f"{mode:>7} {result['peak_mb']:>8.1f}MB {result['seconds'] * 1000:>6.0f}ms "
+                      f"{f'{width}x{height}':>12}")
+
+
+def synthetic_pdf(num_pages, cols, rows, resolution=100):
+    """
+    Build a multi-page PDF of synthetic sheets
+
+    Pages are the same stitched blueprints in a different order, so every
+    page has its own content without generating num_pages sheets.
+
+    Args:
+        num_pages: Pages in the document
+        cols: Blueprints per row of a page
+        rows: Blueprints per column of a page
+        resolution: DPI the sheets are embedded at (sets the page size)
+
+    Returns:
+        bytes: PDF file
+    """
+    import random
+
+    from PIL import Image
+
+    tiles = [Image.open(io.BytesIO(data)).convert('RGB') for data in synthetic_image_bytes(cols * rows)]
+    tile_width, tile_height = tiles[0].size
+    rng = random.Random(0)
+
+    pages = []
+    for _ in range(num_pages):
+        order = rng.sample(tiles, len(tiles))
+        page = Image.new('RGB', (tile_width * cols, tile_height * rows), color='white')
+        for index, tile in enumerate(order):
+            page.paste(tile, ((index % cols) * tile_width, (index // cols) * tile_height))
+        pages.append(page)
+
+    buffer = io.BytesIO()
+    pages[0].save(buffer, format='PDF', save_all=True, append_images=pages[1:], resolution=resolution)
+    return buffer.getvalue()
+
+
+def measure_pdf_ingest(path, dpi, workers, max_pages, batch_size, inference_ms):
+    """
+    Rasterize a PDF and pass its pages to a stand-in for inference,
+    reporting throughput and the memory the pages added in this process.
+    Runs in a fresh process per measurement.
+
+    workers=0 renders each page in this process before inferring on it,
+    as a single-threaded baseline.
+    """
+    import gc
+
+    import pdf_pages
+
+    gc.collect()
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')
+    baseline = read_rss_mb()
+
+    def infer(images):
+        # Model stand-in: holds the batch for inference_ms per page
+        time.sleep(inference_ms * len(images) / 1000)
+
+    start = time.perf_counter()
+    pages, pixels, held = 0, 0, 0
+    if workers:
+        executor = pdf_pages.create_executor(workers)
+        # Start the workers before timing, as a serving process would have
+        executor.submit(pdf_pages.page_count, path).result()
+        start = time.perf_counter()
+        for images in pdf_pages.iter_page_batches(path, executor, dpi, batch_size, max_pages):
+            infer(images)
+            pages += len(images)
+            pixels += sum(image.width * image.height for image in images)
+        executor.shutdown()
+    else:
+        for index in range(pdf_pages.page_count(path)):
+            image = pdf_pages.render_page(path, index, dpi)
+            infer([image])
+            pages += 1
+            pixels += image.width * image.height
+            del image
+    elapsed = time.perf_counter() - start
+
+    return {
+        'pages': pages,
+        'seconds': elapsed,
+        'peak_mb': read_peak_rss_mb() - baseline,
+        'page_mb': pixels * 3 / pages / 1024 ** 2 if pages else 0
+    }
+
+
+def benchmark_pdf(num_pages, dpi, workers, max_pages, batch_size, inference_ms):
+    """
+    Page rasterization throughput and memory for multi-page PDFs
+
+    Args:
+        num_pages: Pages in the generated PDF
+        dpi: Rendering resolution
+        workers: Process pool sizes to compare (0 = render in process)
+        max_pages: Pages in flight (K) to compare
+        batch_size: Pages per inference batch, capped as by predict_pdf
+        inference_ms: Simulated inference time per page
+    """
+    import multiprocessing
+
+    print_header(f"PDF Ingest ({num_pages} pages at {dpi} DPI, inference stand-in {inference_ms:.0f}ms/page)")
+
+    with tempfile.NamedTemporaryFile(suffix='.pdf') as f:
+        f.write(synthetic_pdf(num_pages, 3, 3))
+        f.flush()
+        print(f"PDF: {Path(f.name).stat().st_size / 1024 ** 2:.1f}MB")
+        print(f"{'Workers':>8} {'K':>4} {'Batch':>6} {'Time':>8} {'Pages/s':>8} {'Page':>8} {'Peak RSS':>10}")
+
+        runs = [(0, 1)] + [(w, k) for w in workers if w for k in max_pages]
+        context = multiprocessing.get_context('spawn')
+        for pool_size, k in runs:
+            # The measuring process must not be a daemon: it starts its own pool
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(measure_pdf_ingest, f.name, dpi, pool_size, k,
+                                         pdf_batch_size(batch_size, k), inference_ms).result()
+            print(f"{pool_size or 'inline':>8} {k:>4} {pdf_batch_size(batch_size, k):>6} {result['seconds']:>7.2f}s "
+                  f"{result['pages'] / result['seconds']:>8.1f} {result['page_mb']:>6.1f}MB "
+                  f"{result['peak_mb']:>8.1f}MB")
+
+
+def benchmark_preprocess(model, grids, formats, repeats, scan_noise):
+    """
+    Latency and S3 bytes per request with and without preprocessing
+
+    Runs s3_uri requests against the in-memory S3 stand-in in four modes:
+    decoding the original at full size (off), shrinking it to the model
+    input size on load (resize), the first request that also stores the
+    model-size copy (cold), and later requests reading that copy (warm).
+
+    Args:
+        model: Loaded model from inference.model_fn
+        grids: (cols, rows) sheet layouts of 800x600 blueprints
+        formats: Image formats the originals are stored in
+        repeats: Timed requests per mode
+        scan_noise: Grey-level noise added to mimic scanned sheets
+    """
+    import numpy as np
+    from PIL import Image
+
+    from local_aws import LocalS3Client
+
+    size = inference.PREPROCESS_SIZE or 640
+    print_header(f"Preprocessing ({size}px model-size copy, local S3 stand-in)")
+    print(f"{'Sheet':>11} {'Format':>7} {'Mode':>7} {'Load':>8} {'Latency':>9} {'S3 read':>9} "
+          f"{'S3 written':>11} {'Matched':>9}")
+
+    s3 = LocalS3Client()
+    inference._s3_client = s3
+
+    # Time the load stage (download, decode, preprocessing) on its own
+    load_times = []
+    load_images = inference.load_images
+
+    def timed_load_images(input_data):
+        start = time.perf_counter()
+        images = load_images(input_data)
+        load_times.append(time.perf_counter() - start)
+        return images
+
+    inference.load_images = timed_load_images
+    for cols, rows in grids:
+        sheet, _ = synthetic_sheet(cols, rows)
+        image = Image.open(io.BytesIO(sheet)).convert('RGB')
+        if scan_noise:
+            pixels = np.asarray(image, dtype=np.int16)
+            noise = np.random.default_rng(0).normal(0, scan_noise, pixels.shape[:2])[..., None]
+            image = Image.fromarray(np.clip(pixels + noise, 0, 255).astype(np.uint8))
+
+        for fmt in formats:
+            buffer = io.BytesIO()
+            image.save(buffer, format=fmt)
+            key = f"uploads/benchmark/{cols}x{rows}/original.{fmt.lower()}"
+            copy_key = inference.preprocessed_key(key, size)
+            s3.put_object(Bucket='benchmark', Key=key, Body=buffer.getvalue())
+            request = {'s3_uri': f"s3://benchmark/{key}", 'confidence': 0.25}
+
+            baseline = None
+            for mode in ('off', 'resize', 'cold', 'warm'):
+                inference.PREPROCESS_SIZE = 0 if mode == 'off' else size
+                inference.PREPROCESS_CACHE = mode in ('cold', 'warm')
+                runs, read, written = [], 0, 0
+                load_times.clear()
+                for _ in range(repeats):
+                    if mode == 'cold':
+                        s3.delete_object(Bucket='benchmark', Key=copy_key)
+                    sent = s3.bytes_sent
+                    start = time.perf_counter()
+                    result = inference.predict_fn(request, model)
+                    runs.append(time.perf_counter() - start)
+                    read += s3.bytes_sent - sent
+                    if mode == 'cold' and copy_key in s3.objects['benchmark']:
+                        written += len(s3.objects['benchmark'][copy_key]['Body'])
+
+                baseline = baseline or result
+                match = compare_detections(baseline, result, iou_threshold=0.9)
+                print(f"{f'{image.width}x{image.height}':>11} {fmt:>7} {mode:>7} "
+                      f"{statistics.median(load_times) * 1000:>6.1f}ms {statistics.median(runs) * 1000:>7.0f}ms {read / repeats / 1024:>7.0f}KB "
+                      f"{written / repeats / 1024:>9.0f}KB {match['matched']:>4}/{match['expected']:<4}")
+
+    inference.PREPROCESS_SIZE = size
+    inference.load_images = load_images
+
+
+def benchmark_batch(model, batch_sizes, num_images):
+    """
+    Measure CPU throughput of predict_fn for different batch sizes
+
+    Args:
+        model: Loaded model from inference.model_fn
+        batch_sizes: Batch sizes to compare
+        num_images: Images processed per batch size
+    """
+    images = synthetic_image_bytes(num_images)
+
+    print_header(f"Batch Throughput ({num_images} images, CPU)")
+    print(f"{'Batch size':>10} {'Total':>10} {'Per image':>12} {'Images/s':>10}")
+
+    baseline = None
+    for batch_size in batch_sizes:
+        inference.MAX_BATCH_SIZE = batch_size
+
+        # Warm up once so lazy initialisation is not measured
+        inference.predict_fn({'images_bytes': images[:batch_size], 'confidence': 0.5}, model)
+
+        start = time.perf_counter()
+        for offset in range(0, len(images), batch_size):
+            output = inference.predict_fn(
+                {'images_bytes': images[offset:offset + batch_size], 'confidence': 0.5}, model
+            )
+            assert output['totalImages'] == len(images[offset:offset + batch_size])
+        elapsed = time.perf_counter() - start
+
+        throughput = len(images) / elapsed
+        baseline = baseline or throughput
+        print(f"{batch_size:>10} {elapsed:>9.2f}s {elapsed / len(images) * 1000:>10.1f}ms "
+              f"{throughput:>10.2f}  ({throughput / baseline:.2f}x)")
+
+
+class SharedConfidenceBackend:
+    """The torch backend as it was: confidence set on the shared AutoShape model"""
+
+    def __init__(self, model):
+        self.model = model
+        self.names = model.names
+
+    def predict(self, images, confidence):
+        self.model.conf = confidence
+        results = self.model(images)
+        return [image_predictions.cpu().numpy() for image_predictions in results.xyxy]
+
+
+def benchmark_concurrency(model, concurrency, requests_per_client, confidences, threads, batch_images, chunk_size):
+    """
+    Check per-call thresholds under concurrent predict calls, then time the
+    serving threads on the chunks of one batch request
+
+    The model server gives a worker one request at a time, so concurrent
+    calls on the model only come from the serving threads running one
+    request's chunks. The first part still calls it from many threads at
+    different thresholds, to show no call sees another's threshold; it
+    reports correctness only. The second part is what serving threads
+    change on an endpoint: the latency of a request split into chunks.
+
+    Args:
+        model: Loaded model from inference.model_fn
+        concurrency: Threads calling predict_fn at once
+        requests_per_client: Calls made by each thread
+        confidences: Thresholds the threads cycle through
+        threads: INFERENCE_SERVING_THREADS for the threaded batch run
+        batch_images: Images in the batch request
+        chunk_size: INFERENCE_MAX_BATCH_SIZE for the batch request
+    """
+    images = synthetic_image_bytes(max(concurrency, batch_images))
+    plan = [
+        [(index, confidences[(index + r) % len(confidences)]) for r in range(requests_per_client)]
+        for index in range(concurrency)
+    ]
+
+    # Expected response for every (image, threshold) pair, one call at a time
+    inference.SERVING_THREADS = 1
+    inference._executor = None
+    expected = {
+        (index, confidence): inference.predict_fn({'image_bytes': images[index], 'confidence': confidence}, model)
+        for requests in plan for index, confidence in requests
+    }
+
+    def client(requests, backend):
+        wrong = 0
+        for index, confidence in requests:
+            output = inference.predict_fn({'image_bytes': images[index], 'confidence': confidence}, backend)
+            stats = compare_detections(expected[index, confidence], output)
+            below = any(d['confidence'] <= confidence for d in output['detections'])
+            if below or not stats['matched'] == stats['expected'] == stats['actual']:
+                wrong += 1
+        return wrong
+
+    backends = [('per-call', model)]
+    if hasattr(getattr(model, 'model', None), 'conf'):
+        # The same load on the old shared-threshold backend
+        backends.append(('shared conf', SharedConfidenceBackend(model.model)))
+
+    print_header(f"Thresholds under concurrency ({concurrency} threads x {requests_per_client} calls, "
+                 f"confidences {', '.join(str(c) for c in confidences)})")
+    print(f"{'Backend':>12} {'Calls':>7} {'Wrong':>7}")
+    for name, backend in backends:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            wrong = sum(executor.map(lambda requests: client(requests, backend), plan))
+        print(f"{name:>12} {concurrency * requests_per_client:>7} {wrong:>7}")
+        if backend is model:
+            assert wrong == 0, f"{wrong} {name} responses differ from the single-threaded run"
+
+    request = {'images_bytes': images[:batch_images], 'confidence': confidences[0]}
+    inference.MAX_BATCH_SIZE = chunk_size
+    chunks = -(-batch_images // chunk_size)
+
+    print_header(f"Serving threads on one request ({batch_images} images, {chunks} chunks of {chunk_size})")
+    print(f"{'Threads':>8} {'p50':>10} {'Images/s':>10}")
+    baseline = reference = None
+    for serving_threads in (1, threads):
+        inference.SERVING_THREADS = serving_threads
+        inference._executor = None
+        output = inference.predict_fn(request, model)
+        reference = reference or output
+        assert output['results'] == reference['results'], "threaded chunks changed the results"
+
+        runs = []
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            inference.predict_fn(request, model)
+            runs.append(time.perf_counter() - start)
+        latency = statistics.median(runs)
+        baseline = baseline or latency
+        print(f"{serving_threads:>8} {latency * 1000:>8.0f}ms {batch_images / latency:>10.2f}  "
+              f"({baseline / latency:.2f}x)")
+
+
+def box_iou(a, b):
+    """IoU of two detection bounding boxes"""
+    ax2, ay2 = a['x'] + a['width'], a['y'] + a['height']
+    bx2, by2 = b['x'] + b['width'], b['y'] + b['height']
+    inter_w = max(0, min(ax2, bx2) - max(a['x'], b['x']))
+    inter_h = max(0, min(ay2, by2) - max(a['y'], b['y']))
+    intersection = inter_w * inter_h
+    union = a['width'] * a['height'] + b['width'] * b['height'] - intersection
+    return intersection / union if union else 1.0
+
+
+def compare_detections(expected, actual, iou_threshold=0.9):
+    """
+    Match two backends' detections for one image
+
+    Each expected detection is paired with the unmatched actual detection of
+    the same class that overlaps it most.
+
+    Returns:
+        dict: matched/expected/actual counts and the largest confidence
+            difference and smallest IoU among matched pairs
+    """
+    unmatched = list(actual['detections'])
+    matched, max_conf_diff, min_iou = 0, 0.0, 1.0
+    for detection in expected['detections']:
+        candidates = [
+            (box_iou(detection['boundingBox'], other['boundingBox']), index)
+            for index, other in enumerate(unmatched) if other['class'] == detection['class']
+        ]
+        if not candidates:
+            continue
+        iou, index = max(candidates)
+        if iou < iou_threshold:
+            continue
+        other = unmatched.pop(index)
+        matched += 1
+        max_conf_diff = max(max_conf_diff, abs(other['confidence'] - detection['confidence']))
+        min_iou = min(min_iou, iou)
+
+    return {
+        'matched': matched,
+        'expected': len(expected['detections']),
+        'actual': len(actual['detections']),
+        'max_conf_diff': max_conf_diff,
+        'min_iou': min_iou
+    }
+
+
+def benchmark_backends(model_dir, backends, num_images, batch_sizes, repeats, confidence, min_match):
+    """
+    Check exported backends against eager torch, then compare CPU latency
+    and throughput
+
+    Args:
+        model_dir: Directory containing best.pt and its exports
+        backends: Exported backends to test (onnx, torchscript)
+        num_images: Synthetic blueprints used for parity and timing
+        batch_sizes: Images per request for the timing runs
+        repeats: Timed passes over the images per batch size
+        confidence: Confidence threshold for the parity check
+        min_match: Fraction of torch detections each backend must reproduce
+    """
+    images = synthetic_image_bytes(num_images)
+
+    models = {'torch': inference.model_fn(model_dir)}
+    for backend in backends:
+        models[backend] = inference.load_exported_backend(model_dir, backend, inference.MODEL_FILE)
+        inference.warm_up(models[backend])
+
+    # Parity: the same request through every backend gives the same detections
+    print_header(f"Backend Parity ({num_images} images, confidence {confidence})")
+    request = {'images_bytes': images, 'confidence': confidence}
+    reference = inference.predict_fn(request, models['torch'])['results']
+    print(f"{'Backend':>12} {'Detections':>11} {'Matched':>9} {'Max conf diff':>14} {'Min IoU':>8}")
+    print(f"{'torch':>12} {sum(r['totalRooms'] for r in reference):>11}")
+    for backend in backends:
+        results = inference.predict_fn(request, models[backend])['results']
+        assert [set(r) for r in results] == [set(r) for r in reference], "response schema differs"
+        assert [r['dimensions'] for r in results] == [r['dimensions'] for r in reference]
+
+        stats = [compare_detections(e, a) for e, a in zip(reference, results)]
+        matched = sum(s['matched'] for s in stats)
+        expected = sum(s['expected'] for s in stats)
+        print(f"{backend:>12} {sum(s['actual'] for s in stats):>11} {matched:>9} "
+              f"{max(s['max_conf_diff'] for s in stats):>14.5f} {min(s['min_iou'] for s in stats):>8.3f}")
+        assert matched >= min_match * expected, f"{backend} reproduces only {matched}/{expected} detections"
+
+    # Latency and throughput at the endpoint's default confidence
+    print_header(f"Backend Latency ({num_images} images x {repeats}, CPU)")
+    print(f"{'Backend':>12} {'Batch':>6} {'p50':>10} {'p95':>10} {'Images/s':>10}")
+    for batch_size in batch_sizes:
+        inference.MAX_BATCH_SIZE = batch_size
+        baseline = None
+        for name, model in models.items():
+            latencies = []
+            start = time.perf_counter()
+            for _ in range(repeats):
+                for offset in range(0, len(images), batch_size):
+                    request_start = time.perf_counter()
+                    inference.predict_fn({'images_bytes': images[offset:offset + batch_size]}, model)
+                    latencies.append(time.perf_counter() - request_start)
+            elapsed = time.perf_counter() - start
+
+            latencies.sort()
+            throughput = len(images) * repeats / elapsed
+            baseline = baseline or throughput
+            p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+            print(f"{name:>12} {batch_size:>6} {statistics.median(latencies) * 1000:>8.0f}ms "
+                  f"{p95 * 1000:>8.0f}ms {throughput:>10.2f}  ({throughput / baseline:.2f}x)")
+
+
+def legacy_format_predictions(predictions, names, image_size):
+    """The previous post-processing: YOLOv5's pandas() conversion plus iterrows()"""
+    import pandas as pd
+
+    rows = [row[:5] + [int(row[5]), names[int(row[5])]] for row in predictions.tolist()]
+    frame = pd.DataFrame(rows, columns=['xmin', 'ymin', 'xmax', 'ymax', 'confidence', 'class', 'name'])
+
+    detections = []
+    for _, row in frame.iterrows():
+        detections.append({
+            'roomId': len(detections) + 1,
+            'boundingBox': {
+                'x': int(row['xmin']),
+                'y': int(row['ymin']),
+                'width': int(row['xmax'] - row['xmin']),
+                'height': int(row['ymax'] - row['ymin'])
+            },
+            'confidence': float(row['confidence']),
+            'class': row['name'],
+            'area': int((row['xmax'] - row['xmin']) * (row['ymax'] - row['ymin']))
+        })
+
+    width, height = image_size
+    return {
+        'detections': detections,
+        'dimensions': {'width': width, 'height': height},
+        'totalRooms': len(detections),
+        'avgConfidence': sum(d['confidence'] for d in detections) / len(detections) if detections else 0
+    }
+
+
+def synthetic_predictions(num_boxes, image_size=(7000, 5000), seed=0):
+    """Random float32 prediction rows shaped like YOLOv5 output"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    width, height = image_size
+    x1 = rng.uniform(0, width - 50, num_boxes)
+    y1 = rng.uniform(0, height - 50, num_boxes)
+    return np.stack([
+        x1,
+        y1,
+        x1 + rng.uniform(2, 50, num_boxes),
+        y1 + rng.uniform(2, 50, num_boxes),
+        rng.uniform(0.25, 1.0, num_boxes),
+        rng.integers(0, len(CLASS_NAMES), num_boxes)
+    ], axis=1).astype(np.float32)
+
+
+def benchmark_postprocess(box_counts, repeats):
+    """
+    Compare iterrows() post-processing with the vectorized version
+
+    Args:
+        box_counts: Numbers of boxes per image to test
+        repeats: Timed runs per box count
+    """
+    print_header("Detection Post-processing")
+    print(f"{'Boxes':>8} {'iterrows':>12} {'vectorized':>12} {'Speedup':>9}")
+
+    image_size = (7000, 5000)
+    for num_boxes in box_counts:
+        predictions = synthetic_predictions(num_boxes, image_size)
+
+        expected = legacy_format_predictions(predictions, CLASS_NAMES, image_size)
+        actual = format_predictions(predictions, CLASS_NAMES, image_size)
+        assert actual['detections'] == expected['detections'], "vectorized output differs"
+
+        timings = {}
+        for name, fn in (('legacy', legacy_format_predictions), ('vectorized', format_predictions)):
+            runs = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                fn(predictions, CLASS_NAMES, image_size)
+                runs.append(time.perf_counter() - start)
+            timings[name] = statistics.median(runs)
+
+        print(f"{num_boxes:>8,} {timings['legacy'] * 1000:>10.2f}ms {timings['vectorized'] * 1000:>10.2f}ms "
+              f"{timings['legacy'] / timings['vectorized']:>8.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark inference.py handlers locally')
+    parser.add_argument('--model-dir', type=str, default='.',
+                        help='Directory containing best.pt')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    batch_parser = subparsers.add_parser('batch', help='Throughput for different batch sizes')
+    batch_parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8, 16],
+                              help='Batch sizes to compare')
+    batch_parser.add_argument('--num-images', type=int, default=32,
+                              help='Images processed per batch size')
+
+    concurrency_parser = subparsers.add_parser('concurrency', help='Per-call thresholds under concurrency, serving threads per request')
+    concurrency_parser.add_argument('--concurrency', type=int, default=8,
+                                    help='Threads calling predict_fn at once')
+    concurrency_parser.add_argument('--requests', type=int, default=4,
+                                    help='Calls per thread, and timed runs of the batch request')
+    concurrency_parser.add_argument('--confidences', type=float, nargs='+', default=[0.25, 0.5, 0.75],
+                                    help='Confidence thresholds the threads cycle through')
+    concurrency_parser.add_argument('--threads', type=int, default=4,
+                                    help='INFERENCE_SERVING_THREADS for the threaded batch run')
+    concurrency_parser.add_argument('--batch-images', type=int, default=16,
+                                    help='Images in the timed batch request')
+    concurrency_parser.add_argument('--chunk-size', type=int, default=4,
+                                    help='INFERENCE_MAX_BATCH_SIZE for the timed batch request')
+
+    postprocess_parser = subparsers.add_parser('postprocess', help='iterrows vs vectorized post-processing')
+    postprocess_parser.add_argument('--boxes', type=int, nargs='+', default=[10, 1000, 10000],
+                                    help='Numbers of boxes per image')
+    postprocess_parser.add_argument('--repeats', type=int, default=5,
+                                    help='Timed runs per box count')
+
+    backends_parser = subparsers.add_parser('backends', help='Parity and CPU latency of exported backends vs torch')
+    backends_parser.add_argument('--backends', type=str, nargs='+', default=['onnx', 'torchscript'],
+                                 choices=['onnx', 'torchscript'],
+                                 help='Exported backends to compare with torch')
+    backends_parser.add_argument('--num-images', type=int, default=8,
+                                 help='Synthetic blueprints per run')
+    backends_parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8],
+                                 help='Images per request for the timing runs')
+    backends_parser.add_argument('--repeats', type=int, default=3,
+                                 help='Timed passes over the images')
+    backends_parser.add_argument('--confidence', type=float, default=0.25,
+                                 help='Confidence threshold for the parity check')
+    backends_parser.add_argument('--min-match', type=float, default=0.99,
+                                 help='Fraction of torch detections each backend must match')
+
+    tiling_parser = subparsers.add_parser('tiling', help='Whole-image vs tiled inference on large sheets')
+    tiling_parser.add_argument('--grids', type=str, nargs='+', default=['3x3', '9x9'],
+                               help='Sheet layouts as COLSxROWS of 800x600 blueprints')
+    tiling_parser.add_argument('--repeats', type=int, default=1,
+                               help='Timed runs per mode')
+    tiling_parser.add_argument('--confidence', type=float, default=0.25,
+                               help='Confidence threshold')
+
+    ingest_parser = subparsers.add_parser('ingest', help='Peak memory of S3 image decoding')
+    ingest_parser.add_argument('--grids', type=str, nargs='+', default=['3x3', '9x9'],
+                               help='Sheet layouts as COLSxROWS of 800x600 blueprints')
+    ingest_parser.add_argument('--formats', type=str, nargs='+', default=['JPEG', 'PNG'],
+                               help='Image formats')
+    ingest_parser.add_argument('--draft-size', type=int, default=640,
+                               help='INFERENCE_DRAFT_SIZE for the JPEG draft run')
+    ingest_parser.add_argument('--scan-noise', type=float, default=8,
+                               help='Noise added to mimic scanned sheets (0 = clean render)')
+
+    preprocess_parser = subparsers.add_parser('preprocess', help='Latency and S3 bytes with model-size copies')
+    preprocess_parser.add_argument('--grids', type=str, nargs='+', default=['1x1', '2x2'],
+                                   help='Sheet layouts as COLSxROWS of 800x600 blueprints')
+    preprocess_parser.add_argument('--formats', type=str, nargs='+', default=['PNG', 'JPEG'],
+                                   help='Image formats')
+    preprocess_parser.add_argument('--repeats', type=int, default=5,
+                                   help='Timed requests per mode')
+    preprocess_parser.add_argument('--scan-noise', type=float, default=8,
+                                   help='Noise added to mimic scanned sheets (0 = clean render)')
+
+    pdf_parser = subparsers.add_parser('pdf', help='Multi-page PDF rasterization throughput and memory')
+    pdf_parser.add_argument('--pages', type=int, default=50,
+                            help='Pages in the generated PDF')
+    pdf_parser.add_argument('--dpi', type=int, default=150,
+                            help='Rendering resolution')
+    pdf_parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4],
+                            help='Rendering process pool sizes')
+    pdf_parser.add_argument('--max-pages', type=int, nargs='+', default=[2, 8, 50],
+                            help='Rendered pages held at once (K)')
+    pdf_parser.add_argument('--batch-size', type=int, default=4,
+                            help='Pages per inference batch (capped at half of K)')
+    pdf_parser.add_argument('--inference-ms', type=float, default=100,
+                            help='Simulated inference time per page')
+
+    args = parser.parse_args()
+
+    if args.benchmark == 'postprocess':
+        benchmark_postprocess(args.boxes, args.repeats)
+        sys.exit(0)
+
+    if args.benchmark == 'ingest':
+        grids = [tuple(int(v) for v in grid.split('x')) for grid in args.grids]
+        benchmark_ingest(grids, args.formats, args.draft_size, args.scan_noise)
+        sys.exit(0)
+
+    if args.benchmark == 'pdf':
+        benchmark_pdf(args.pages, args.dpi, args.workers, args.max_pages, args.batch_size, args.inference_ms)
+        sys.exit(0)
+
+    if args.benchmark == 'backends':
+        inference.BACKEND = 'torch'
+        benchmark_backends(args.model_dir, args.backends, args.num_images, args.batch_sizes,
+                           args.repeats, args.confidence, args.min_match)
+        sys.exit(0)
+
+    model = inference.model_fn(args.model_dir)
+
+    if args.benchmark == 'batch':
+        benchmark_batch(model, args.batch_sizes, args.num_images)
+    elif args.benchmark == 'concurrency':
+        benchmark_concurrency(model, args.concurrency, args.requests, args.confidences, args.threads,
+                              args.batch_images, args.chunk_size)
+    elif args.benchmark == 'tiling':
+        grids = [tuple(int(v) for v in grid.split('x')) for grid in args.grids]
+        benchmark_tiling(model, grids, args.repeats, args.confidence)
+    elif args.benchmark == 'preprocess':
+        grids = [tuple(int(v) for v in grid.split('x')) for grid in args.grids]
+        benchmark_preprocess(model, grids, args.formats, args.repeats, args.scan_noise)
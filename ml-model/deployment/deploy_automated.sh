@@ -21,6 +21,7 @@ print_info() { echo -e "${YELLOW}ℹ️  $1${NC}"; }
 
 # Configuration
 MODEL_PATH="../training/runs/train/blueprint_detector/weights/best.pt"
+YOLOV5_DIR="${YOLOV5_DIR:-../training/yolov5}"
 ROLE_ARN_FILE=".sagemaker_role_arn"
 INSTANCE_TYPE="${SAGEMAKER_INSTANCE_TYPE:-ml.m5.large}"
 INSTANCE_COUNT="${SAGEMAKER_INSTANCE_COUNT:-1}"
@@ -60,12 +61,22 @@ echo ""
 
 print_info "This will take 5-10 minutes. Please wait..."
 
+# Vendor the YOLOv5 repository so the endpoint loads the model offline
+VENDOR_ARGS=()
+if [ -f "$YOLOV5_DIR/hubconf.py" ]; then
+    print_info "Packaging YOLOv5 repository from $YOLOV5_DIR"
+    VENDOR_ARGS=(--yolov5-dir "$YOLOV5_DIR")
+else
+    print_info "YOLOv5 repository not found at $YOLOV5_DIR; endpoint will download it on start"
+fi
+
 # Run Python deployment script
 python3 deploy_sagemaker.py \
     --model-path "$MODEL_PATH" \
     --role-arn "$ROLE_ARN" \
     --instance-type "$INSTANCE_TYPE" \
     --instance-count "$INSTANCE_COUNT" \
+    "${VENDOR_ARGS[@]}" \
     2>&1 | tee deployment.log
 
 # Check if deployment succeeded
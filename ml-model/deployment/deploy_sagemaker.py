@@ -12,7 +12,12 @@ def deploy_model(
     role_arn=None,
     instance_type='ml.m5.large',
     instance_count=1,
-    endpoint_name=None
+    endpoint_name=None,
+    yolov5_dir=None,
+    backend='torch',
+    model_file=None,
+    serving_threads=1,
+    intra_op_threads=0
 ):
     """
     Deploy YOLOv5 model to SageMaker endpoint
@@ -23,6 +28,12 @@ def deploy_model(
         instance_type: EC2 instance type for endpoint
         instance_count: Number of instances (for auto-scaling)
         endpoint_name: Custom endpoint name (optional)
+        yolov5_dir: Local YOLOv5 repository to vendor into the archive (optional)
+        backend: Inference backend (torch, onnx or torchscript)
+        model_file: Exported model served by the backend, e.g. best-int8.onnx (optional)
+        serving_threads: Threads running the chunks of one batch, tiled or PDF
+            request in parallel; the model server's worker count is unchanged
+        intra_op_threads: Threads per forward pass (0: runtime default)
     """
 
     # Initialize SageMaker session
@@ -43,7 +54,7 @@ def deploy_model(
 
     # Create model archive
     print("Creating model archive...")
-    model_archive = create_model_archive(model_path)
+    model_archive = create_model_archive(model_path, yolov5_dir)
 
     # Upload model to S3
     print("Uploading model to S3...")
@@ -53,6 +64,14 @@ def deploy_model(
     )
     print(f"Model uploaded to: {s3_model_uri}")
 
+    env = {'INFERENCE_BACKEND': backend}
+    if model_file:
+        env['INFERENCE_MODEL_FILE'] = model_file
+    if serving_threads > 1:
+        env['INFERENCE_SERVING_THREADS'] = str(serving_threads)
+    if intra_op_threads:
+        env['INFERENCE_INTRA_OP_THREADS'] = str(intra_op_threads)
+
     # Create PyTorch model
     print("Creating SageMaker model...")
     pytorch_model = PyTorchModel(
@@ -62,6 +81,7 @@ def deploy_model(
         py_version='py38',
         entry_point='inference.py',
         source_dir='deployment',
+        env=env,
         sagemaker_session=sagemaker_session
     )
 
@@ -69,6 +89,9 @@ def deploy_model(
     print(f"Deploying endpoint: {endpoint_name}")
     print(f"Instance type: {instance_type}")
     print(f"Instance count: {instance_count}")
+    print(f"Inference backend: {backend}" + (f" ({model_file})" if model_file else ""))
+    if serving_threads > 1:
+        print(f"Serving threads: {serving_threads} per request")
 
     predictor = pytorch_model.deploy(
         instance_type=instance_type,
@@ -89,9 +112,14 @@ def deploy_model(
     return predictor, endpoint_name
 
 
-def create_model_archive(model_path):
+def create_model_archive(model_path, yolov5_dir=None):
     """
     Create a tar.gz archive of the model and inference code
+
+    Args:
+        model_path: Local path to trained model weights
+        yolov5_dir: Local YOLOv5 repository to vendor as yolov5/, so the
+            endpoint can build the model without network access
     """
     import tarfile
     import shutil
@@ -103,6 +131,27 @@ def create_model_archive(model_path):
     # Copy model weights
     shutil.copy(model_path, os.path.join(temp_dir, 'best.pt'))
 
+    # Copy TorchScript / ONNX exports and the INT8 variant written next to
+    # the weights by training/export_model.py and training/quantize_model.py
+    for suffix in ('.onnx', '.onnx.data', '-int8.onnx', '.torchscript'):
+        export_path = os.path.splitext(model_path)[0] + suffix
+        if os.path.exists(export_path):
+            shutil.copy(export_path, os.path.join(temp_dir, 'best' + suffix))
+            print(f"Packaged exported model {export_path}")
+
+    # Vendor the YOLOv5 code used by torch.hub.load(..., source='local')
+    if yolov5_dir:
+        if not os.path.isfile(os.path.join(yolov5_dir, 'hubconf.py')):
+            raise ValueError(f"{yolov5_dir} is not a YOLOv5 repository (hubconf.py missing)")
+        shutil.copytree(
+            yolov5_dir,
+            os.path.join(temp_dir, 'yolov5'),
+            ignore=shutil.ignore_patterns('.git', '__pycache__', 'runs', '*.pt', '*.onnx', '*.torchscript')
+        )
+        print(f"Vendored YOLOv5 repository from {yolov5_dir}")
+    else:
+        print("⚠️  No YOLOv5 repository vendored; the endpoint will fetch it through torch.hub")
+
     # Create archive
     archive_path = 'model.tar.gz'
     with tarfile.open(archive_path, 'w:gz') as tar:
@@ -172,6 +221,17 @@ if __name__ == '__main__':
                        help='Custom endpoint name')
     parser.add_argument('--test-image', type=str, default=None,
                        help='S3 URI of test image to validate deployment')
+    parser.add_argument('--yolov5-dir', type=str, default=None,
+                       help='Local YOLOv5 repository to package for offline model loading')
+    parser.add_argument('--backend', type=str, default='torch',
+                       choices=['torch', 'onnx', 'torchscript'],
+                       help='Inference backend (onnx/torchscript need training/export_model.py output)')
+    parser.add_argument('--model-file', type=str, default=None,
+                       help='Exported model to serve, e.g. best-int8.onnx from training/quantize_model.py')
+    parser.add_argument('--serving-threads', type=int, default=1,
+                       help='Threads running the chunks of one request in parallel')
+    parser.add_argument('--intra-op-threads', type=int, default=0,
+                       help='Threads per forward pass (0 = runtime default)')
 
     args = parser.parse_args()
 
@@ -181,7 +241,12 @@ if __name__ == '__main__':
         role_arn=args.role_arn,
         instance_type=args.instance_type,
         instance_count=args.instance_count,
-        endpoint_name=args.endpoint_name
+        endpoint_name=args.endpoint_name,
+        yolov5_dir=args.yolov5_dir,
+        backend=args.backend,
+        model_file=args.model_file,
+        serving_threads=args.serving_threads,
+        intra_op_threads=args.intra_op_threads
     )
 
     # Test endpoint if test image provided
@@ -2,34 +2,184 @@
 SageMaker Inference Script for YOLOv5 Blueprint Detection
 This script is deployed to SageMaker endpoint for model inference.
 """
+import time
+
+_import_start = time.perf_counter()
+
 import json
 import torch
 import io
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.parser import BytesParser
+from email.policy import HTTP
 from PIL import Image
 import boto3
+from botocore.config import Config
+
+from backends import TorchHubBackend, load_exported_backend
+from ingest import (
+    open_image, open_preprocessed, open_s3_image, preprocessed_key, save_preprocessed,
+    scale_to_source, source_size
+)
+from pdf_pages import create_executor, iter_page_batches, pdf_batch_size, remove, spool
+from postprocess import filter_confidence, format_predictions
+from preprocess import downscale
+from tiling import TiledImage
+
+IMPORT_SECONDS = time.perf_counter() - _import_start
 
 # Model will be loaded from /opt/ml/model directory on SageMaker
 MODEL_PATH = '/opt/ml/model/best.pt'
 
-def model_fn(model_dir):
+# Maximum number of images passed to the model in one forward pass
+MAX_BATCH_SIZE = int(os.environ.get('INFERENCE_MAX_BATCH_SIZE', '8'))
+
+# Confidence threshold used when a request does not provide one
+DEFAULT_CONFIDENCE = 0.5
+
+# Threaded serving: the chunks of a large batch, tiled or PDF request run
+# on up to SERVING_THREADS threads against the worker's model (1 runs every
+# chunk on the calling thread). The model server still hands each worker
+# one request at a time
+SERVING_THREADS = int(os.environ.get('INFERENCE_SERVING_THREADS', '1'))
+
+# JPEGs at least twice this size (longest side) are decoded at reduced
+# scale with PIL's draft mode, unless they will be tiled (0 disables)
+DRAFT_SIZE = int(os.environ.get('INFERENCE_DRAFT_SIZE', '640'))
+
+# Preprocessing: images that will not be tiled are shrunk to
+# PREPROCESS_SIZE px (longest side, the model input size) as soon as they
+# are decoded (0 disables). With PREPROCESS_CACHE, that copy of an S3 image
+# is stored next to the original and read by later requests instead; this
+# needs s3:PutObject on the bucket
+PREPROCESS_SIZE = int(os.environ.get('INFERENCE_PREPROCESS_SIZE', '640'))
+PREPROCESS_CACHE = os.environ.get('INFERENCE_PREPROCESS_CACHE', 'false').lower() == 'true'
+
+# Tiled inference: images whose longest side exceeds TILE_THRESHOLD px are
+# cut into TILE_SIZE px tiles overlapping by TILE_OVERLAP px (0 disables).
+# TILE_FULL_IMAGE also runs the downscaled whole image for large elements
+TILE_THRESHOLD = int(os.environ.get('INFERENCE_TILE_THRESHOLD', '2048'))
+TILE_SIZE = int(os.environ.get('INFERENCE_TILE_SIZE', '640'))
+TILE_OVERLAP = int(os.environ.get('INFERENCE_TILE_OVERLAP', '128'))
+TILE_FULL_IMAGE = os.environ.get('INFERENCE_TILE_FULL_IMAGE', 'true').lower() == 'true'
+TILE_MATCH_THRESHOLD = float(os.environ.get('INFERENCE_TILE_MATCH_THRESHOLD', '0.5'))
+
+# PDF ingest: each page is rasterized at PDF_DPI by PDF_WORKERS processes,
+# with at most PDF_MAX_PAGES_IN_FLIGHT rendered pages held at once. Pages
+# over PDF_MAX_PIXELS are rendered at a lower DPI to fit (0 = no limit)
+PDF_DPI = int(os.environ.get('INFERENCE_PDF_DPI', '150'))
+PDF_WORKERS = int(os.environ.get('INFERENCE_PDF_WORKERS', str(min(4, os.cpu_count() or 1))))
+PDF_MAX_PAGES_IN_FLIGHT = int(os.environ.get('INFERENCE_PDF_MAX_PAGES_IN_FLIGHT', '8'))
+PDF_MAX_PIXELS = int(os.environ.get('INFERENCE_PDF_MAX_PIXELS', '50000000'))
+
+# Backend serving the model: 'torch' (eager YOLOv5), 'onnx' (ONNX Runtime)
+# or 'torchscript'. The exported backends load INFERENCE_MODEL_FILE from the
+# model directory (default: best.onnx / best.torchscript)
+BACKEND = os.environ.get('INFERENCE_BACKEND', 'torch').lower()
+MODEL_FILE = os.environ.get('INFERENCE_MODEL_FILE')
+
+# S3 client shared by every request of this worker. SageMaker gives an
+# invocation 60s, so a stalled connection or read fails fast enough to be
+# retried within it
+S3_MAX_POOL_CONNECTIONS = int(os.environ.get('INFERENCE_S3_MAX_POOL_CONNECTIONS', '32'))
+S3_CONNECT_TIMEOUT = float(os.environ.get('INFERENCE_S3_CONNECT_TIMEOUT', '2'))
+S3_READ_TIMEOUT = float(os.environ.get('INFERENCE_S3_READ_TIMEOUT', '10'))
+
+# Warm-up forward passes run by model_fn before the first request
+WARMUP_RUNS = int(os.environ.get('INFERENCE_WARMUP_RUNS', '1'))
+WARMUP_SIZE = int(os.environ.get('INFERENCE_WARMUP_SIZE', '640'))
+
+_executor = None
+_executor_lock = threading.Lock()
+_s3_client = None
+_s3_client_lock = threading.Lock()
+_pdf_executor = None
+_pdf_executor_lock = threading.Lock()
+
+def find_yolov5_repo(model_dir):
     """
-    Load the YOLOv5 model from the model directory.
-    Called once when the endpoint starts.
+    Locate a vendored copy of the YOLOv5 repository.
+
+    Checks YOLOV5_REPO_DIR, then yolov5/ inside the model archive, then
+    code/yolov5/ next to the inference script.
+
+    Returns:
+        str: Repository directory, or None if no copy is packaged
+    """
+    candidates = [
+        os.environ.get('YOLOV5_REPO_DIR'),
+        os.path.join(model_dir, 'yolov5'),
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'yolov5')
+    ]
+    for candidate in candidates:
+        if candidate and os.path.isfile(os.path.join(candidate, 'hubconf.py')):
+            return candidate
+    return None
+
+
+def warm_up(model, runs=WARMUP_RUNS, size=WARMUP_SIZE):
+    """
+    Run blank images through the model so lazy initialisation (kernel
+    selection, allocator growth) happens before the first real request.
+
+    Returns:
+        float: Seconds spent warming up
+    """
+    start = time.perf_counter()
+    image = Image.new('RGB', (size, size), color='white')
+    for _ in range(runs):
+        with torch.no_grad():
+            model.predict([image], DEFAULT_CONFIDENCE)
+    return time.perf_counter() - start
+
+
+def load_torch_hub_model(model_dir):
     """
-    print(f"Loading model from {model_dir}")
+    Load the eager YOLOv5 model with torch.hub.
+
+    The model is built from a vendored YOLOv5 repository when the archive
+    contains one, so no network access is needed. Otherwise it falls back
+    to torch.hub's cached GitHub copy.
+    """
+    weights_path = os.path.join(model_dir, 'best.pt')
+    repo_dir = find_yolov5_repo(model_dir)
 
     # Load YOLOv5 model
-    model = torch.hub.load('ultralytics/yolov5', 'custom',
-                          path=os.path.join(model_dir, 'best.pt'),
-                          force_reload=True)
+    if repo_dir:
+        print(f"Using vendored YOLOv5 repository at {repo_dir}")
+        model = torch.hub.load(repo_dir, 'custom', path=weights_path, source='local')
+    else:
+        print("No vendored YOLOv5 repository found, loading through torch.hub (requires network on first use)")
+        model = torch.hub.load('ultralytics/yolov5', 'custom', path=weights_path)
 
     model.eval()
+    return model
 
-    # Set confidence threshold
-    model.conf = 0.5  # Default confidence threshold
+
+def model_fn(model_dir):
+    """
+    Load the YOLOv5 model from the model directory.
+    Called once when the endpoint starts.
+
+    Returns the backend selected by INFERENCE_BACKEND; all backends share
+    the predict(images, confidence) interface used by predict_fn.
+    """
+    print(f"Loading {BACKEND} model from {model_dir}")
+    load_start = time.perf_counter()
+
+    if BACKEND == 'torch':
+        model = TorchHubBackend(load_torch_hub_model(model_dir))
+    else:
+        model = load_exported_backend(model_dir, BACKEND, MODEL_FILE)
+
+    load_seconds = time.perf_counter() - load_start
+    warmup_seconds = warm_up(model)
 
     print("Model loaded successfully")
+    print(f"Cold start: import={IMPORT_SECONDS:.2f}s, weight load={load_seconds:.2f}s, "
+          f"warm-up={warmup_seconds:.2f}s ({WARMUP_RUNS} run(s) at {WARMUP_SIZE}px)")
     return model
 
 
@@ -46,79 +196,336 @@ def input_fn(request_body, content_type):
     """
     if content_type == 'application/json':
         # Input format: {"s3_uri": "s3://bucket/key", "confidence": 0.5}
+        # Batch format: {"s3_uris": ["s3://bucket/key", ...], "confidence": 0.5}
+        # An s3_uri ending in .pdf is processed page by page
         input_data = json.loads(request_body)
         return input_data
+    elif content_type == 'application/pdf':
+        # Direct PDF upload
+        return {'pdf_bytes': request_body}
     elif content_type.startswith('image/'):
         # Direct image upload
         return {'image_bytes': request_body}
+    elif content_type.startswith('multipart/form-data'):
+        # Several images uploaded as form parts
+        return parse_multipart(request_body, content_type)
     else:
         raise ValueError(f"Unsupported content type: {content_type}")
 
 
-def predict_fn(input_data, model):
+def parse_multipart(request_body, content_type):
     """
-    Perform prediction on the input data.
+    Split a multipart/form-data body into image parts and form fields.
 
     Args:
-        input_data: Deserialized input data
-        model: Loaded model
+        request_body: Raw multipart body
+        content_type: Content type including the boundary parameter
 
     Returns:
-        Prediction results
+        dict: {'images_bytes': [...]} plus 'confidence' if sent as a field
+    """
+    if isinstance(request_body, str):
+        request_body = request_body.encode('utf-8')
+
+    message = BytesParser(policy=HTTP).parsebytes(
+        f'Content-Type: {content_type}\r\n\r\n'.encode('utf-8') + request_body
+    )
+    if not message.is_multipart():
+        raise ValueError("Malformed multipart body")
+
+    input_data = {'images_bytes': []}
+    for part in message.iter_parts():
+        payload = part.get_payload(decode=True)
+        if part.get_filename() or part.get_content_type().startswith('image/'):
+            input_data['images_bytes'].append(payload)
+        elif part.get_param('name', header='content-disposition') == 'confidence':
+            input_data['confidence'] = float(payload.decode('utf-8'))
+
+    if not input_data['images_bytes']:
+        raise ValueError("Multipart body contains no images")
+    return input_data
+
+
+def get_s3_client():
+    """
+    Create the worker's S3 client on first use. Requests reuse its
+    connection pool instead of building a client and opening new
+    connections for every invocation.
+    """
+    global _s3_client
+    with _s3_client_lock:
+        if _s3_client is None:
+            _s3_client = boto3.client('s3', config=Config(
+                max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+                tcp_keepalive=True,
+                connect_timeout=S3_CONNECT_TIMEOUT,
+                read_timeout=S3_READ_TIMEOUT,
+                retries={'mode': 'adaptive', 'max_attempts': 3}
+            ))
+        return _s3_client
+
+
+def preprocess_image(image):
+    """Shrink an image to the model input size unless it will be tiled"""
+    if not PREPROCESS_SIZE or (TILE_THRESHOLD and max(image.size) > TILE_THRESHOLD):
+        return image
+    return downscale(image, PREPROCESS_SIZE)
+
+
+def load_s3_image(s3, bucket, key):
+    """
+    Decode one S3 image for the model, from its model-size copy when
+    PREPROCESS_CACHE is on and the copy exists.
+
+    The copy is only stored when it is sure to be smaller than the
+    original. Images that are tiled, already small, or compress well as
+    they are keep costing a lookup of the missing copy. A copy without
+    its source size is ignored and written again from the original.
+    """
+    cache_key = preprocessed_key(key, PREPROCESS_SIZE) if PREPROCESS_SIZE and PREPROCESS_CACHE else None
+    if cache_key:
+        try:
+            image = open_preprocessed(s3, bucket, cache_key)
+            if image is not None:
+                return image
+            print(f"Ignoring preprocessed copy without source size: {cache_key}")
+        except s3.exceptions.ClientError:
+            # NoSuchKey, or AccessDenied for a missing key without
+            # s3:ListBucket
+            pass
+
+    original = open_s3_image(s3, bucket, key, DRAFT_SIZE, TILE_THRESHOLD)
+    image = preprocess_image(original)
+    # A PNG copy is at most about its raw pixel size; originals smaller
+    # than that (most JPEGs) are not worth replacing
+    raw_bytes = image.width * image.height * len(image.getbands())
+    if cache_key and 'source_size' in image.info and original.info['stored_bytes'] > raw_bytes:
+        try:
+            save_preprocessed(s3, bucket, cache_key, image)
+        except Exception as e:
+            print(f"Failed to cache preprocessed image: {str(e)}")
+    return image
+
+
+def load_images(input_data):
     """
-    # Set confidence threshold if provided
-    if 'confidence' in input_data:
-        model.conf = input_data['confidence']
+    Load every image referenced by the request.
 
-    # Load image from S3 or bytes
-    if 's3_uri' in input_data:
-        # Download from S3
-        s3 = boto3.client('s3')
-        bucket, key = input_data['s3_uri'].replace('s3://', '').split('/', 1)
+    Images are decoded before returning, so S3 connections and compressed
+    bytes are released before inference starts. Images that will not be
+    tiled are shrunk to the model input size (see preprocess_image).
 
-        response = s3.get_object(Bucket=bucket, Key=key)
-        image_bytes = response['Body'].read()
-        image = Image.open(io.BytesIO(image_bytes))
+    Returns:
+        list: PIL images in request order
+    """
+    if 's3_uris' in input_data or 's3_uri' in input_data:
+        # Download from S3, decoding each object as it streams in
+        s3 = get_s3_client()
+        uris = input_data['s3_uris'] if 's3_uris' in input_data else [input_data['s3_uri']]
+        if not uris:
+            raise ValueError("'s3_uris' must contain at least one URI")
+        images = []
+        for uri in uris:
+            bucket, key = uri.replace('s3://', '').split('/', 1)
+            images.append(load_s3_image(s3, bucket, key))
+        return images
+    elif 'images_bytes' in input_data:
+        return [
+            preprocess_image(open_image(io.BytesIO(image_bytes), DRAFT_SIZE, TILE_THRESHOLD))
+            for image_bytes in input_data['images_bytes']
+        ]
     elif 'image_bytes' in input_data:
         # Use provided image bytes
-        image = Image.open(io.BytesIO(input_data['image_bytes']))
+        return [preprocess_image(open_image(io.BytesIO(input_data['image_bytes']), DRAFT_SIZE, TILE_THRESHOLD))]
+    else:
+        raise ValueError("Input must contain 's3_uri', 's3_uris', 'image_bytes' or 'images_bytes'")
+
+
+def run_batch(model, requests):
+    """
+    Run several requests through the model together.
+
+    The model runs once at the lowest requested confidence and each
+    request's predictions are then filtered to its own threshold. Images
+    above TILE_THRESHOLD run as tiles in the same forward passes. NMS only
+    lets a box suppress lower-scoring boxes, so this gives the same
+    detections as running each request at its own threshold.
+
+    Args:
+        model: Loaded model backend
+        requests: List of (images, confidence) tuples
+
+    Returns:
+        list: Per request, a list of (N, 6) prediction arrays (one per image)
+    """
+    images = [image for request_images, _ in requests for image in request_images]
+    min_confidence = min(confidence for _, confidence in requests)
+
+    # Large images are replaced by their tiles in the model input list
+    inputs, plans = [], []
+    for image in images:
+        tiles = None
+        if TILE_THRESHOLD and max(image.size) > TILE_THRESHOLD:
+            tiles = TiledImage(image, TILE_SIZE, TILE_OVERLAP, TILE_FULL_IMAGE)
+        plans.append((tiles, len(inputs)))
+        inputs.extend(tiles.inputs if tiles else [image])
+
+    # Run inference on each chunk in one forward pass
+    chunks = [inputs[start:start + MAX_BATCH_SIZE] for start in range(0, len(inputs), MAX_BATCH_SIZE)]
+    if SERVING_THREADS > 1:
+        chunk_predictions = get_executor().map(lambda chunk: model.predict(chunk, min_confidence), chunks)
     else:
-        raise ValueError("Input must contain either 's3_uri' or 'image_bytes'")
-
-    # Get image dimensions
-    img_width, img_height = image.size
-
-    # Run inference
-    results = model(image)
-
-    # Extract predictions
-    predictions = results.pandas().xyxy[0]  # Pandas DataFrame
-
-    # Format output
-    detections = []
-    for _, row in predictions.iterrows():
-        detection = {
-            'roomId': len(detections) + 1,
-            'boundingBox': {
-                'x': int(row['xmin']),
-                'y': int(row['ymin']),
-                'width': int(row['xmax'] - row['xmin']),
-                'height': int(row['ymax'] - row['ymin'])
-            },
-            'confidence': float(row['confidence']),
-            'class': row['name'],
-            'area': int((row['xmax'] - row['xmin']) * (row['ymax'] - row['ymin']))
-        }
-        detections.append(detection)
+        chunk_predictions = (model.predict(chunk, min_confidence) for chunk in chunks)
+    raw_predictions = [p for chunk in chunk_predictions for p in chunk]
+
+    # Merge each tiled image's tiles back into one set of predictions
+    predictions = [
+        tiles.merge(raw_predictions[start:start + len(tiles.inputs)], TILE_MATCH_THRESHOLD)
+        if tiles else raw_predictions[start]
+        for tiles, start in plans
+    ]
+
+    outputs = []
+    offset = 0
+    for request_images, confidence in requests:
+        request_predictions = predictions[offset:offset + len(request_images)]
+        offset += len(request_images)
+        outputs.append([filter_confidence(p, confidence) for p in request_predictions])
+    return outputs
+
+
+def get_executor():
+    """Create the serving thread pool for this worker on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            print(f"Threaded serving enabled: {SERVING_THREADS} threads")
+            _executor = ThreadPoolExecutor(max_workers=SERVING_THREADS, thread_name_prefix='inference')
+        return _executor
+
+
+def get_pdf_executor():
+    """Create the page rendering process pool for this worker on first use"""
+    global _pdf_executor
+    with _pdf_executor_lock:
+        if _pdf_executor is None:
+            print(f"PDF ingest enabled: {PDF_WORKERS} processes, {PDF_DPI} DPI, "
+                  f"{PDF_MAX_PAGES_IN_FLIGHT} pages in flight")
+            _pdf_executor = create_executor(PDF_WORKERS)
+        return _pdf_executor
+
+
+def is_pdf_request(input_data):
+    """Whether a request refers to a PDF rather than images"""
+    return 'pdf_bytes' in input_data or input_data.get('s3_uri', '').lower().endswith('.pdf')
+
+
+def spool_pdf(input_data):
+    """Write the request's PDF to a temporary file and return its path"""
+    if 'pdf_bytes' in input_data:
+        body = input_data['pdf_bytes']
+        return spool(io.BytesIO(body.encode('latin-1') if isinstance(body, str) else body))
+
+    bucket, key = input_data['s3_uri'].replace('s3://', '').split('/', 1)
+    body = get_s3_client().get_object(Bucket=bucket, Key=key)['Body']
+    try:
+        return spool(body)
+    finally:
+        body.close()
+
+
+def predict_pdf(input_data, model):
+    """
+    Detect elements on every page of a PDF.
+
+    Pages are rendered in the PDF process pool while earlier pages run
+    through the model, in batches of up to MAX_BATCH_SIZE pages and half
+    of PDF_MAX_PAGES_IN_FLIGHT, so at most
+    PDF_MAX_PAGES_IN_FLIGHT pages are held in memory whatever the page
+    count.
+
+    Returns:
+        dict: One result for the whole document. Each detection carries the
+        page it was found on, with boxes in that page's pixels; room IDs
+        run on across pages. 'pages' lists each page's dimensions and
+        detection count, and 'dimensions' is the first page's.
+    """
+    confidence = input_data.get('confidence', DEFAULT_CONFIDENCE)
+    path = spool_pdf(input_data)
+
+    detections, pages = [], []
+    try:
+        batch_size = pdf_batch_size(MAX_BATCH_SIZE, PDF_MAX_PAGES_IN_FLIGHT)
+        for images in iter_page_batches(path, get_pdf_executor(), PDF_DPI, batch_size,
+                                        PDF_MAX_PAGES_IN_FLIGHT, PDF_MAX_PIXELS):
+            predictions = run_batch(model, [(images, confidence)])[0]
+
+            for image, image_predictions in zip(images, predictions):
+                output = format_predictions(image_predictions, model.names, image.size)
+                page = image.info['page']
+                for detection in output['detections']:
+                    detection['roomId'] = len(detections) + 1
+                    detection['page'] = page
+                    detections.append(detection)
+                pages.append({
+                    'page': page,
+                    'dimensions': output['dimensions'],
+                    'dpi': image.info['dpi'],
+                    'totalDetections': output['totalRooms']
+                })
+    finally:
+        remove(path)
 
     return {
         'detections': detections,
-        'dimensions': {'width': img_width, 'height': img_height},
+        'dimensions': pages[0]['dimensions'] if pages else {'width': 0, 'height': 0},
+        'pages': pages,
+        'totalPages': len(pages),
         'totalRooms': len(detections),
         'avgConfidence': sum(d['confidence'] for d in detections) / len(detections) if detections else 0
     }
 
 
+def predict_fn(input_data, model):
+    """
+    Perform prediction on the input data.
+
+    Single-image requests return one result. Batch requests ('s3_uris' or
+    multipart images) return {'results': [...]} with one result per image,
+    in request order, computed in forward passes of up to MAX_BATCH_SIZE.
+    PDF requests return one result covering every page (see predict_pdf).
+
+    Args:
+        input_data: Deserialized input data
+        model: Loaded model backend
+
+    Returns:
+        Prediction results
+    """
+    if is_pdf_request(input_data):
+        return predict_pdf(input_data, model)
+
+    confidence = input_data.get('confidence', DEFAULT_CONFIDENCE)
+    images = load_images(input_data)
+
+    predictions = run_batch(model, [(images, confidence)])[0]
+
+    # Boxes and dimensions refer to the stored image, even if it was
+    # decoded at reduced scale
+    outputs = [
+        format_predictions(scale_to_source(image_predictions, image), model.names, source_size(image))
+        for image, image_predictions in zip(images, predictions)
+    ]
+
+    if 's3_uris' in input_data or 'images_bytes' in input_data:
+        if 's3_uris' in input_data:
+            for output, uri in zip(outputs, input_data['s3_uris']):
+                output['s3_uri'] = uri
+        return {'results': outputs, 'totalImages': len(outputs)}
+
+    return outputs[0]
+
+
 def output_fn(prediction, accept):
     """
     Serialize the prediction output.
@@ -0,0 +1,247 @@
+"""
+Image ingest for the inference container.
+
+Decodes images straight from the S3 response stream instead of reading the
+whole object into memory first. JPEGs much larger than the model input are
+decoded at a reduced scale with PIL's draft mode, and predictions are then
+scaled back to the source resolution so the response still describes the
+original image.
+
+Images the model will only see at its input size can be stored in S3 as a
+model-size copy next to the original (see preprocessed_key), so later
+requests for them download and decode a few hundred KB instead of the
+full sheet.
+"""
+import io
+import math
+
+from PIL import Image, PngImagePlugin
+
+# Formats whose PIL decoders read the file front to back after the header,
+# so consumed bytes can be dropped while decoding
+STREAMABLE_FORMATS = {'JPEG', 'PNG'}
+
+# Bytes requested from the underlying stream per read
+CHUNK_SIZE = 256 * 1024
+
+# PNG text chunk carrying a model-size copy's source (width, height)
+SOURCE_SIZE_KEY = 'maxtrace:source_size'
+
+# zlib level for model-size copies: line art compresses well at any level,
+# and the copy is written on the request path
+PREPROCESSED_COMPRESS_LEVEL = 1
+
+
+class ForwardStream(io.RawIOBase):
+    """
+    Seekable file-like view of a forward-only stream (an S3 StreamingBody).
+
+    Everything read is kept while PIL parses the header, so it can seek
+    back to the start of the image data. After release(), bytes behind the
+    read position are dropped on every read, so only about one chunk of
+    compressed data is held while decoding.
+    """
+
+    def __init__(self, stream, chunk_size=CHUNK_SIZE):
+        super().__init__()
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._buffer = bytearray()
+        self._buffer_start = 0
+        self._position = 0
+        self._retain = True
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def _buffer_end(self):
+        return self._buffer_start + len(self._buffer)
+
+    def _fill(self, until=None):
+        """Read from the stream until `until` bytes are buffered (None = all)"""
+        while not self._eof and (until is None or self._buffer_end() < until):
+            chunk = self._stream.read(self._chunk_size)
+            if not chunk:
+                self._eof = True
+                break
+            self._buffer += chunk
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            self._fill()
+            offset += self._buffer_end()
+        if offset < self._buffer_start:
+            raise io.UnsupportedOperation("Cannot seek back into released stream data")
+        self._position = offset
+        return offset
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            self._fill()
+            size = max(0, self._buffer_end() - self._position)
+        else:
+            self._fill(self._position + size)
+
+        start = self._position - self._buffer_start
+        with memoryview(self._buffer) as view:
+            data = bytes(view[start:start + size])
+        self._position += len(data)
+
+        if not self._retain:
+            del self._buffer[:self._position - self._buffer_start]
+            self._buffer_start = self._position
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def release(self):
+        """Stop keeping bytes that have already been read"""
+        self._retain = False
+
+    def close(self):
+        self._buffer = bytearray()
+        if hasattr(self._stream, 'close'):
+            self._stream.close()
+        super().close()
+
+
+def draft_request_size(image_size, draft_size):
+    """
+    Smallest size PIL's JPEG draft may reduce to so that the longest side
+    stays at or above draft_size.
+    """
+    width, height = image_size
+    scale = draft_size / max(width, height)
+    return math.ceil(width * scale), math.ceil(height * scale)
+
+
+def open_image(fp, draft_size=0, full_resolution_above=0):
+    """
+    Open and decode an image from a file-like object.
+
+    Args:
+        fp: Binary file-like object; a ForwardStream is released once the
+            header is parsed so the decoder streams through it
+        draft_size: Longest side the model works at. JPEGs at least twice
+            this size are decoded at a reduced scale (0 disables)
+        full_resolution_above: Keep full resolution for images whose longest
+            side exceeds this (tiled inference needs every pixel; 0 = never)
+
+    Returns:
+        PIL.Image: Loaded image. If it was decoded at reduced scale,
+            info['source_size'] holds the original (width, height)
+    """
+    image = Image.open(fp)
+    source_size = image.size
+
+    if isinstance(fp, ForwardStream) and image.format in STREAMABLE_FORMATS:
+        fp.release()
+
+    longest = max(source_size)
+    keep_full = full_resolution_above and longest > full_resolution_above
+    if image.format == 'JPEG' and draft_size and longest >= 2 * draft_size and not keep_full:
+        image.draft('RGB', draft_request_size(source_size, draft_size))
+        if image.size != source_size:
+            image.info['source_size'] = source_size
+
+    image.load()
+    return image
+
+
+def open_s3_image(s3_client, bucket, key, draft_size=0, full_resolution_above=0):
+    """
+    Decode an S3 object while it downloads, closing the connection as soon
+    as the image is loaded. info['stored_bytes'] holds the object's size.
+    """
+    response = s3_client.get_object(Bucket=bucket, Key=key)
+    stream = ForwardStream(response['Body'])
+    try:
+        image = open_image(stream, draft_size, full_resolution_above)
+    finally:
+        stream.close()
+    image.info['stored_bytes'] = response['ContentLength']
+    return image
+
+
+def preprocessed_key(key, size):
+    """
+    Key of the model-size copy of an object:
+    uploads/.../original.png -> uploads/.../original.model-640.png
+    """
+    directory, _, name = key.rpartition('/')
+    stem = name.rsplit('.', 1)[0] if '.' in name else name
+    return f"{directory}/{stem}.model-{size}.png" if directory else f"{stem}.model-{size}.png"
+
+
+def save_preprocessed(s3_client, bucket, key, image):
+    """
+    Store a downscaled image as PNG, with its source size in a text chunk.
+
+    Returns:
+        int: Bytes written
+    """
+    width, height = source_size(image)
+    pnginfo = PngImagePlugin.PngInfo()
+    pnginfo.add_text(SOURCE_SIZE_KEY, f"{width}x{height}")
+
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', pnginfo=pnginfo, compress_level=PREPROCESSED_COMPRESS_LEVEL)
+    s3_client.put_object(Bucket=bucket, Key=key, Body=buffer.getvalue(), ContentType='image/png')
+    return buffer.tell()
+
+
+def open_preprocessed(s3_client, bucket, key):
+    """
+    Load a copy stored by save_preprocessed.
+
+    Raises the client's NoSuchKey if there is none.
+
+    Returns:
+        PIL.Image: Image with info['source_size'] restored, or None if the
+        object lacks a valid source size (written by another tool, or with
+        its text chunk stripped); detections on it could not be mapped
+        back to the original
+    """
+    image = open_s3_image(s3_client, bucket, key)
+    try:
+        width, height = (int(side) for side in image.info.pop(SOURCE_SIZE_KEY, '').split('x'))
+    except ValueError:
+        return None
+    image.info['source_size'] = (width, height)
+    return image
+
+
+def source_size(image):
+    """(width, height) of the image as stored, before any draft reduction"""
+    return image.info.get('source_size', image.size)
+
+
+def scale_to_source(predictions, image):
+    """
+    Map predictions on a draft-reduced or downscaled image back to source
+    pixels.
+
+    Args:
+        predictions: (N, 6) array; columns 0-3 are scaled in place
+        image: Image the predictions were made on
+
+    Returns:
+        np.ndarray: The same array
+    """
+    original = source_size(image)
+    if original != image.size and len(predictions):
+        predictions[:, [0, 2]] *= original[0] / image.size[0]
+        predictions[:, [1, 3]] *= original[1] / image.size[1]
+    return predictions
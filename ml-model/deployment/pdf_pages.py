@@ -0,0 +1,189 @@
+"""
+PDF ingest for the inference container.
+
+Construction sets arrive as multi-sheet PDFs. Each page is rasterized with
+pdfium (pypdfium2) at a configurable DPI in a pool of worker processes:
+rendering is CPU-bound, and pdfium is not thread-safe, so threads would
+neither overlap nor be safe. Pages are handed to inference in batches as
+they are rendered, and at most `max_pages` rendered pages exist at once:
+pages still rendering, rendered pages waiting for their batch, and the
+batch being run all count.
+
+The PDF itself is spooled to a temporary file, so neither the request
+body nor the S3 object is held in memory while pages render; each worker
+opens the file once.
+"""
+import atexit
+import multiprocessing
+import os
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+PDF_MAGIC = b'%PDF-'
+
+# PDF user space units per inch
+POINTS_PER_INCH = 72
+
+# Bytes copied per read when spooling a PDF to disk
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+# Document opened by this worker process, as ((path, inode, mtime),
+# PdfDocument). Spooled files are deleted after each request, so a later
+# file may reuse a path
+_document = None
+
+
+def is_pdf(header):
+    """Whether bytes start like a PDF file"""
+    return bytes(header[:len(PDF_MAGIC)]) == PDF_MAGIC
+
+
+def spool(stream):
+    """
+    Copy a PDF stream to a temporary file.
+
+    Args:
+        stream: Binary file-like object (an S3 StreamingBody or BytesIO)
+
+    Returns:
+        str: Path of the file; the caller removes it
+    """
+    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+        shutil.copyfileobj(stream, f, SPOOL_CHUNK_SIZE)
+        return f.name
+
+
+def _open(path):
+    """The document at `path`, opened once per worker process"""
+    global _document
+    import pypdfium2
+
+    stat = os.stat(path)
+    key = (path, stat.st_ino, stat.st_mtime_ns)
+    if _document is None or _document[0] != key:
+        if _document is not None:
+            _document[1].close()
+        else:
+            atexit.register(_close)
+        _document = (key, pypdfium2.PdfDocument(path))
+    return _document[1]
+
+
+def _close():
+    """Close this worker's document when the process exits"""
+    global _document
+    if _document is not None:
+        _document[1].close()
+        _document = None
+
+
+def page_count(path):
+    """Number of pages in a PDF file"""
+    import pypdfium2
+
+    document = pypdfium2.PdfDocument(path)
+    try:
+        return len(document)
+    finally:
+        document.close()
+
+
+def render_page(path, index, dpi, max_pixels=0):
+    """
+    Rasterize one page. Runs in a worker process.
+
+    Args:
+        path: PDF file
+        index: Page index (0-based)
+        dpi: Resolution to render at
+        max_pixels: Pixel budget per page; larger pages are rendered at a
+            lower DPI to fit (0 = no limit)
+
+    Returns:
+        PIL.Image: RGB page with info['page'] (1-based) and info['dpi']
+    """
+    page = _open(path)[index]
+    try:
+        width, height = page.get_size()
+        scale = dpi / POINTS_PER_INCH
+        if max_pixels and width * height * scale * scale > max_pixels:
+            scale = (max_pixels / (width * height)) ** 0.5
+        image = page.render(scale=scale).to_pil().convert('RGB')
+    finally:
+        page.close()
+
+    image.info['page'] = index + 1
+    image.info['dpi'] = round(scale * POINTS_PER_INCH)
+    return image
+
+
+def create_executor(workers):
+    """
+    Process pool for page rendering.
+
+    Workers are spawned rather than forked: the serving process has torch
+    and its thread pools loaded, which are not safe to fork.
+    """
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def pdf_batch_size(max_batch_size, max_pages):
+    """
+    Pages per batch for a page budget: half of it, so the next batch can
+    render while one is processed
+    """
+    return max(1, min(max_batch_size, max_pages // 2))
+
+
+def iter_page_batches(path, executor, dpi, batch_size, max_pages, max_pixels=0):
+    """
+    Rasterize a PDF's pages in a process pool, yielding them in page order
+    in batches.
+
+    At most `max_pages` pages are rendering, waiting or in the current
+    batch at any time. The pages of a batch are released (the yielded list
+    is cleared) when the next batch is requested, so callers must not keep
+    references to them.
+
+    Args:
+        path: PDF file
+        executor: Process pool (see create_executor)
+        dpi: Resolution to render at
+        batch_size: Pages per batch; capped at max_pages
+        max_pages: Rendered pages held at once
+        max_pixels: Pixel budget per page (see render_page)
+
+    Yields:
+        list: PIL images of consecutive pages
+    """
+    max_pages = max(1, max_pages)
+    batch_size = max(1, min(batch_size, max_pages))
+    pages = page_count(path)
+    pending = deque()
+    next_page = 0
+
+    try:
+        while next_page < pages or pending:
+            while next_page < pages and len(pending) < max_pages:
+                pending.append(executor.submit(render_page, path, next_page, dpi, max_pixels))
+                next_page += 1
+
+            batch = [pending.popleft().result() for _ in range(min(batch_size, len(pending)))]
+            # Pages behind this batch keep rendering while it is processed,
+            # within the max_pages - batch_size slots left (see
+            # pdf_batch_size)
+            yield batch
+            batch.clear()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def remove(path):
+    """Delete a spooled PDF, ignoring a file that is already gone"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,180 @@
+"""
+Detection post-processing.
+Turns raw YOLOv5 output rows [x1, y1, x2, y2, confidence, class] into the
+detection schema returned by the endpoint, using NumPy column operations.
+Also holds the NumPy NMS used by the exported model backends.
+"""
+import numpy as np
+
+# Offset added per class so one NMS pass never suppresses across classes
+MAX_WH = 7680
+
+
+def xywh2xyxy(boxes):
+    """Convert [cx, cy, w, h] boxes to [x1, y1, x2, y2]"""
+    converted = np.empty_like(boxes)
+    converted[:, 0] = boxes[:, 0] - boxes[:, 2] / 2
+    converted[:, 1] = boxes[:, 1] - boxes[:, 3] / 2
+    converted[:, 2] = boxes[:, 0] + boxes[:, 2] / 2
+    converted[:, 3] = boxes[:, 1] + boxes[:, 3] / 2
+    return converted
+
+
+def box_iou(box, boxes):
+    """IoU of one [x1, y1, x2, y2] box against an (N, 4) array of boxes"""
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return intersection / (area + areas - intersection + 1e-9)
+
+
+def nms(boxes, scores, iou_threshold, overlap=box_iou):
+    """
+    Greedy non-maximum suppression.
+
+    Args:
+        boxes: (N, 4) array of [x1, y1, x2, y2]
+        scores: (N,) array
+        iou_threshold: Boxes overlapping a kept box by more than this are dropped
+        overlap: Overlap measure, called as overlap(box, boxes)
+
+    Returns:
+        np.ndarray: Indices of the kept boxes, highest score first
+    """
+    # Stable descending sort: equal scores keep their input order
+    order = np.argsort(-scores, kind='stable')
+    keep = []
+    while order.size:
+        best = order[0]
+        keep.append(best)
+        rest = order[1:]
+        order = rest[overlap(boxes[best], boxes[rest]) <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def non_max_suppression(prediction, conf_thres=0.25, iou_thres=0.45, max_det=1000, max_nms=30000):
+    """
+    NumPy port of YOLOv5's non_max_suppression for raw model output.
+
+    Args:
+        prediction: (B, N, 5 + classes) array of [cx, cy, w, h, obj, class scores...]
+        conf_thres: Confidence threshold
+        iou_thres: IoU threshold for suppression
+        max_det: Maximum detections kept per image
+        max_nms: Maximum boxes passed into NMS
+
+    Returns:
+        list: Per image, an (n, 6) array of [x1, y1, x2, y2, confidence, class]
+    """
+    output = []
+    for image_prediction in prediction:
+        x = image_prediction[image_prediction[:, 4] > conf_thres]
+        if not len(x):
+            output.append(np.zeros((0, 6), dtype=np.float32))
+            continue
+
+        # Confidence = objectness * class score, best class only
+        scores = x[:, 5:] * x[:, 4:5]
+        classes = scores.argmax(1)
+        confidence = scores[np.arange(len(x)), classes]
+        boxes = xywh2xyxy(x[:, :4])
+
+        mask = confidence > conf_thres
+        boxes, confidence, classes = boxes[mask], confidence[mask], classes[mask]
+        order = np.argsort(-confidence, kind='stable')[:max_nms]
+        boxes, confidence, classes = boxes[order], confidence[order], classes[order]
+
+        keep = nms(boxes + classes[:, None] * MAX_WH, confidence, iou_thres)[:max_det]
+        output.append(np.concatenate([
+            boxes[keep],
+            confidence[keep, None],
+            classes[keep, None].astype(boxes.dtype)
+        ], axis=1))
+    return output
+
+
+def scale_boxes(predictions, letterbox_params, image_size):
+    """
+    Map boxes from letterboxed model coordinates back to the source image.
+
+    Args:
+        predictions: (N, 6) array; columns 0-3 are modified in place
+        letterbox_params: (gain, pad_x, pad_y) from preprocess.letterbox
+        image_size: (width, height) of the source image
+
+    Returns:
+        np.ndarray: The same array
+    """
+    gain, pad_x, pad_y = letterbox_params
+    width, height = image_size
+    predictions[:, [0, 2]] = ((predictions[:, [0, 2]] - pad_x) / gain).clip(0, width)
+    predictions[:, [1, 3]] = ((predictions[:, [1, 3]] - pad_y) / gain).clip(0, height)
+    return predictions
+
+
+def filter_confidence(predictions, confidence):
+    """
+    Keep the rows scoring above a confidence threshold.
+
+    Args:
+        predictions: (N, 6) array of [x1, y1, x2, y2, confidence, class]
+        confidence: Threshold; matches YOLOv5's strict `>` comparison
+
+    Returns:
+        np.ndarray: Filtered rows
+    """
+    return predictions[predictions[:, 4] > confidence]
+
+
+def format_predictions(predictions, names, image_size):
+    """
+    Convert one image's predictions to the detection schema.
+
+    Args:
+        predictions: (N, 6) array of [x1, y1, x2, y2, confidence, class]
+        names: Class names indexed by class ID (list or dict)
+        image_size: (width, height) of the source image
+
+    Returns:
+        dict: Per-image detection results
+    """
+    img_width, img_height = image_size
+    predictions = np.asarray(predictions, dtype=np.float64).reshape(-1, 6)
+
+    x1, y1, x2, y2 = predictions[:, 0], predictions[:, 1], predictions[:, 2], predictions[:, 3]
+    confidence = predictions[:, 4]
+    widths = x2 - x1
+    heights = y2 - y1
+
+    # Truncate toward zero like int() does
+    columns = zip(
+        x1.astype(np.int64).tolist(),
+        y1.astype(np.int64).tolist(),
+        widths.astype(np.int64).tolist(),
+        heights.astype(np.int64).tolist(),
+        confidence.tolist(),
+        predictions[:, 5].astype(np.int64).tolist(),
+        (widths * heights).astype(np.int64).tolist()
+    )
+
+    detections = [
+        {
+            'roomId': room_id,
+            'boundingBox': {'x': x, 'y': y, 'width': width, 'height': height},
+            'confidence': score,
+            'class': names[class_id],
+            'area': area
+        }
+        for room_id, (x, y, width, height, score, class_id, area) in enumerate(columns, start=1)
+    ]
+
+    return {
+        'detections': detections,
+        'dimensions': {'width': img_width, 'height': img_height},
+        'totalRooms': len(detections),
+        'avgConfidence': float(confidence.mean()) if len(detections) else 0
+    }
@@ -0,0 +1,162 @@
+"""
+Image pre-processing for the exported (ONNX / TorchScript) model backends.
+Reproduces YOLOv5 AutoShape's letterboxing so every backend sees the same
+model input for the same image.
+
+downscale() applies the letterbox's resize ahead of time, when an image is
+loaded, so large images are not carried through batching at full
+resolution and a model-size copy can be cached.
+"""
+import math
+
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+# Grey used by YOLOv5 for letterbox padding
+PAD_COLOR = (114, 114, 114)
+
+# EXIF orientation tag
+ORIENTATION = 0x0112
+
+
+def make_divisible(value, divisor):
+    """Round up to the nearest multiple of divisor"""
+    return math.ceil(value / divisor) * divisor
+
+
+def inference_shape(image_sizes, img_size, stride, rect=True):
+    """
+    Pick the (height, width) the model runs at for a batch of images.
+
+    Args:
+        image_sizes: (width, height) of every image in the batch
+        img_size: Model input size (longest side)
+        stride: Model stride; dimensions are rounded up to a multiple of it
+        rect: Use AutoShape's rectangular shape instead of a square
+
+    Returns:
+        tuple: (height, width)
+    """
+    if not rect:
+        return img_size, img_size
+
+    # Scale each image so its longest side is img_size, then take the
+    # batch-wide maximum of each dimension
+    scaled = [
+        (int(height * img_size / max(width, height)), int(width * img_size / max(width, height)))
+        for width, height in image_sizes
+    ]
+    return (
+        make_divisible(max(h for h, _ in scaled), stride),
+        make_divisible(max(w for _, w in scaled), stride)
+    )
+
+
+def exif_transpose(image):
+    """Apply the EXIF orientation, as AutoShape does, without copying upright images"""
+    if image.getexif().get(ORIENTATION, 1) == 1:
+        return image
+    return ImageOps.exif_transpose(image)
+
+
+def letterbox(image, shape):
+    """
+    Resize an image to fit `shape` keeping its aspect ratio and pad the rest.
+
+    Args:
+        image: PIL image
+        shape: Target (height, width)
+
+    Returns:
+        tuple: (HWC uint8 array, (gain, pad_x, pad_y))
+    """
+    target_h, target_w = shape
+    width, height = image.size
+    gain = min(target_h / height, target_w / width)
+    new_w, new_h = round(width * gain), round(height * gain)
+
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    array = np.asarray(image)
+
+    # OpenCV's bilinear resize, not PIL's antialiased one, so the model
+    # input matches AutoShape's pixel for pixel
+    if (new_w, new_h) != (width, height):
+        array = cv2.resize(array, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    left = round((target_w - new_w) / 2 - 0.1)
+    top = round((target_h - new_h) / 2 - 0.1)
+    canvas = np.empty((target_h, target_w, 3), dtype=np.uint8)
+    canvas[:] = PAD_COLOR
+    canvas[top:top + new_h, left:left + new_w] = array
+
+    # Padding as YOLOv5's scale_boxes() computes it when mapping boxes back
+    pad_x = (target_w - width * gain) / 2
+    pad_y = (target_h - height * gain) / 2
+    return canvas, (gain, pad_x, pad_y)
+
+
+def is_grayscale(array):
+    """Whether an HWC RGB array has equal channels everywhere"""
+    return bool((array[..., 0] == array[..., 1]).all() and (array[..., 1] == array[..., 2]).all())
+
+
+def downscale(image, size):
+    """
+    Shrink an image so its longest side is `size`, resampled as letterbox()
+    resamples, before it is batched.
+
+    letterbox() then has nothing left to resize, so the model input is the
+    same as for the full image. Line art whose channels are all equal comes
+    back as a grayscale ('L') image, which letterbox() converts back to the
+    same RGB pixels.
+
+    Images with an EXIF orientation are returned unchanged; the backends
+    transpose them before letterboxing.
+
+    Args:
+        image: Loaded PIL image
+        size: Model input size (longest side)
+
+    Returns:
+        PIL.Image: The reduced image, with info['source_size'] holding the
+        size boxes are mapped back to, or `image` if it is no larger than
+        `size`
+    """
+    width, height = image.size
+    if max(width, height) <= size or image.getexif().get(ORIENTATION, 1) != 1:
+        return image
+
+    gain = size / max(width, height)
+    new_size = (round(width * gain), round(height * gain))
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    array = cv2.resize(np.asarray(image), new_size, interpolation=cv2.INTER_LINEAR)
+
+    if array.ndim == 3 and is_grayscale(array):
+        array = np.ascontiguousarray(array[..., 0])
+    reduced = Image.fromarray(array)
+    reduced.info['source_size'] = image.info.get('source_size', (width, height))
+    return reduced
+
+
+def prepare_batch(images, img_size, stride, rect=True):
+    """
+    Letterbox a list of images into one normalised BCHW float32 batch.
+
+    Images are expected to be upright already (see exif_transpose).
+
+    Returns:
+        tuple: (batch array, per-image letterbox parameters)
+    """
+    shape = inference_shape([image.size for image in images], img_size, stride, rect)
+    arrays, letterboxes = [], []
+    for image in images:
+        array, params = letterbox(image, shape)
+        arrays.append(array)
+        letterboxes.append(params)
+
+    batch = np.stack(arrays).transpose(0, 3, 1, 2)
+    batch = np.ascontiguousarray(batch, dtype=np.float32) / 255.0
+    return batch, letterboxes
@@ -0,0 +1,120 @@
+"""
+Tiled (sliced) inference for large-format blueprints.
+
+A sheet several thousand pixels wide is shrunk to the model's input size
+as a whole, which erases small doors and windows. Above a size threshold
+the image is instead cut into overlapping tiles at the model's resolution;
+every tile (plus, optionally, the downscaled whole sheet for large
+elements) is run through the model and the boxes are mapped back to sheet
+coordinates and merged with a cross-tile NMS.
+"""
+import numpy as np
+
+from postprocess import nms
+
+
+def tile_windows(width, height, tile_size, overlap):
+    """
+    Cover an image with overlapping square tiles.
+
+    The last row and column are shifted back to end at the image edge, so
+    every tile has the full size (unless the image itself is smaller).
+
+    Args:
+        width: Image width
+        height: Image height
+        tile_size: Tile side in pixels
+        overlap: Pixels shared by neighbouring tiles
+
+    Returns:
+        list: (x1, y1, x2, y2) tile windows
+    """
+    step = max(1, tile_size - overlap)
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, step))
+        return positions + [length - tile_size]
+
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in starts(height)
+        for x in starts(width)
+    ]
+
+
+def box_ios(box, boxes):
+    """Intersection over the smaller box, of one box against an (N, 4) array"""
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return intersection / (np.minimum(area, areas) + 1e-9)
+
+
+def merge_tile_predictions(tile_predictions, windows, match_threshold=0.5, max_det=1000):
+    """
+    Map per-tile predictions to image coordinates and merge duplicates.
+
+    An element cut by a tile border shows up as a full box in one tile and a
+    clipped box in its neighbour. Their IoU is low, but the clipped box lies
+    almost entirely inside the full one, so duplicates are matched on
+    intersection over the smaller box instead of IoU.
+
+    Args:
+        tile_predictions: Per tile, an (N, 6) array of
+            [x1, y1, x2, y2, confidence, class] in tile coordinates
+        windows: Tile windows from tile_windows(); a window of
+            (0, 0, width, height) for the whole image needs no offset
+        match_threshold: Intersection over smaller box above which the
+            lower-scoring box of the same class is dropped
+        max_det: Maximum detections kept
+
+    Returns:
+        np.ndarray: (n, 6) merged predictions, highest confidence first
+    """
+    shifted = []
+    for predictions, (x, y, _, _) in zip(tile_predictions, windows):
+        if len(predictions):
+            predictions = predictions.copy()
+            predictions[:, [0, 2]] += x
+            predictions[:, [1, 3]] += y
+            shifted.append(predictions)
+    if not shifted:
+        return np.zeros((0, 6), dtype=np.float32)
+
+    predictions = np.concatenate(shifted)
+
+    # Offset each class past the largest coordinate so classes never overlap
+    boxes = predictions[:, :4] + predictions[:, 5:6] * (predictions[:, :4].max() + 1)
+    keep = nms(boxes, predictions[:, 4], match_threshold, overlap=box_ios)[:max_det]
+    return predictions[keep]
+
+
+class TiledImage:
+    """
+    One image's tiles, ready to be queued alongside other model inputs.
+
+    Args:
+        image: PIL image
+        tile_size: Tile side in pixels
+        overlap: Pixels shared by neighbouring tiles
+        include_full_image: Also run the whole image downscaled, so
+            elements larger than a tile are still found
+    """
+
+    def __init__(self, image, tile_size, overlap, include_full_image=True):
+        width, height = image.size
+        self.windows = tile_windows(width, height, tile_size, overlap)
+        self.inputs = [image.crop(window) for window in self.windows]
+        if include_full_image:
+            self.windows.append((0, 0, width, height))
+            self.inputs.append(image)
+
+    def merge(self, predictions, match_threshold=0.5, max_det=1000):
+        """Merge the model's predictions for self.inputs, in order"""
+        return merge_tile_predictions(predictions, self.windows, match_threshold, max_det)
@@ -0,0 +1,86 @@
+"""
+Export trained YOLOv5 weights for CPU serving
+Writes TorchScript and ONNX copies of best.pt next to it for the
+INFERENCE_BACKEND=torchscript / onnx options of the inference container
+"""
+import argparse
+import os
+from pathlib import Path
+
+from train_enhanced import setup_yolov5
+
+
+def export_model(weights, img_size=640, formats=('torchscript', 'onnx'), dynamic=True, simplify=False):
+    """
+    Export a trained model with YOLOv5's export.py
+
+    Args:
+        weights: Path to best.pt
+        img_size: Input image size used for tracing
+        formats: Export formats (torchscript, onnx)
+        dynamic: Export ONNX with dynamic batch and image dimensions
+        simplify: Run onnx-simplifier on the ONNX graph
+
+    Returns:
+        dict: Exported file path by format
+    """
+    setup_yolov5()
+
+    weights = Path(weights)
+    if not weights.exists():
+        print(f"❌ Error: Weights not found at {weights}")
+        exit(1)
+
+    # TorchScript is always traced at a fixed shape; --dynamic only affects ONNX
+    export_cmd = f"""python yolov5/export.py \
+        --weights {weights} \
+        --img {img_size} \
+        --device cpu \
+        --include {' '.join(formats)}"""
+
+    if dynamic:
+        export_cmd += " --dynamic"
+    if simplify:
+        export_cmd += " --simplify"
+
+    print(f"Exporting {weights} to {', '.join(formats)}...\n")
+    print(f"Command: {export_cmd}\n")
+
+    if os.system(export_cmd) != 0:
+        print("\n❌ Export failed. Check logs for errors.")
+        exit(1)
+
+    suffixes = {'torchscript': '.torchscript', 'onnx': '.onnx'}
+    exported = {fmt: str(weights.with_suffix(suffixes[fmt])) for fmt in formats}
+
+    print("\n✅ Export complete:")
+    for fmt, path in exported.items():
+        print(f"  {fmt}: {path}")
+    print("\nServe with INFERENCE_BACKEND=onnx or INFERENCE_BACKEND=torchscript")
+
+    return exported
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export YOLOv5 weights to TorchScript and ONNX')
+    parser.add_argument('--weights', type=str, default='runs/train/blueprint_detector/weights/best.pt',
+                       help='Path to trained weights')
+    parser.add_argument('--img-size', type=int, default=640,
+                       help='Input image size')
+    parser.add_argument('--include', type=str, nargs='+', default=['torchscript', 'onnx'],
+                       choices=['torchscript', 'onnx'],
+                       help='Export formats')
+    parser.add_argument('--static', action='store_true',
+                       help='Export ONNX with a fixed input shape')
+    parser.add_argument('--simplify', action='store_true',
+                       help='Simplify the ONNX graph')
+
+    args = parser.parse_args()
+
+    export_model(
+        weights=args.weights,
+        img_size=args.img_size,
+        formats=args.include,
+        dynamic=not args.static,
+        simplify=args.simplify
+    )
@@ -0,0 +1,492 @@
+"""
+INT8 Quantization Stage for Blueprint Detection Models
+Quantizes the ONNX export of best.pt with ONNX Runtime, then compares it with
+the FP32 model on the validation split (mAP@0.5, latency, memory) and accepts
+or rejects the INT8 variant against configurable thresholds
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import yaml
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'deployment'))
+
+from export_model import export_model
+
+IMAGE_SUFFIXES = {'.bmp', '.jpg', '.jpeg', '.png', '.tif', '.tiff', '.webp'}
+
+
+def load_split(data_yaml, split='val'):
+    """
+    List the images of a dataset split
+
+    The split entry may be a directory or a .txt file of image paths, as in
+    YOLOv5 dataset YAMLs. Relative roots are resolved against the YAML's
+    directory first, then the working directory.
+
+    Returns:
+        list: Image paths, sorted
+    """
+    with open(data_yaml, 'r') as f:
+        config = yaml.safe_load(f)
+
+    root = Path(config.get('path', '.'))
+    if not root.is_absolute():
+        candidate = Path(data_yaml).resolve().parent / root
+        root = candidate if candidate.exists() else root.resolve()
+
+    entry = root / config[split]
+    if entry.is_dir():
+        return sorted(p for p in entry.rglob('*') if p.suffix.lower() in IMAGE_SUFFIXES)
+    with open(entry, 'r') as f:
+        return sorted(
+            Path(line.strip()) if Path(line.strip()).is_absolute() else root / line.strip()
+            for line in f if line.strip()
+        )
+
+
+def load_labels(image_path, image_size):
+    """
+    Read the YOLO label file of an image as pixel boxes
+
+    Returns:
+        np.ndarray: (N, 5) array of [class, x1, y1, x2, y2]
+    """
+    # images/<split>/name.png -> labels/<split>/name.txt
+    parts = list(image_path.parts)
+    if 'images' not in parts:
+        return np.zeros((0, 5))
+    parts[len(parts) - 1 - parts[::-1].index('images')] = 'labels'
+    label_path = Path(*parts).with_suffix('.txt')
+    if not label_path.exists():
+        return np.zeros((0, 5))
+
+    values = label_path.read_text().split()
+    if not values:
+        return np.zeros((0, 5))
+    rows = np.array(values, dtype=np.float64).reshape(-1, 5)
+
+    width, height = image_size
+    cx, cy = rows[:, 1] * width, rows[:, 2] * height
+    w, h = rows[:, 3] * width, rows[:, 4] * height
+    return np.stack([rows[:, 0], cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+
+
+def box_iou_matrix(a, b):
+    """Pairwise IoU of two (N, 4) / (M, 4) arrays of [x1, y1, x2, y2] boxes"""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return intersection / (area_a[:, None] + area_b[None, :] - intersection + 1e-9)
+
+
+def average_precision(recall, precision):
+    """Area under the precision-recall curve, 101-point interpolated as in YOLOv5"""
+    mrec = np.concatenate(([0.0], recall, [1.0]))
+    mpre = np.concatenate(([1.0], precision, [0.0]))
+    mpre = np.flip(np.maximum.accumulate(np.flip(mpre)))
+    x = np.linspace(0, 1, 101)
+    y = np.interp(x, mrec, mpre)
+    return float(((y[1:] + y[:-1]) / 2 * np.diff(x)).sum())
+
+
+def mean_average_precision(predictions, labels, num_classes, iou_threshold=0.5):
+    """
+    mAP over classes that appear in the labels
+
+    Args:
+        predictions: Per image, an (N, 6) array of [x1, y1, x2, y2, confidence, class]
+        labels: Per image, an (M, 5) array of [class, x1, y1, x2, y2]
+        num_classes: Number of classes
+        iou_threshold: IoU needed for a true positive
+
+    Returns:
+        float: mAP@iou_threshold
+    """
+    scores, correct, classes = [], [], []
+    for image_predictions, image_labels in zip(predictions, labels):
+        order = np.argsort(-image_predictions[:, 4], kind='stable')
+        image_predictions = image_predictions[order]
+        matched = np.zeros(len(image_labels), dtype=bool)
+        iou = box_iou_matrix(image_predictions[:, :4], image_labels[:, 1:]) if len(image_labels) else None
+
+        # Greedy matching in confidence order; each label matches once
+        for index, row in enumerate(image_predictions):
+            hit = False
+            if iou is not None:
+                candidates = (image_labels[:, 0] == row[5]) & ~matched & (iou[index] >= iou_threshold)
+                if candidates.any():
+                    best = np.argmax(np.where(candidates, iou[index], -1))
+                    matched[best] = True
+                    hit = True
+            scores.append(row[4])
+            correct.append(hit)
+            classes.append(row[5])
+
+    scores, correct, classes = np.array(scores), np.array(correct), np.array(classes)
+    label_classes = np.concatenate([l[:, 0] for l in labels]) if labels else np.zeros(0)
+
+    aps = []
+    for cls in range(num_classes):
+        num_labels = int((label_classes == cls).sum())
+        if not num_labels:
+            continue
+        mask = classes == cls
+        order = np.argsort(-scores[mask], kind='stable')
+        tp = np.cumsum(correct[mask][order])
+        fp = np.cumsum(~correct[mask][order])
+        recall = tp / num_labels
+        precision = tp / np.maximum(tp + fp, 1)
+        aps.append(average_precision(recall, precision))
+
+    return float(np.mean(aps)) if aps else 0.0
+
+
+class ValidationCalibrationReader:
+    """
+    Feeds letterboxed validation images to ONNX Runtime's static
+    quantization calibrator, one image per batch
+    """
+
+    def __init__(self, image_paths, input_name, img_size=640, stride=32):
+        from preprocess import prepare_batch
+
+        self.batches = (
+            {input_name: prepare_batch([Image.open(path).convert('RGB')], img_size, stride, rect=False)[0]}
+            for path in image_paths
+        )
+
+    def get_next(self):
+        return next(self.batches, None)
+
+
+def head_decode_nodes(model):
+    """
+    Names of the Detect head's decode nodes (sigmoid, grid offsets, anchor
+    scaling), i.e. everything downstream of the last convolutions. Box
+    coordinates lose too much precision in INT8, so these stay FP32.
+    """
+    consumers = {}
+    for node in model.graph.node:
+        for name in node.input:
+            consumers.setdefault(name, []).append(node)
+
+    def downstream(node):
+        return [c for output in node.output for c in consumers.get(output, [])]
+
+    conv_below = {}
+
+    def has_conv_below(node):
+        if node.name not in conv_below:
+            conv_below[node.name] = False
+            conv_below[node.name] = any(
+                c.op_type == 'Conv' or has_conv_below(c) for c in downstream(node)
+            )
+        return conv_below[node.name]
+
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10 * len(model.graph.node)))
+    head_convs = [n for n in model.graph.node if n.op_type == 'Conv' and not has_conv_below(n)]
+
+    excluded, stack = set(), [c for conv in head_convs for c in downstream(conv)]
+    while stack:
+        node = stack.pop()
+        if node.name not in excluded:
+            excluded.add(node.name)
+            stack.extend(downstream(node))
+    return sorted(excluded)
+
+
+def quantize_onnx(fp32_path, int8_path, mode='static', calibration_images=None, img_size=640):
+    """
+    Quantize an ONNX model to INT8 with ONNX Runtime
+
+    Args:
+        fp32_path: Exported FP32 model
+        int8_path: Output path
+        mode: 'dynamic' (weights only, activations quantized at run time) or
+            'static' (QDQ with activation ranges calibrated on images)
+        calibration_images: Image paths for static calibration
+        img_size: Calibration input size
+    """
+    import onnx
+    from onnxruntime.quantization import (
+        CalibrationMethod, QuantFormat, QuantType, quant_pre_process, quantize_dynamic, quantize_static
+    )
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Shape inference and graph cleanup recommended before quantization.
+        # Symbolic inference cannot resolve the dynamic-shape Detect head.
+        prepared_path = os.path.join(temp_dir, 'prepared.onnx')
+        quant_pre_process(str(fp32_path), prepared_path, skip_symbolic_shape=True)
+        excluded = head_decode_nodes(onnx.load(prepared_path))
+
+        if mode == 'dynamic':
+            # ConvInteger on CPU only takes uint8 weights
+            quantize_dynamic(
+                prepared_path, str(int8_path),
+                op_types_to_quantize=['Conv'],
+                nodes_to_exclude=excluded,
+                weight_type=QuantType.QUInt8
+            )
+        elif mode == 'static':
+            input_name = onnx.load(prepared_path, load_external_data=False).graph.input[0].name
+            quantize_static(
+                prepared_path, str(int8_path),
+                ValidationCalibrationReader(calibration_images, input_name, img_size),
+                quant_format=QuantFormat.QDQ,
+                nodes_to_exclude=excluded,
+                per_channel=True,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+                calibrate_method=CalibrationMethod.MinMax
+            )
+        else:
+            raise ValueError(f"Unsupported quantization mode: {mode}")
+
+
+def model_size_mb(model_path):
+    """On-disk size of an ONNX model including any external weight files"""
+    import onnx
+    from onnx.external_data_helper import uses_external_data
+
+    model = onnx.load(str(model_path), load_external_data=False)
+    locations = {
+        entry.value
+        for tensor in model.graph.initializer if uses_external_data(tensor)
+        for entry in tensor.external_data if entry.key == 'location'
+    }
+    size = model_path.stat().st_size + sum((model_path.parent / name).stat().st_size for name in locations)
+    return size / 1024 ** 2
+
+
+def peak_rss_mb():
+    """
+    Peak resident memory of this process in MB
+
+    Reads VmHWM because ru_maxrss survives exec() and would report the
+    parent's peak in a freshly spawned worker.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def profile_model(model_path, image_paths, eval_confidence, timing_images, timing_runs, confidence):
+    """
+    Run one model over the evaluation images in a fresh process
+
+    Returns:
+        dict: Predictions for mAP, per-image latencies at the serving
+            confidence, and resident memory before and after loading
+    """
+    from backends import OnnxBackend
+
+    rss_before = peak_rss_mb()
+    backend = OnnxBackend(str(model_path))
+
+    predictions = []
+    for path in image_paths:
+        image = Image.open(path)
+        predictions.append(backend.predict([image], eval_confidence)[0])
+
+    images = [Image.open(path) for path in image_paths[:timing_images]]
+    backend.predict(images[:1], confidence)
+    latencies = []
+    for _ in range(timing_runs):
+        for image in images:
+            start = time.perf_counter()
+            backend.predict([image], confidence)
+            latencies.append(time.perf_counter() - start)
+
+    rss_after = peak_rss_mb()
+    return {
+        'predictions': predictions,
+        'latencies': latencies,
+        'peak_rss_mb': rss_after,
+        'model_rss_mb': rss_after - rss_before
+    }
+
+
+def quantize_model(
+    weights='runs/train/blueprint_detector/weights/best.pt',
+    data_yaml='../data/blueprint_dataset.yaml',
+    mode='static',
+    img_size=640,
+    calibration_size=100,
+    eval_size=200,
+    timing_images=10,
+    timing_runs=3,
+    confidence=0.5,
+    max_map_drop=0.01,
+    min_speedup=1.1
+):
+    """
+    Produce and evaluate an INT8 variant of a trained model
+
+    Args:
+        weights: Trained best.pt; its ONNX export is created if missing
+        data_yaml: Dataset configuration with a val split
+        mode: 'static' (calibrated) or 'dynamic' quantization
+        img_size: Export and calibration image size
+        calibration_size: Validation images sampled for calibration
+        eval_size: Validation images used for mAP (0 = all)
+        timing_images: Images used for the latency measurement
+        timing_runs: Passes over the timing images
+        confidence: Confidence threshold for the latency measurement
+        max_map_drop: Largest accepted mAP@0.5 drop (absolute)
+        min_speedup: Smallest accepted FP32 / INT8 latency ratio
+
+    Returns:
+        dict: Report, also written next to the INT8 model
+    """
+    weights = Path(weights)
+    fp32_path = weights.with_suffix('.onnx')
+    int8_path = weights.with_name(f'{weights.stem}-int8.onnx')
+    report_path = weights.with_name(f'{weights.stem}-int8.json')
+
+    if not fp32_path.exists():
+        export_model(weights, img_size=img_size, formats=('onnx',))
+
+    with open(data_yaml, 'r') as f:
+        num_classes = int(yaml.safe_load(f)['nc'])
+
+    val_images = load_split(data_yaml, 'val')
+    if not val_images:
+        print(f"❌ Error: No validation images found for {data_yaml}")
+        exit(1)
+    rng = random.Random(0)
+    calibration_images = rng.sample(val_images, min(calibration_size, len(val_images)))
+    eval_images = rng.sample(val_images, min(eval_size, len(val_images))) if eval_size else val_images
+
+    print("\n" + "="*60)
+    print(f"QUANTIZING ({mode.upper()})")
+    print("="*60)
+    print(f"FP32 model: {fp32_path}")
+    print(f"Validation images: {len(val_images)} "
+          f"(calibration: {len(calibration_images) if mode == 'static' else 0}, evaluation: {len(eval_images)})")
+
+    start = time.perf_counter()
+    quantize_onnx(fp32_path, int8_path, mode, calibration_images, img_size)
+    print(f"INT8 model: {int8_path} ({time.perf_counter() - start:.1f}s)")
+
+    labels = [load_labels(path, Image.open(path).size) for path in eval_images]
+
+    # Each model runs in its own process so memory readings are independent
+    results = {}
+    for name, path in (('fp32', fp32_path), ('int8', int8_path)):
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            results[name] = executor.submit(
+                profile_model, path, eval_images, 0.001, timing_images, timing_runs, confidence
+            ).result()
+
+    summary = {}
+    for name, path in (('fp32', fp32_path), ('int8', int8_path)):
+        result = results[name]
+        summary[name] = {
+            'model': str(path),
+            'map50': mean_average_precision(result['predictions'], labels, num_classes),
+            'latency_ms': statistics.median(result['latencies']) * 1000,
+            'model_size_mb': model_size_mb(path),
+            'model_rss_mb': result['model_rss_mb'],
+            'peak_rss_mb': result['peak_rss_mb']
+        }
+
+    fp32, int8 = summary['fp32'], summary['int8']
+    map_drop = fp32['map50'] - int8['map50']
+    speedup = fp32['latency_ms'] / int8['latency_ms']
+    accepted = map_drop <= max_map_drop and speedup >= min_speedup
+
+    report = {
+        'mode': mode,
+        'fp32': fp32,
+        'int8': int8,
+        'map50_delta': -map_drop,
+        'speedup': speedup,
+        'memory_reduction': 1 - int8['model_rss_mb'] / fp32['model_rss_mb'] if fp32['model_rss_mb'] else 0.0,
+        'size_reduction': 1 - int8['model_size_mb'] / fp32['model_size_mb'],
+        'thresholds': {'max_map_drop': max_map_drop, 'min_speedup': min_speedup},
+        'accepted': accepted,
+        'evaluatedAt': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+    }
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print("\n" + "="*60)
+    print("INT8 VS FP32")
+    print("="*60)
+    print(f"{'':>16} {'FP32':>10} {'INT8':>10}")
+    print(f"{'mAP@0.5':>16} {fp32['map50']:>10.4f} {int8['map50']:>10.4f}  ({report['map50_delta']:+.4f})")
+    print(f"{'Latency (p50)':>16} {fp32['latency_ms']:>8.1f}ms {int8['latency_ms']:>8.1f}ms  ({speedup:.2f}x)")
+    print(f"{'Model file':>16} {fp32['model_size_mb']:>8.1f}MB {int8['model_size_mb']:>8.1f}MB  "
+          f"(-{report['size_reduction']:.0%})")
+    print(f"{'Model memory':>16} {fp32['model_rss_mb']:>8.1f}MB {int8['model_rss_mb']:>8.1f}MB  "
+          f"(-{report['memory_reduction']:.0%})")
+    print("="*60)
+    if accepted:
+        print(f"✅ INT8 variant ACCEPTED (mAP drop {map_drop:.4f} <= {max_map_drop}, speedup {speedup:.2f}x >= {min_speedup}x)")
+        print(f"Serve with INFERENCE_BACKEND=onnx INFERENCE_MODEL_FILE={int8_path.name}")
+    else:
+        print(f"❌ INT8 variant REJECTED (mAP drop {map_drop:.4f}, limit {max_map_drop}; "
+              f"speedup {speedup:.2f}x, minimum {min_speedup}x)")
+    print(f"Report: {report_path}")
+
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Quantize a trained model to INT8 and evaluate it')
+    parser.add_argument('--weights', type=str, default='runs/train/blueprint_detector/weights/best.pt',
+                       help='Path to trained weights')
+    parser.add_argument('--data', type=str, default='../data/blueprint_dataset.yaml',
+                       help='Path to dataset YAML configuration')
+    parser.add_argument('--mode', type=str, default='static', choices=['static', 'dynamic'],
+                       help='Static (calibrated) or dynamic quantization')
+    parser.add_argument('--img-size', type=int, default=640,
+                       help='Input image size')
+    parser.add_argument('--calibration-size', type=int, default=100,
+                       help='Validation images sampled for calibration')
+    parser.add_argument('--eval-size', type=int, default=200,
+                       help='Validation images used for mAP (0 = all)')
+    parser.add_argument('--max-map-drop', type=float, default=0.01,
+                       help='Largest accepted mAP@0.5 drop')
+    parser.add_argument('--min-speedup', type=float, default=1.1,
+                       help='Smallest accepted latency speedup')
+
+    args = parser.parse_args()
+
+    report = quantize_model(
+        weights=args.weights,
+        data_yaml=args.data,
+        mode=args.mode,
+        img_size=args.img_size,
+        calibration_size=args.calibration_size,
+        eval_size=args.eval_size,
+        max_map_drop=args.max_map_drop,
+        min_speedup=args.min_speedup
+    )
+
+    # Non-zero exit lets a pipeline gate on the decision
+    sys.exit(0 if report['accepted'] else 1)
@@ -183,6 +183,12 @@ if __name__ == '__main__':
     parser.add_argument('--save-period', type=int, default=10,
                        help='Save checkpoint every N epochs')
 
+    # Export parameters
+    parser.add_argument('--export', action='store_true',
+                       help='Export best.pt to TorchScript and ONNX after training')
+    parser.add_argument('--quantize', type=str, default=None, choices=['static', 'dynamic'],
+                       help='Build and evaluate an INT8 ONNX variant after training')
+
     args = parser.parse_args()
 
     # Train model
@@ -202,3 +208,14 @@ if __name__ == '__main__':
     )
 
     print(f"\n✅ Trained model: {model_path}")
+
+    if args.export:
+        from export_model import export_model
+        export_model(weights=model_path, img_size=args.img_size)
+
+    if args.quantize:
+        from quantize_model import quantize_model
+        report = quantize_model(weights=model_path, data_yaml=args.data, mode=args.quantize,
+                                img_size=args.img_size)
+        if not report['accepted']:
+            print("⚠️  INT8 variant rejected; keep serving the FP32 model")